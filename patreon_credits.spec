@@ -44,6 +44,17 @@ a = Analysis(
         'pcg.integrations',
         'pcg.presets',
         'pcg.logging_config',
+        'pcg.jobs',
+        'pcg.ffmpeg_runner',
+        'pcg.cache',
+        'pcg.glyph_atlas',
+        'pcg.font_index',
+        'pcg.font_cache',
+        'pcg.strip',
+        'pcg.compositor',
+        'pcg.scratch',
+        'pcg.cluster',
+        'pcg.encoders',
     ],
     hookspath=[],
     hooksconfig={},
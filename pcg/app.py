@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, send_file, redirect
+from flask import Flask, Response, render_template, request, jsonify, send_file, redirect
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import hashlib
@@ -7,6 +7,7 @@ import json
 import logging
 import os
 import platform
+import re
 import shutil
 import subprocess
 import tempfile
@@ -16,7 +17,16 @@ from datetime import datetime
 import requests as http_requests
 
 from .patreon import PatreonAPI
-from .ffmpeg_renderer import VideoRenderer
+from .ffmpeg_renderer import VideoRenderer, TEXT_ENGINES, COMPOSITORS
+from .scratch import Scratch
+from .encoders import (
+    VIDEO_EXTENSIONS, list_profiles, read_sidecar, resolve_profile, sidecar_path,
+)
+from .cluster import Coordinator, HEARTBEAT_INTERVAL
+from .jobs import (
+    JobManager, JobStore, FINISHED_STATUSES, JOB_RUNNING, IdempotencyConflict,
+    load_job_settings,
+)
 from .path_utils import (
     get_env_path, get_env_example_path, get_output_dir,
     get_templates_dir, get_static_dir, get_ffmpeg_dir,
@@ -28,6 +38,7 @@ from .path_utils import (
     get_bmc_cache_path,
     get_se_cache_path,
     get_youtube_token_path,
+    get_jobs_db_path,
 )
 
 logger = logging.getLogger(__name__)
@@ -49,6 +60,7 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 # Initialize services
 patreon_api = PatreonAPI()
 video_renderer = VideoRenderer()
+cluster = Coordinator(lambda: video_renderer, token=os.environ.get('CLUSTER_TOKEN'))
 
 
 def _is_first_run():
@@ -112,22 +124,27 @@ def list_videos():
     output_dir = get_output_dir()
     videos = []
     for f in sorted(os.listdir(output_dir), reverse=True):
-        if not f.endswith('.mp4'):
+        if not f.endswith(VIDEO_EXTENSIONS):
             continue
         filepath = os.path.join(output_dir, f)
         stat = os.stat(filepath)
         if stat.st_size == 0:
             continue
-        ts_str = f.replace('credits_', '').replace('.mp4', '')
+        # credits_<YYYYmmdd_HHMMSS>[_<suffix>].mp4
+        ts_str = f.replace('credits_', '')[:15]
         try:
             ts = datetime.strptime(ts_str, '%Y%m%d_%H%M%S')
             created = ts.isoformat()
         except ValueError:
             created = datetime.fromtimestamp(stat.st_mtime).isoformat()
+        record = read_sidecar(filepath) or {}
         videos.append({
             'filename': f,
             'size': stat.st_size,
             'created': created,
+            'encoder': (record.get('encoder') or {}).get('profile'),
+            'alpha': bool((record.get('encoder') or {}).get('alpha')),
+            'encode_fps': record.get('encode_fps'),
             'video_url': f'/output/{f}',
             'thumbnail_url': f'/api/thumbnail/{f}',
             'download_url': f'/download/{f}',
@@ -180,6 +197,8 @@ def delete_video(filename):
         return jsonify({'error': 'File not found'}), 404
 
     os.remove(video_path)
+    if os.path.exists(sidecar_path(video_path)):
+        os.remove(sidecar_path(video_path))
     thumb_path = _thumb_path(filename)
     if os.path.exists(thumb_path):
         os.remove(thumb_path)
@@ -192,11 +211,123 @@ def check_ffmpeg():
     is_installed = check_ffmpeg_util()
     return jsonify({'installed': is_installed})
 
+# Most files one /generate request may ask for, and their largest side
+MAX_OUTPUTS = 8
+MAX_OUTPUT_SIDE = 7680
+
+
+def _parse_flag(value, name):
+    """A /generate boolean: a JSON boolean, or 'true'/'1'/'yes' and
+    'false'/'0'/'no' from form-style clients.  Raises ValueError otherwise."""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('true', '1', 'yes'):
+        return True
+    if text in ('false', '0', 'no'):
+        return False
+    raise ValueError(f'Invalid {name!r}: expected true or false')
+
+
+def _parse_outputs(value, encoder):
+    """Validate the /generate ``outputs`` list of {resolution, encoder?}.
+
+    A plain "WxH" string is taken as that resolution with *encoder*.
+    Raises ValueError for anything a render would reject.
+    """
+    if not isinstance(value, list) or not value:
+        raise ValueError('outputs must be a non-empty list of {resolution, encoder}')
+    if len(value) > MAX_OUTPUTS:
+        raise ValueError(f'At most {MAX_OUTPUTS} outputs per request')
+    outputs = []
+    for out in value:
+        if isinstance(out, str):
+            out = {'resolution': out}
+        if not isinstance(out, dict):
+            raise ValueError('Each output must be an object with a resolution')
+        resolution = str(out.get('resolution') or '')
+        match = re.fullmatch(r'(\d+)x(\d+)', resolution)
+        if not match or not all(2 <= int(side) <= MAX_OUTPUT_SIDE and int(side) % 2 == 0
+                                for side in match.groups()):
+            raise ValueError(f'Invalid output resolution {resolution!r}: expected '
+                             f'WIDTHxHEIGHT with even sides up to {MAX_OUTPUT_SIDE}')
+        out_encoder = out.get('encoder') or encoder
+        if out_encoder is not None:
+            resolve_profile(out_encoder, get_ffmpeg_path())
+        outputs.append({'resolution': resolution, 'encoder': out_encoder})
+    return outputs
+
+
+def _run_render_job(params, progress, control):
+    """Job-queue runner: render one /generate request on a worker thread."""
+    kwargs = dict(params)
+    qr_url = kwargs.pop('qr_url', '')
+    outputs = kwargs.pop('outputs', None)
+    qr_image = None
+    with Scratch(**video_renderer.scratch_settings) as scratch:
+        if qr_url:
+            try:
+                import qrcode
+                qr = qrcode.QRCode(box_size=10, border=2)
+                qr.add_data(qr_url)
+                qr.make(fit=True)
+                qr_img = qr.make_image(fill_color='white', back_color='black')
+                qr_image = scratch.path('.png')
+                qr_img.save(qr_image)
+            except ImportError:
+                pass
+
+        if outputs:
+            # Every size and encoder from one job; outputs sharing a
+            # resolution are encoded by one FFmpeg process on this node
+            filenames = video_renderer.render_outputs(
+                outputs, qr_image=qr_image, progress_callback=progress,
+                control=control, **kwargs)
+        elif cluster.live_workers():
+            # Worker nodes are registered: split the render across them
+            filenames = [cluster.render(
+                dict(kwargs, qr_image=qr_image), progress_callback=progress,
+                control=control)]
+        else:
+            filenames = [video_renderer.render_video(
+                qr_image=qr_image, progress_callback=progress, control=control,
+                **kwargs)]
+
+    patron_count = len(params['patrons'])
+    logger.info("Video generated: %s (%d patrons)", ', '.join(filenames), patron_count)
+    videos = []
+    for filename, out in zip(filenames, outputs or [params]):
+        encode = read_sidecar(os.path.join(get_output_dir(), filename))
+        videos.append({
+            'video_url': f'/output/{filename}',
+            'filename': filename,
+            'resolution': out['resolution'],
+            'encoder': (encode or {}).get('encoder', {}).get('profile'),
+            'encode': encode,
+        })
+    return {
+        'video_url': videos[0]['video_url'],
+        'patron_count': patron_count,
+        'filename': videos[0]['filename'],
+        'encode': videos[0]['encode'],
+        'videos': videos,
+    }
+
+
+job_manager = JobManager(_run_render_job, JobStore(get_jobs_db_path()),
+                         **load_job_settings())
+
+
+def start_job_workers():
+    """Start the render worker pool (called by the launcher at startup)."""
+    job_manager.start()
+
+
 @app.route('/generate', methods=['POST'])
 def generate_credits():
-    """Generate the credits video"""
+    """Queue a credits video render and return its job id."""
     try:
-        logger.info("Starting video generation")
+        logger.info("Queueing video generation")
         # Get form data
         data = request.get_json()
         message = data.get('message', 'This video was made possible by our Patreon supporters:')
@@ -225,6 +356,20 @@ def generate_credits():
         logo_size = int(data.get('logo_size', 80))
         qr_position = data.get('qr_position', 'bottom-right')
         qr_size = int(data.get('qr_size', 120))
+        text_engine = data.get('text_engine') or None
+        if text_engine is not None and text_engine not in TEXT_ENGINES:
+            return jsonify({'error': f'text_engine must be one of {", ".join(TEXT_ENGINES)}'}), 400
+        compositor = data.get('compositor') or None
+        if compositor is not None and compositor not in COMPOSITORS:
+            return jsonify({'error': f'compositor must be one of {", ".join(COMPOSITORS)}'}), 400
+        encoder = data.get('encoder') or None
+        if encoder is not None:
+            resolve_profile(encoder, get_ffmpeg_path())
+        # Several sizes/encoders from one request: [{resolution, encoder?}]
+        outputs = data.get('outputs')
+        if outputs is not None:
+            outputs = _parse_outputs(outputs, encoder)
+            resolution = outputs[0]['resolution']
 
         # Resolve file paths for uploads
         uploads_dir = get_uploads_dir()
@@ -253,21 +398,21 @@ def generate_credits():
         if logo_name:
             logo_file = os.path.join(uploads_dir, logo_name)
 
-        qr_image = None
+        # The QR image is generated by the worker when the job runs
         qr_url = data.get('qr_url', '').strip()
-        if qr_url:
-            try:
-                import qrcode
-                qr = qrcode.QRCode(box_size=10, border=2)
-                qr.add_data(qr_url)
-                qr.make(fit=True)
-                qr_img = qr.make_image(fill_color='white', back_color='black')
-                qr_tmp = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-                qr_img.save(qr_tmp.name)
-                qr_tmp.close()
-                qr_image = qr_tmp.name
-            except ImportError:
-                pass
+
+        # 'interactive' (default) renders run ahead of 'batch' ones
+        priority = data.get('priority')
+
+        # Optional per-job wall-clock limit in seconds (0 = unlimited)
+        timeout = data.get('timeout')
+
+        # "cache": false forces a fresh render even if an identical one is cached
+        use_cache = _parse_flag(data.get('cache', True), 'cache')
+
+        # Retries carrying the same key attach to the original job
+        idempotency_key = (request.headers.get('Idempotency-Key')
+                           or data.get('idempotency_key'))
 
         # Validate duration
         if duration < 5 or duration > 60:
@@ -285,36 +430,254 @@ def generate_credits():
         if not patrons:
             return jsonify({'error': 'No active patrons found'}), 404
 
-        # Generate video
-        try:
-            video_filename = video_renderer.render_video(
-                message, patrons, duration, resolution,
-                message_style, patron_style, columns, name_align,
-                truncate_length, word_wrap, name_spacing, bg_color,
-                fade_in=fade_in, fade_out=fade_out,
-                speed_multiplier=speed_multiplier, fps=fps,
-                bg_image=bg_image, bg_gradient=bg_gradient,
-                audio_file=audio_file, audio_volume=audio_volume,
-                logo_file=logo_file, logo_position=logo_position,
-                logo_size=logo_size,
-                qr_image=qr_image, qr_position=qr_position,
-                qr_size=qr_size)
-        finally:
-            if qr_image and os.path.exists(qr_image):
-                os.unlink(qr_image)
-
-        logger.info("Video generated: %s (%d patrons)", video_filename, len(patrons))
+        job = job_manager.submit({
+            'message': message, 'patrons': patrons,
+            'duration': duration, 'resolution': resolution,
+            'message_style': message_style, 'patron_style': patron_style,
+            'columns': columns, 'name_align': name_align,
+            'truncate_length': truncate_length, 'word_wrap': word_wrap,
+            'name_spacing': name_spacing, 'bg_color': bg_color,
+            'fade_in': fade_in, 'fade_out': fade_out,
+            'speed_multiplier': speed_multiplier, 'fps': fps,
+            'bg_image': bg_image, 'bg_gradient': bg_gradient,
+            'audio_file': audio_file, 'audio_volume': audio_volume,
+            'logo_file': logo_file, 'logo_position': logo_position,
+            'logo_size': logo_size,
+            'qr_url': qr_url, 'qr_position': qr_position,
+            'qr_size': qr_size, 'use_cache': use_cache,
+            'text_engine': text_engine, 'compositor': compositor,
+            'encoder': encoder, 'outputs': outputs,
+        }, priority=priority, timeout=timeout, idempotency_key=idempotency_key)
+
         return jsonify({
             'success': True,
-            'video_url': f'/output/{video_filename}',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/jobs/{job.id}',
+            'events_url': f'/api/jobs/{job.id}/events',
             'patron_count': len(patrons),
-            'filename': video_filename
-        })
+            'deduplicated': job.deduplicated,
+        }), 200 if job.deduplicated else 202
 
+    except IdempotencyConflict as e:
+        return jsonify({'error': str(e)}), 422
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error("Video generation failed: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+
+@app.route('/api/jobs')
+def list_jobs():
+    """List queued, running and finished render jobs (newest first)."""
+    status = request.args.get('status')
+    limit = request.args.get('limit', 200, type=int)
+    jobs = job_manager.list(status=status, limit=limit)
+    return jsonify({
+        'jobs': [j.to_dict() for j in jobs],
+        'counts': job_manager.store.counts(),
+    })
+
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Return the status (and result, once done) of a render job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running render job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status in FINISHED_STATUSES:
+        return jsonify({'error': f'Job already {job.status}'}), 409
+    job = job_manager.cancel(job_id)
+    return jsonify(dict(job.to_dict(), cancel_requested=job.status == JOB_RUNNING))
+
+
+@app.route('/api/encoders')
+def encoder_profiles():
+    """Encoder profiles a render can select, and the default."""
+    return jsonify({'default': video_renderer.encoder,
+                    'profiles': list_profiles(get_ffmpeg_path())})
+
+
+@app.route('/api/cache')
+def render_cache_info():
+    """Render and layer cache statistics, plus cached renders (most recent first)."""
+    cache = video_renderer.render_cache
+    text = video_renderer.layout_cache_stats()
+    if cache is None:
+        return jsonify({'enabled': False, 'entries': [], 'text': text})
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify(dict(cache.stats(), enabled=True,
+                        entries=cache.entries()[:max(0, limit)],
+                        layers=video_renderer.layer_cache.stats(),
+                        sprites=video_renderer.sprite_cache.stats(),
+                        text=text))
+
+
+@app.route('/api/cache', methods=['DELETE'])
+def purge_render_cache():
+    """Delete every cached render, layer and name sprite (gallery videos are kept)."""
+    removed = 0
+    for cache in (video_renderer.render_cache, video_renderer.layer_cache,
+                  video_renderer.sprite_cache):
+        if cache is not None:
+            removed += cache.purge()
+    video_renderer.clear_layout_caches()
+    return jsonify({'success': True, 'removed': removed})
+
+
+@app.route('/api/cache/<key>', methods=['DELETE'])
+def delete_render_cache_entry(key):
+    """Delete one cached render or layer by key."""
+    if not all(c in '0123456789abcdef' for c in key) or len(key) != 64:
+        return jsonify({'error': 'Invalid cache key'}), 400
+    caches = [c for c in (video_renderer.render_cache, video_renderer.layer_cache)
+              if c is not None]
+    if not any(c.remove(key) for c in caches):
+        return jsonify({'error': 'Cache entry not found'}), 404
+    return jsonify({'success': True})
+
+
+def _cluster_unauthorised():
+    """401 response unless the request carries the cluster token."""
+    if cluster.authorised(request.headers.get('Authorization')):
+        return None
+    if cluster.token is None:
+        return jsonify({'error': 'Render workers are off: set CLUSTER_TOKEN'}), 401
+    return jsonify({'error': 'Invalid cluster token'}), 401
+
+
+@app.route('/api/cluster')
+def cluster_status():
+    """Registered render workers and the segments they are working on."""
+    denied = _cluster_unauthorised()
+    if denied:
+        return denied
+    return jsonify(cluster.status())
+
+
+@app.route('/api/cluster/workers', methods=['POST'])
+def cluster_register():
+    """Register a render worker node."""
+    denied = _cluster_unauthorised()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    worker = cluster.register(data.get('name'), host=request.remote_addr)
+    return jsonify({'worker_id': worker['id'],
+                    'heartbeat_interval': HEARTBEAT_INTERVAL}), 201
+
+
+@app.route('/api/cluster/workers/<worker_id>/heartbeat', methods=['POST'])
+def cluster_heartbeat(worker_id):
+    """Keep a worker registered and record its progress on a segment."""
+    denied = _cluster_unauthorised()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    state = cluster.heartbeat(worker_id, data.get('task'), data.get('frames', 0))
+    if state is None:
+        return jsonify({'error': 'Unknown worker'}), 404
+    return jsonify(state)
+
+
+@app.route('/api/cluster/workers/<worker_id>/tasks/next', methods=['POST'])
+def cluster_next_task(worker_id):
+    """Hand the oldest pending segment to a worker (204 if there is none)."""
+    denied = _cluster_unauthorised()
+    if denied:
+        return denied
+    task = cluster.next_task(worker_id)
+    if task is None:
+        return jsonify({'error': 'Unknown worker'}), 404
+    if not task:
+        return '', 204
+    return jsonify(task)
+
+
+@app.route('/api/cluster/tasks/<task_id>/files/<name>')
+def cluster_task_file(task_id, name):
+    """Download an image a segment needs (background, logo or QR code)."""
+    denied = _cluster_unauthorised()
+    if denied:
+        return denied
+    path = cluster.task_file(task_id, name)
+    if not path or not os.path.isfile(path):
+        return jsonify({'error': 'File not found'}), 404
+    return send_file(path)
+
+
+@app.route('/api/cluster/tasks/<task_id>/result', methods=['PUT'])
+def cluster_task_result(task_id):
+    """Upload the rendered video of a segment."""
+    denied = _cluster_unauthorised()
+    if denied:
+        return denied
+    # Segment videos are far larger than the 16MB form upload limit
+    request.max_content_length = None
+    if not cluster.complete(task_id, request.args.get('worker'), request.stream,
+                            size=request.content_length or 0):
+        return jsonify({'error': 'Segment is not pending'}), 409
+    return jsonify({'success': True})
+
+
+@app.route('/api/cluster/tasks/<task_id>/failed', methods=['POST'])
+def cluster_task_failed(task_id):
+    """Report that a worker could not render a segment."""
+    denied = _cluster_unauthorised()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    if not cluster.fail(task_id, data.get('worker'), data.get('error') or 'unknown error'):
+        return jsonify({'error': 'Segment is not assigned to this worker'}), 409
+    return jsonify({'success': True})
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream a render job's progress as Server-Sent Events.
+
+    Emits ``progress`` events (stage, percent, encode fps, ETA) while the
+    job runs and a final ``done`` or ``failed`` event with the job state.
+    """
+    if job_manager.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def stream():
+        seq = 0
+        job = job_manager.get(job_id)
+        if job.status not in FINISHED_STATUSES and job.progress is None:
+            yield _sse('progress', {'stage': job.status, 'status': job.status})
+        while True:
+            job = job_manager.get(job_id)
+            if job.status in FINISHED_STATUSES:
+                yield _sse(job.status, job.to_dict())
+                return
+            info = job_manager.wait_progress(job_id, seq, timeout=15)
+            if info is None or info['seq'] <= seq:
+                yield ': keep-alive\n\n'
+                continue
+            seq = info['seq']
+            if info['stage'] != 'finished':
+                status = 'queued' if info['stage'] in ('queued', 'starting') else 'running'
+                yield _sse('progress', dict(info, status=status))
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/output/<filename>')
 def serve_output(filename):
     """Serve a generated video from the writable output directory."""
@@ -1041,8 +1404,13 @@ def api_spec():
         'paths': {
             '/generate': {
                 'post': {
-                    'summary': 'Generate credits video',
-                    'description': 'Fetches patrons and renders a scrolling credits MP4 video.',
+                    'summary': 'Queue a credits video render',
+                    'description': 'Fetches patrons and queues a scrolling credits MP4 render. Returns a job id immediately; poll /api/jobs/{job_id} for the result. Repeating a request with the same `Idempotency-Key`, or sending an identical payload while a matching render is still queued or running, returns the existing job (200, `deduplicated: true`) instead of starting another render.',
+                    'parameters': [{
+                        'name': 'Idempotency-Key', 'in': 'header', 'required': False,
+                        'schema': {'type': 'string', 'maxLength': 255},
+                        'description': 'Client-chosen key; retries with the same key return the original job. May also be sent as `idempotency_key` in the body.',
+                    }],
                     'requestBody': {
                         'required': True,
                         'content': {
@@ -1114,6 +1482,51 @@ def api_spec():
                                                 'align': {'type': 'string', 'enum': ['left', 'center', 'right', 'justify'], 'default': 'left'},
                                             },
                                         },
+                                        'priority': {
+                                            'oneOf': [
+                                                {'type': 'string', 'enum': ['interactive', 'normal', 'batch']},
+                                                {'type': 'integer'},
+                                            ],
+                                            'default': 'interactive',
+                                            'description': 'Queue priority. Higher-priority jobs run first; use `batch` for scheduled renders.',
+                                        },
+                                        'text_engine': {
+                                            'type': 'string',
+                                            'enum': ['pillow', 'atlas'],
+                                            'description': 'Text rasteriser. `atlas` blits cached glyph bitmaps and is much faster for large rosters; `pillow` draws every name with FreeType. Defaults to the server\'s `RENDER_TEXT_ENGINE`.',
+                                        },
+                                        'compositor': {
+                                            'type': 'string',
+                                            'enum': ['ffmpeg', 'numpy'],
+                                            'description': 'How frames are assembled. `ffmpeg` overlays the layers in an FFmpeg filter graph; `numpy` builds each frame in Python and pipes raw video to FFmpeg, which only encodes. Compare them with `scripts/benchmark_render.py`. Defaults to the server\'s `RENDER_COMPOSITOR`.',
+                                        },
+                                        'encoder': {
+                                            'type': 'string',
+                                            'description': 'Encoder profile (see GET /api/encoders): `h264-fast` (default), `h264-draft` (speed), `h264-small`, `hevc-small`, `vp9-web` (WebM), `av1-small` (size) or `h264-edit` (all-intra, for scrubbing in editors), plus any in `encoder_profiles.json`. `prores-alpha` (ProRes 4444), `qtrle-alpha` (QuickTime Animation), `png-alpha` (PNG frames in a .mov) and `vp9-alpha` (WebM) render a transparent overlay: only the header, logo, QR code and scrolling names, with the background settings ignored. Profiles whose encoder the FFmpeg build lacks are rejected with 400. Defaults to the server\'s `RENDER_ENCODER`.',
+                                        },
+                                        'outputs': {
+                                            'type': 'array',
+                                            'maxItems': 8,
+                                            'description': 'Render several files in one job instead of one per request, e.g. 720p, 1080p, 4K and a vertical 1080x1920 cut. The roster is fetched once and the credits are laid out once per distinct resolution; outputs sharing a resolution are composited once and encoded by one FFmpeg process (`split` to each encoder). Overrides `resolution`; renders with outputs are not distributed to worker nodes. A plain `"WxH"` string is accepted as an item too.',
+                                            'items': {
+                                                'type': 'object',
+                                                'required': ['resolution'],
+                                                'properties': {
+                                                    'resolution': {'type': 'string', 'example': '1080x1920', 'description': '`WIDTHxHEIGHT`, even sides up to 7680.'},
+                                                    'encoder': {'type': 'string', 'description': 'Encoder profile for this output; defaults to `encoder`.'},
+                                                },
+                                            },
+                                        },
+                                        'cache': {
+                                            'type': 'boolean',
+                                            'default': True,
+                                            'description': 'Reuse an identical earlier render from the render cache. Set false to force a fresh render. The strings `"true"`/`"1"`/`"yes"` and `"false"`/`"0"`/`"no"` are accepted too; anything else is rejected with 400.',
+                                        },
+                                        'timeout': {
+                                            'type': 'number',
+                                            'minimum': 0,
+                                            'description': 'Wall-clock limit for this render in seconds (0 = unlimited). Defaults to the server\'s `RENDER_TIMEOUT`.',
+                                        },
                                         'patron_style': {
                                             'type': 'object',
                                             'description': 'Styling for patron names.',
@@ -1130,28 +1543,221 @@ def api_spec():
                         },
                     },
                     'responses': {
-                        '200': {
-                            'description': 'Video generated successfully.',
+                        '202': {
+                            'description': 'Render queued.',
                             'content': {
                                 'application/json': {
                                     'schema': {
                                         'type': 'object',
                                         'properties': {
                                             'success': {'type': 'boolean'},
-                                            'video_url': {'type': 'string', 'description': 'Relative URL to the generated MP4.'},
+                                            'job_id': {'type': 'string'},
+                                            'status': {'type': 'string', 'enum': ['queued', 'running', 'done', 'failed', 'cancelled']},
+                                            'status_url': {'type': 'string', 'description': 'Relative URL to poll for job status.'},
+                                            'events_url': {'type': 'string', 'description': 'Relative URL of the job\'s Server-Sent Events progress stream.'},
                                             'patron_count': {'type': 'integer'},
-                                            'filename': {'type': 'string'},
+                                            'deduplicated': {'type': 'boolean', 'description': 'True when the request was attached to an existing job.'},
                                         },
                                     },
                                 },
                             },
                         },
+                        '200': {'description': 'Duplicate request; the existing job is returned (same body as 202).'},
                         '400': {'description': 'Invalid parameters.'},
                         '404': {'description': 'No active patrons found.'},
+                        '422': {'description': 'Idempotency-Key reused with a different payload.'},
                         '500': {'description': 'Server error.'},
                     },
                 },
             },
+            '/api/jobs': {
+                'get': {
+                    'summary': 'List render jobs',
+                    'description': 'Returns queued, running and recently finished render jobs, newest first, plus per-status `counts`.',
+                    'parameters': [
+                        {'name': 'status', 'in': 'query', 'schema': {'type': 'string', 'enum': ['queued', 'running', 'done', 'failed', 'cancelled']}},
+                        {'name': 'limit', 'in': 'query', 'schema': {'type': 'integer', 'default': 200}},
+                    ],
+                    'responses': {'200': {'description': 'Object with a `jobs` array and `counts`.'}},
+                },
+            },
+            '/api/jobs/{job_id}': {
+                'get': {
+                    'summary': 'Get render job status',
+                    'description': 'Returns the job status. When `status` is `done`, `result` holds `video_url`, `filename` and `patron_count`; when `failed`, `error` holds the message.',
+                    'parameters': [{'name': 'job_id', 'in': 'path', 'required': True, 'schema': {'type': 'string'}}],
+                    'responses': {
+                        '200': {
+                            'description': 'Job status.',
+                            'content': {
+                                'application/json': {
+                                    'schema': {
+                                        'type': 'object',
+                                        'properties': {
+                                            'id': {'type': 'string'},
+                                            'status': {'type': 'string', 'enum': ['queued', 'running', 'done', 'failed', 'cancelled']},
+                                            'priority': {'type': 'integer'},
+                                            'created': {'type': 'string', 'format': 'date-time'},
+                                            'started': {'type': 'string', 'format': 'date-time', 'nullable': True},
+                                            'finished': {'type': 'string', 'format': 'date-time', 'nullable': True},
+                                            'timeout': {'type': 'number', 'nullable': True, 'description': 'Per-job time limit in seconds, if one was requested.'},
+                                            'result': {
+                                                'type': 'object',
+                                                'nullable': True,
+                                                'properties': {
+                                                    'video_url': {'type': 'string', 'description': 'Relative URL to the generated video.'},
+                                                    'patron_count': {'type': 'integer'},
+                                                    'filename': {'type': 'string'},
+                                                    'encode': {'type': 'object', 'nullable': True, 'description': 'Encode record, also saved next to the video as `<name>.json`: `encoder` (`profile`, `codec`, FFmpeg `args`), `size`, `bitrate_kbps`, `encode_seconds`, `encode_fps`, `rasterise_seconds`, `segments`, `cached`.'},
+                                                    'videos': {
+                                                        'type': 'array',
+                                                        'description': 'Every file the job produced, in the order of `outputs` (one entry without it); `video_url`, `filename` and `encode` above are the first.',
+                                                        'items': {
+                                                            'type': 'object',
+                                                            'properties': {
+                                                                'video_url': {'type': 'string'},
+                                                                'filename': {'type': 'string'},
+                                                                'resolution': {'type': 'string'},
+                                                                'encoder': {'type': 'string', 'nullable': True},
+                                                                'encode': {'type': 'object', 'nullable': True},
+                                                            },
+                                                        },
+                                                    },
+                                                },
+                                            },
+                                            'error': {'type': 'string', 'nullable': True},
+                                        },
+                                    },
+                                },
+                            },
+                        },
+                        '404': {'description': 'Job not found.'},
+                    },
+                },
+            },
+            '/api/jobs/{job_id}/events': {
+                'get': {
+                    'summary': 'Stream render progress (SSE)',
+                    'description': 'Server-Sent Events stream. `progress` events carry `stage` (queued, rasterising, encoding, joining), `percent`, `frame`, `fps` (encode speed), `speed` and `eta` in seconds. A final `done`, `failed` or `cancelled` event carries the job object, then the stream closes.',
+                    'parameters': [{'name': 'job_id', 'in': 'path', 'required': True, 'schema': {'type': 'string'}}],
+                    'responses': {
+                        '200': {'description': 'Event stream.', 'content': {'text/event-stream': {'schema': {'type': 'string'}}}},
+                        '404': {'description': 'Job not found.'},
+                    },
+                },
+            },
+            '/api/jobs/{job_id}/cancel': {
+                'post': {
+                    'summary': 'Cancel a render job',
+                    'description': 'A queued job is cancelled immediately. For a running job FFmpeg is stopped and the job becomes `cancelled` shortly after (`cancel_requested` is true); follow the events stream for the final state.',
+                    'parameters': [{'name': 'job_id', 'in': 'path', 'required': True, 'schema': {'type': 'string'}}],
+                    'responses': {
+                        '200': {'description': 'Job state after the cancel request.'},
+                        '404': {'description': 'Job not found.'},
+                        '409': {'description': 'Job already finished.'},
+                    },
+                },
+            },
+            '/api/encoders': {
+                'get': {
+                    'summary': 'List encoder profiles',
+                    'description': 'Every encoder profile with `name`, `label`, `goal` (balanced, speed, size or editing), `description`, FFmpeg `codec`, output `container`, `alpha` (transparent overlay output) and `available` (whether this FFmpeg build has the encoder), plus the server `default`.',
+                    'responses': {'200': {'description': 'Encoder profiles.'}},
+                },
+            },
+            '/api/cache': {
+                'get': {
+                    'summary': 'Inspect the render cache',
+                    'description': 'Returns `enabled`, `count`, `bytes`, `max_bytes`, `hits` and `misses` for cached videos, and the same statistics for the rasterised header/patron strip cache under `layers` and the per-name sprite cache under `sprites`. `text` holds `size`/`hits`/`misses` of the in-memory font fallback chain, text run and width memos and glyph atlases, under `fonts` the size, estimated `bytes`, `max_bytes` and hit/miss/eviction counts of the shared sized-font cache, and under `font_index` the number of fonts in the persistent coverage index. `entries` (capped by `limit`) lists each cached render with `key`, `size`, `last_used` and the `filename`, `resolution`, `duration`, `fps` and `patron_count` of the render that filled it.',
+                    'parameters': [{'name': 'limit', 'in': 'query', 'schema': {'type': 'integer', 'default': 100}}],
+                    'responses': {'200': {'description': 'Cache statistics and entries.'}},
+                },
+                'delete': {
+                    'summary': 'Purge the render cache',
+                    'description': 'Deletes every cached render, layer and name sprite. Videos already in the output folder are not affected.',
+                    'responses': {'200': {'description': 'Number of entries removed.'}},
+                },
+            },
+            '/api/cache/{key}': {
+                'delete': {
+                    'summary': 'Delete one cached render or layer',
+                    'parameters': [{'name': 'key', 'in': 'path', 'required': True, 'schema': {'type': 'string'}}],
+                    'responses': {
+                        '200': {'description': 'Entry deleted.'},
+                        '400': {'description': 'Invalid cache key.'},
+                        '404': {'description': 'Cache entry not found.'},
+                    },
+                },
+            },
+            '/api/cluster': {
+                'get': {
+                    'summary': 'Render cluster status',
+                    'description': 'Worker nodes registered with this server (`id`, `name`, `host`, `registered`, seconds since `last_seen`, current `task`) and the segment tasks of distributed renders (`render`, `index`, `segment` as [first frame, frame count], `state`, `worker`, `attempts`, `frames` done). While workers are registered, renders are split into segments and handed to them. Every /api/cluster endpoint requires `Authorization: Bearer <token>` with the server\'s `CLUSTER_TOKEN`, and answers 401 while none is set.',
+                    'responses': {
+                        '200': {'description': 'Workers and tasks.'},
+                        '401': {'description': 'Missing or wrong cluster token.'},
+                    },
+                },
+            },
+            '/api/cluster/workers': {
+                'post': {
+                    'summary': 'Register a render worker',
+                    'description': 'Called by `PatreonCredits --worker --coordinator URL`. Returns the `worker_id` and the `heartbeat_interval` in seconds; a worker silent for longer than the coordinator timeout is dropped and its segments are re-assigned.',
+                    'requestBody': {'content': {'application/json': {'schema': {'type': 'object', 'properties': {'name': {'type': 'string'}}}}}},
+                    'responses': {'201': {'description': 'Worker registered.'}, '401': {'description': 'Missing or wrong cluster token.'}},
+                },
+            },
+            '/api/cluster/workers/{worker_id}/heartbeat': {
+                'post': {
+                    'summary': 'Worker heartbeat',
+                    'description': 'Reports the `task` being rendered and its `frames` done. `continue` is false when the segment is no longer wanted from this worker (job cancelled, or delivered by another worker).',
+                    'parameters': [{'name': 'worker_id', 'in': 'path', 'required': True, 'schema': {'type': 'string'}}],
+                    'responses': {'200': {'description': '`continue` flag.'}, '404': {'description': 'Unknown worker; register again.'}},
+                },
+            },
+            '/api/cluster/workers/{worker_id}/tasks/next': {
+                'post': {
+                    'summary': 'Take the next segment',
+                    'description': 'Returns a task `id`, the render `params`, the `segment` to render and the `files` (background, logo, QR code) to download from /api/cluster/tasks/{task_id}/files/{name}.',
+                    'parameters': [{'name': 'worker_id', 'in': 'path', 'required': True, 'schema': {'type': 'string'}}],
+                    'responses': {
+                        '200': {'description': 'Segment task.'},
+                        '204': {'description': 'Nothing to render.'},
+                        '404': {'description': 'Unknown worker; register again.'},
+                    },
+                },
+            },
+            '/api/cluster/tasks/{task_id}/files/{name}': {
+                'get': {
+                    'summary': 'Download a segment input image',
+                    'parameters': [
+                        {'name': 'task_id', 'in': 'path', 'required': True, 'schema': {'type': 'string'}},
+                        {'name': 'name', 'in': 'path', 'required': True, 'schema': {'type': 'string', 'enum': ['bg_image', 'logo_file', 'qr_image']}},
+                    ],
+                    'responses': {'200': {'description': 'Image file.'}, '404': {'description': 'File not found.'}},
+                },
+            },
+            '/api/cluster/tasks/{task_id}/result': {
+                'put': {
+                    'summary': 'Upload a rendered segment',
+                    'description': 'Request body is the segment video. The first upload of a segment is kept.',
+                    'parameters': [
+                        {'name': 'task_id', 'in': 'path', 'required': True, 'schema': {'type': 'string'}},
+                        {'name': 'worker', 'in': 'query', 'required': True, 'schema': {'type': 'string'}},
+                    ],
+                    'requestBody': {'content': {'video/mp4': {'schema': {'type': 'string', 'format': 'binary'}}}},
+                    'responses': {'200': {'description': 'Segment stored.'}, '409': {'description': 'Segment unknown or already delivered.'}},
+                },
+            },
+            '/api/cluster/tasks/{task_id}/failed': {
+                'post': {
+                    'summary': 'Report a failed segment',
+                    'description': 'The segment is re-queued for another attempt; after three failed attempts the render fails.',
+                    'parameters': [{'name': 'task_id', 'in': 'path', 'required': True, 'schema': {'type': 'string'}}],
+                    'requestBody': {'content': {'application/json': {'schema': {'type': 'object', 'properties': {'worker': {'type': 'string'}, 'error': {'type': 'string'}}}}}},
+                    'responses': {'200': {'description': 'Failure recorded.'}, '409': {'description': 'Segment is not assigned to this worker.'}},
+                },
+            },
             '/patron-count': {
                 'get': {
                     'summary': 'Get patron count',
@@ -1266,6 +1872,9 @@ def api_spec():
                                                         'video_url': {'type': 'string'},
                                                         'thumbnail_url': {'type': 'string'},
                                                         'download_url': {'type': 'string'},
+                                                        'encoder': {'type': 'string', 'nullable': True, 'description': 'Encoder profile of the render.'},
+                                                        'alpha': {'type': 'boolean', 'description': 'Transparent overlay without a background.'},
+                                                        'encode_fps': {'type': 'number', 'nullable': True},
                                                     },
                                                 },
                                             },
@@ -1459,6 +2068,10 @@ if __name__ == '__main__':
     if not check_ffmpeg_util():
         logger.warning("FFmpeg not found. You can install it from the Settings page.")
 
+    # With the debug reloader, only the serving child process runs workers
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_job_workers()
+
     host = os.environ.get('FLASK_HOST', '127.0.0.1')
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=True, host=host, port=port)
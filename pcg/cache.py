@@ -0,0 +1,551 @@
+"""On-disk caches for render artefacts.
+
+DiskCache is a size-bounded, content-addressed file store: each entry is a
+file named after its key plus a small JSON sidecar with metadata.  Entries
+are evicted least-recently-used first (a hit bumps the file's mtime) once
+the store grows past ``max_bytes``.
+
+RenderCache keys finished videos on a canonical hash of every render input,
+so repeating a render with the same roster, styles and assets returns the
+earlier video instead of rasterising and encoding it again.  LayerCache
+does the same for the rasterised header and patron strips (and the static
+background and foreground plates), keyed only on what affects their pixels,
+so renders that differ in compositing or encode settings (fades, audio,
+logo/QR placement, duration) skip drawing the names.
+
+LRUCache is the in-memory counterpart used to memoise font fallback chains,
+text runs and widths inside a render process.
+
+SpriteCache keeps individual rasterised names as 8-bit coverage masks in a
+SQLite database, so a strip for a roster that gained a few names only
+draws the new ones and pastes the rest.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_MB = 2048
+DEFAULT_LAYER_MAX_MB = 512
+DEFAULT_SPRITE_MAX_MB = 256
+
+# Bump when a change to the renderer alters its output for the same
+# inputs, so stale videos are not served from the cache.
+RENDER_CACHE_VERSION = 1
+LAYER_CACHE_VERSION = 1
+SPRITE_CACHE_VERSION = 1
+
+# render_video() arguments that are file paths: hashed by content, not name
+_FILE_PARAMS = ('bg_image', 'audio_file', 'logo_file', 'qr_image')
+# ... and layer inputs that are (the paths of) other layers
+_LAYER_FILE_PARAMS = _FILE_PARAMS + ('header_path',)
+
+_file_hashes = {}          # (path, size, mtime_ns) -> sha256 hex
+_file_hashes_lock = threading.Lock()
+
+
+def file_digest(path):
+    """SHA-256 of a file's contents, memoised on (path, size, mtime)."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _file_hashes_lock:
+        digest = _file_hashes.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with _file_hashes_lock:
+            _file_hashes[memo_key] = digest
+    return digest
+
+
+class LRUCache:
+    """Thread-safe, size-bounded in-memory LRU map with hit/miss counters."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """Return the value for *key*, calling ``compute()`` on a miss."""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {'size': len(self._data), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses}
+
+
+def hash_key(obj):
+    """SHA-256 of the canonical JSON form of *obj*."""
+    blob = json.dumps(obj, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+def link_or_copy(src, dst):
+    """Hard-link *src* to *dst*, copying when linking is not possible."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class DiskCache:
+    """Size-bounded LRU store of files addressed by hex keys.
+
+    Sizes and last-use times are kept in an in-memory index, built from the
+    directory on first use and updated by get/put/remove, so eviction does
+    not rescan the store.
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, suffix=''):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = None     # key -> (size, last_used), least recently used first
+        self._bytes = 0
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], key + self.suffix)
+
+    def _meta_path(self, key):
+        return os.path.join(self.root, key[:2], key + '.json')
+
+    def _scan(self):
+        """[(key, size, last_used)] of the entries on disk, oldest first."""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for prefix in os.listdir(self.root):
+            folder = os.path.join(self.root, prefix)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if not name.endswith(self.suffix) or name.endswith(('.json', '.tmp')):
+                    continue
+                key = name[:len(name) - len(self.suffix)] if self.suffix else name
+                try:
+                    st = os.stat(os.path.join(folder, name))
+                except OSError:
+                    continue
+                found.append((key, st.st_size, st.st_mtime))
+        found.sort(key=lambda e: e[2])
+        return found
+
+    def _indexed(self):
+        """The size index, scanned from disk on first use (lock held)."""
+        if self._index is None:
+            self._index = OrderedDict((key, (size, used))
+                                      for key, size, used in self._scan())
+            self._bytes = sum(size for size, _ in self._index.values())
+        return self._index
+
+    def _touch(self, key, size):
+        """Record *key* as the most recently used entry (lock held)."""
+        index = self._indexed()
+        old = index.pop(key, None)
+        if old is not None:
+            self._bytes -= old[0]
+        index[key] = (size, time.time())
+        self._bytes += size
+
+    def get(self, key):
+        """Return the cached file path for *key*, or None on a miss."""
+        path = self.path_for(key)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            with self._lock:
+                self._forget(key)
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)   # mark recently used for LRU eviction
+        except OSError:
+            pass
+        with self._lock:
+            self._touch(key, size)
+        self.hits += 1
+        return path
+
+    def put(self, key, src, meta=None):
+        """Store a copy (or hard link) of file *src* under *key*."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            os.unlink(tmp)
+            link_or_copy(src, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        if meta is not None:
+            with open(self._meta_path(key), 'w') as f:
+                json.dump(dict(meta, cached=time.time()), f)
+        with self._lock:
+            self._touch(key, os.path.getsize(path))
+        self.evict()
+        return path
+
+    def entries(self):
+        """Return [{key, size, last_used, ...meta}] newest-used first.
+
+        Reads every entry's metadata; for listings, not for bookkeeping.
+        """
+        result = []
+        for key, size, used in reversed(self._scan()):
+            entry = {'key': key, 'size': size, 'last_used': used}
+            try:
+                with open(self._meta_path(key)) as f:
+                    entry.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+            result.append(entry)
+        return result
+
+    def stats(self):
+        with self._lock:
+            count = len(self._indexed())
+            total = self._bytes
+        return {
+            'count': count,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _forget(self, key):
+        """Drop *key* from the index (lock held)."""
+        if self._index is not None:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0]
+
+    def _delete(self, key):
+        """Delete one entry's files and forget it (lock held)."""
+        found = False
+        for path in (self.path_for(key), self._meta_path(key)):
+            try:
+                os.unlink(path)
+                found = True
+            except FileNotFoundError:
+                pass
+        self._forget(key)
+        return found
+
+    def remove(self, key):
+        """Delete one entry; returns True if it existed."""
+        with self._lock:
+            return self._delete(key)
+
+    def purge(self):
+        """Delete every entry; returns the number removed."""
+        with self._lock:
+            entries = self._scan()
+            for key, _, _ in entries:
+                self._delete(key)
+            self._index = OrderedDict()
+            self._bytes = 0
+            return len(entries)
+
+    def evict(self):
+        """Drop least-recently-used entries once over ``max_bytes``."""
+        if not self.max_bytes:
+            return
+        with self._lock:
+            index = self._indexed()
+            if self._bytes <= self.max_bytes:
+                return
+            # Trim to 90% so a full cache isn't evicted on every put
+            # (a tiled strip stores one entry per tile)
+            low_water = int(self.max_bytes * 0.9)
+            while index and self._bytes > low_water:
+                key, (size, _) = next(iter(index.items()))
+                self._delete(key)
+                logger.debug("Evicted cache entry %s (%d bytes)", key, size)
+
+
+class RenderCache(DiskCache):
+    """Finished videos keyed on a hash of every input to render_video().
+
+    Entries have no extension: the container depends on the encoder
+    profile, and is in the ``filename`` of the entry's metadata.
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        super().__init__(root, max_bytes=max_bytes)
+
+    @staticmethod
+    def key_for(params):
+        """Canonical hash of render_video() keyword arguments.
+
+        File inputs contribute their content hash rather than their path,
+        so a re-uploaded but identical logo still hits, and a changed file
+        under the same name misses.
+        """
+        canon = {'_version': RENDER_CACHE_VERSION}
+        for name, value in params.items():
+            if name in _FILE_PARAMS:
+                value = file_digest(value) if value and os.path.isfile(value) else None
+            canon[name] = value
+        return hash_key(canon)
+
+
+class LayerCache(DiskCache):
+    """Rasterised header / patron strip / plate PNGs keyed on their pixel inputs."""
+
+    def __init__(self, root, max_bytes=DEFAULT_LAYER_MAX_MB * 1024 * 1024):
+        super().__init__(root, max_bytes=max_bytes, suffix='.png')
+
+    @staticmethod
+    def key_for(kind, inputs):
+        """Hash of a layer *kind* ('header', 'patrons', ...) and the dict of
+        arguments its renderer was called with.  File inputs contribute their
+        content hash, as in RenderCache."""
+        canon = {}
+        for name, value in inputs.items():
+            if name in _LAYER_FILE_PARAMS:
+                value = file_digest(value) if value and os.path.isfile(value) else None
+            canon[name] = value
+        return hash_key({'_version': LAYER_CACHE_VERSION, 'kind': kind,
+                         'inputs': canon})
+
+
+_SPRITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sprites (
+    key    TEXT PRIMARY KEY,
+    width  REAL NOT NULL,
+    x      INTEGER,
+    y      INTEGER,
+    w      INTEGER,
+    h      INTEGER,
+    data   BLOB,
+    bytes  INTEGER NOT NULL,
+    used   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sprites_used ON sprites (used);
+"""
+
+
+class Sprite:
+    """A rasterised piece of text: advance width plus an 'L' coverage mask.
+
+    The mask is pasted with the text colour at ``(x0 + x, y0 + y)`` where
+    ``(x0, y0)`` is the integer part of the draw position.  *mask* is None
+    for width-only records and for text that draws no pixels.
+    """
+
+    def __init__(self, width, x=0, y=0, mask=None):
+        self.width = width
+        self.x = x
+        self.y = y
+        self.mask = mask
+
+
+class SpriteCache:
+    """Disk-backed cache of rasterised names, evicted LRU by total bytes.
+
+    Keys come from ``key_for(text, font_path, size, bold, phase, engine)``;
+    *phase* is the fractional part of the x position the text is drawn at
+    (Pillow positions glyphs with sub-pixel precision), or None for a
+    width-only record, and *engine* the text engine that drew it.  Masks are stored zlib-compressed.
+    """
+
+    def __init__(self, db_path, max_bytes=DEFAULT_SPRITE_MAX_MB * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.executescript(_SPRITE_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return _Closing(conn)
+
+    @staticmethod
+    def key_for(text, font_path, size, bold, phase=None, engine='pillow'):
+        if phase is not None:
+            phase = round(phase, 6)
+        return hash_key([SPRITE_CACHE_VERSION, text, font_path, size, bool(bold),
+                         phase, engine])
+
+    def get_many(self, keys):
+        """Return {key: Sprite} for the cached subset of *keys*."""
+        from PIL import Image
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._connect() as conn:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ', '.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT * FROM sprites WHERE key IN ({marks})', chunk).fetchall()
+                for row in rows:
+                    mask = None
+                    if row['data'] is not None:
+                        mask = Image.frombytes('L', (row['w'], row['h']),
+                                               zlib.decompress(row['data']))
+                    found[row['key']] = Sprite(row['width'], row['x'], row['y'], mask)
+                if rows:
+                    conn.execute(
+                        f'UPDATE sprites SET used = ? WHERE key IN ({marks})',
+                        [time.time()] + chunk)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, sprites):
+        """Store {key: Sprite} and evict old entries beyond ``max_bytes``."""
+        if not sprites:
+            return
+        now = time.time()
+        rows = []
+        for key, sp in sprites.items():
+            data = None
+            w = h = None
+            if sp.mask is not None:
+                w, h = sp.mask.size
+                data = zlib.compress(sp.mask.tobytes(), 1)
+            rows.append((key, sp.width, sp.x, sp.y, w, h, data,
+                         len(data or b'') + 64, now))
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'INSERT OR REPLACE INTO sprites (key, width, x, y, w, h, data, bytes, used) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            conn.execute('COMMIT')
+        self.evict()
+
+    def evict(self):
+        if not self.max_bytes:
+            return
+        with self._connect() as conn:
+            total = conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM sprites').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            # Trim to 90% so eviction doesn't run on every render
+            excess = total - int(self.max_bytes * 0.9)
+            conn.execute('BEGIN IMMEDIATE')
+            freed = 0
+            doomed = []
+            for row in conn.execute('SELECT key, bytes FROM sprites ORDER BY used'):
+                if freed >= excess:
+                    break
+                doomed.append((row['key'],))
+                freed += row['bytes']
+            conn.executemany('DELETE FROM sprites WHERE key = ?', doomed)
+            conn.execute('COMMIT')
+            logger.debug("Evicted %d sprites (%d bytes)", len(doomed), freed)
+
+    def stats(self):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT COUNT(*) AS n, COALESCE(SUM(bytes), 0) AS b FROM sprites').fetchone()
+        return {'count': row['n'], 'bytes': row['b'], 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+    def purge(self):
+        with self._connect() as conn:
+            n = conn.execute('DELETE FROM sprites').rowcount
+        return n
+
+
+class _Closing:
+    """Context manager that closes a sqlite3 connection on exit."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self._conn
+
+    def __exit__(self, *exc):
+        self._conn.close()
+
+
+def load_cache_settings():
+    """Return {'enabled', 'max_bytes', 'layer_max_bytes', 'sprite_max_bytes',
+    'font_max_bytes'}.
+
+    ``RENDER_CACHE`` (0/false disables all on-disk caches),
+    ``RENDER_CACHE_MAX_MB``, ``RENDER_LAYER_CACHE_MAX_MB``,
+    ``RENDER_SPRITE_CACHE_MAX_MB`` and ``RENDER_FONT_CACHE_MAX_MB`` (the
+    in-memory sized-font cache) in the environment win over ``renderCache`` / ``renderCacheMaxMb`` in
+    generate_settings.json.
+    """
+    from .font_cache import DEFAULT_FONT_MAX_MB
+    from .path_utils import get_generate_settings_path
+    enabled = True
+    sizes = {
+        'RENDER_CACHE_MAX_MB': DEFAULT_MAX_MB,
+        'RENDER_LAYER_CACHE_MAX_MB': DEFAULT_LAYER_MAX_MB,
+        'RENDER_SPRITE_CACHE_MAX_MB': DEFAULT_SPRITE_MAX_MB,
+        'RENDER_FONT_CACHE_MAX_MB': DEFAULT_FONT_MAX_MB,
+    }
+    try:
+        with open(get_generate_settings_path()) as f:
+            settings = json.load(f)
+        if 'renderCache' in settings:
+            enabled = bool(settings['renderCache'])
+        if settings.get('renderCacheMaxMb') not in (None, ''):
+            sizes['RENDER_CACHE_MAX_MB'] = float(settings['renderCacheMaxMb'])
+    except Exception:
+        pass
+    env = os.environ.get('RENDER_CACHE')
+    if env:
+        enabled = env.strip().lower() not in ('0', 'false', 'no', 'off')
+    for name in sizes:
+        env = os.environ.get(name)
+        if env:
+            try:
+                sizes[name] = float(env)
+            except ValueError:
+                logger.warning("Ignoring invalid %s=%r", name, env)
+    mb = 1024 * 1024
+    return {
+        'enabled': enabled,
+        'max_bytes': int(sizes['RENDER_CACHE_MAX_MB'] * mb),
+        'layer_max_bytes': int(sizes['RENDER_LAYER_CACHE_MAX_MB'] * mb),
+        'sprite_max_bytes': int(sizes['RENDER_SPRITE_CACHE_MAX_MB'] * mb),
+        'font_max_bytes': int(sizes['RENDER_FONT_CACHE_MAX_MB'] * mb),
+    }
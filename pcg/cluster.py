@@ -0,0 +1,554 @@
+"""Distributed rendering: a coordinator hands time segments to worker nodes.
+
+Any server can act as coordinator.  Worker nodes started with::
+
+    PatreonCredits --worker --coordinator http://host:8787
+
+register with it over plain HTTP, send a heartbeat every few seconds and
+poll for work.  While workers are registered, each render job on the
+coordinator is split into GOP-aligned time segments (see
+``VideoRenderer.plan_segments``), a few per live worker.  A worker
+downloads the images its segment needs, renders it with
+``render_video(segment=...)`` and uploads the video; the coordinator joins
+the parts without re-encoding and adds the audio once, as a local
+segmented render does.
+
+A worker that misses heartbeats for WORKER_TIMEOUT seconds is dropped and
+its segments go back in the queue for the others; when no worker is left,
+the coordinator renders the remaining segments itself.  A segment that
+fails MAX_TASK_ATTEMPTS times fails the job.
+
+Clustering is off until ``CLUSTER_TOKEN`` is set: workers download the
+patron list and upload the videos, so the coordinator only accepts
+requests carrying the same token (``Authorization: Bearer <token>``);
+workers send theirs from the same variable.
+"""
+
+import hmac
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from . import encoders
+from .ffmpeg_runner import RenderCancelled, RenderControl, RenderTimeout
+from .path_utils import get_ffmpeg_path
+from .scratch import Scratch
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 5      # seconds between worker heartbeats
+WORKER_TIMEOUT = 20         # seconds without a heartbeat before a worker is dropped
+POLL_INTERVAL = 2           # seconds an idle worker waits between polls
+SEGMENTS_PER_WORKER = 2     # segments per live worker, so faster nodes take more
+MAX_TASK_ATTEMPTS = 3
+UPLOAD_CHUNK = 1024 * 1024
+REQUEST_TIMEOUT = 30
+
+# render_video() arguments naming files a segment render reads; audio is
+# only needed by the coordinator, which muxes it when joining
+ASSET_PARAMS = ('bg_image', 'logo_file', 'qr_image')
+
+TASK_PENDING = 'pending'
+TASK_RUNNING = 'running'
+TASK_DONE = 'done'
+TASK_FAILED = 'failed'
+
+
+class Coordinator:
+    """Registered workers and the segment tasks of distributed renders.
+
+    The Flask routes call ``register``, ``heartbeat``, ``next_task``,
+    ``complete`` and ``fail`` for the workers; a render job calls
+    ``render`` and blocks until its segments are in and joined.
+    """
+
+    def __init__(self, get_renderer, token=None):
+        # A callable, so a renderer re-created by the app (e.g. after an
+        # FFmpeg install) is picked up
+        self._get_renderer = get_renderer
+        self.token = token or None
+        self._workers = {}            # id -> worker dict
+        self._tasks = OrderedDict()   # id -> task dict, oldest render first
+        self._changed = threading.Condition()
+
+    @property
+    def renderer(self):
+        return self._get_renderer()
+
+    def authorised(self, header):
+        """True if an Authorization header value carries the cluster token;
+        always False while no token is configured."""
+        return self.token is not None and hmac.compare_digest(
+            header or '', f'Bearer {self.token}')
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def register(self, name, host=None):
+        worker = {
+            'id': uuid.uuid4().hex,
+            'name': name or 'worker',
+            'host': host,
+            'registered': datetime.now().isoformat(),
+            'seen': time.monotonic(),
+            'task': None,
+        }
+        with self._changed:
+            self._workers[worker['id']] = worker
+            self._changed.notify_all()
+        logger.info("Render worker %s (%s) registered from %s",
+                    worker['name'], worker['id'][:8], host)
+        return worker
+
+    def heartbeat(self, worker_id, task_id=None, frames=0):
+        """Mark a worker alive and record its progress on *task_id*.
+
+        Returns None for an unknown (e.g. dropped) worker, which should
+        register again, else ``{'continue': bool}``: whether the task is
+        still wanted from it.
+        """
+        with self._changed:
+            worker = self._workers.get(worker_id)
+            if worker is None:
+                return None
+            worker['seen'] = time.monotonic()
+            task = self._tasks.get(task_id) if task_id else None
+            wanted = (task is not None and task['worker'] == worker_id
+                      and task['state'] == TASK_RUNNING)
+            if wanted:
+                task['frames'] = int(frames or 0)
+                self._changed.notify_all()
+            return {'continue': wanted}
+
+    def _reap(self):
+        """Drop silent workers and re-queue their segments (lock held)."""
+        now = time.monotonic()
+        for worker in [w for w in self._workers.values()
+                       if now - w['seen'] > WORKER_TIMEOUT]:
+            del self._workers[worker['id']]
+            logger.warning("Render worker %s (%s) stopped responding",
+                           worker['name'], worker['id'][:8])
+            for task in self._tasks.values():
+                if task['worker'] == worker['id'] and task['state'] == TASK_RUNNING:
+                    task.update(state=TASK_PENDING, worker=None, frames=0)
+                    logger.info("Re-queued segment %d of render %s",
+                                task['index'], task['render'][:8])
+            self._changed.notify_all()
+
+    def live_workers(self):
+        if self.token is None:
+            return []
+        with self._changed:
+            self._reap()
+            return list(self._workers.values())
+
+    # ------------------------------------------------------------------
+    # Tasks
+    # ------------------------------------------------------------------
+
+    def next_task(self, worker_id):
+        """Assign the oldest pending segment to a worker.
+
+        Returns the task description, {} when there is nothing to do, or
+        None for an unknown worker.
+        """
+        with self._changed:
+            self._reap()
+            worker = self._workers.get(worker_id)
+            if worker is None:
+                return None
+            worker['seen'] = time.monotonic()
+            for task in self._tasks.values():
+                if task['state'] == TASK_PENDING:
+                    task.update(state=TASK_RUNNING, worker=worker_id, frames=0,
+                                attempts=task['attempts'] + 1)
+                    worker['task'] = task['id']
+                    self._changed.notify_all()
+                    return {
+                        'id': task['id'],
+                        'params': task['params'],
+                        'segment': task['segment'],
+                        'files': {k: os.path.basename(v) for k, v in task['files'].items()},
+                    }
+            worker['task'] = None
+            return {}
+
+    def task_file(self, task_id, name):
+        """Path of asset *name* ('bg_image', ...) of a task, or None."""
+        with self._changed:
+            task = self._tasks.get(task_id)
+            return task['files'].get(name) if task else None
+
+    def complete(self, task_id, worker_id, stream, size=0):
+        """Store an uploaded segment video read from *stream*.
+
+        The first upload of a segment wins (it may have been re-assigned
+        while a slow worker was still on it); returns False if the segment
+        is unknown or already done.
+        """
+        with self._changed:
+            task = self._tasks.get(task_id)
+            if task is None or task['state'] == TASK_DONE:
+                return False
+            scratch = task['scratch']
+            suffix = task['suffix']
+        path = scratch.path(suffix, size=size)
+        with open(path, 'wb') as f:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK)
+                if not chunk:
+                    break
+                f.write(chunk)
+        with self._changed:
+            task = self._tasks.get(task_id)
+            if task is None or task['state'] == TASK_DONE:
+                os.unlink(path)
+                return False
+            task.update(state=TASK_DONE, result=path, frames=task['segment'][1])
+            worker = self._workers.get(worker_id)
+            if worker is not None and worker['task'] == task_id:
+                worker['task'] = None
+            self._changed.notify_all()
+        return True
+
+    def fail(self, task_id, worker_id, error):
+        """Record a failed segment; it is retried until MAX_TASK_ATTEMPTS."""
+        with self._changed:
+            task = self._tasks.get(task_id)
+            if task is None or task['state'] != TASK_RUNNING or task['worker'] != worker_id:
+                return False
+            self._failed(task, error)
+            return True
+
+    def _failed(self, task, error):
+        task['errors'].append(str(error))
+        task.update(worker=None, frames=0)
+        task['state'] = TASK_FAILED if task['attempts'] >= MAX_TASK_ATTEMPTS else TASK_PENDING
+        logger.warning("Segment %d of render %s failed (attempt %d): %s",
+                       task['index'], task['render'][:8], task['attempts'], error)
+        self._changed.notify_all()
+
+    def status(self):
+        """Workers and segment tasks, for ``GET /api/cluster``."""
+        with self._changed:
+            self._reap()
+            now = time.monotonic()
+            return {
+                'workers': [{
+                    'id': w['id'], 'name': w['name'], 'host': w['host'],
+                    'registered': w['registered'],
+                    'last_seen': round(now - w['seen'], 1),
+                    'task': w['task'],
+                } for w in self._workers.values()],
+                'tasks': [{
+                    'id': t['id'], 'render': t['render'], 'index': t['index'],
+                    'segment': t['segment'], 'state': t['state'],
+                    'worker': t['worker'], 'attempts': t['attempts'],
+                    'frames': t['frames'],
+                } for t in self._tasks.values()],
+            }
+
+    # ------------------------------------------------------------------
+    # Rendering
+    # ------------------------------------------------------------------
+
+    def render(self, params, progress_callback=None, control=None):
+        """Render *params* (render_video kwargs) on the workers.
+
+        Blocks until every segment is in, joins them and returns the
+        output filename, like ``VideoRenderer.render_video``, whose render
+        cache it shares.
+        """
+        report = progress_callback or (lambda info: None)
+        renderer = self.renderer
+        cache_key, filename = renderer.cached_render(params)
+        if filename:
+            report({'stage': 'cached', 'percent': 100.0})
+            return filename
+        workers = len(self.live_workers())
+        duration = params.get('duration', 15)
+        fps = params.get('fps', 30)
+        bounds = renderer.plan_segments(duration, fps,
+                                        max(1, workers) * SEGMENTS_PER_WORKER)
+        total = sum(count for _, count in bounds)
+        encoder = params.get('encoder') or renderer.encoder
+        suffix = encoders.extension(encoders.resolve_profile(encoder, get_ffmpeg_path()))
+        render_id = uuid.uuid4().hex
+        # The coordinator's encoder profile, not each worker's default, so
+        # the parts can be joined
+        task_params = {k: v for k, v in params.items()
+                       if k not in ('audio_file', 'audio_volume')}
+        task_params['encoder'] = encoder
+        files = {k: task_params.pop(k) for k in ASSET_PARAMS
+                 if task_params.get(k) and os.path.isfile(task_params[k])}
+        for k in ASSET_PARAMS:
+            task_params.pop(k, None)
+        scratch = Scratch(**renderer.scratch_settings)
+        tasks = [{
+            'id': uuid.uuid4().hex, 'render': render_id, 'index': i,
+            'segment': [first, count], 'params': task_params, 'files': files,
+            'state': TASK_PENDING, 'worker': None, 'attempts': 0, 'frames': 0,
+            'errors': [], 'result': None, 'scratch': scratch, 'suffix': suffix,
+        } for i, (first, count) in enumerate(bounds)]
+        with self._changed:
+            for task in tasks:
+                self._tasks[task['id']] = task
+            self._changed.notify_all()
+        logger.info("Distributing render %s as %d segments over %d worker(s)",
+                    render_id[:8], len(tasks), workers)
+        started = time.monotonic()
+        report({'stage': 'encoding', 'percent': 0, 'segments': len(tasks)})
+        try:
+            while True:
+                if control is not None:
+                    control.check()
+                local = None
+                with self._changed:
+                    self._reap()
+                    failed = [t for t in tasks if t['state'] == TASK_FAILED]
+                    if failed:
+                        raise Exception(f"Segment {failed[0]['index']} failed: "
+                                        f"{failed[0]['errors'][-1]}")
+                    if all(t['state'] == TASK_DONE for t in tasks):
+                        break
+                    pending = [t for t in tasks if t['state'] == TASK_PENDING]
+                    if pending and not self._workers:
+                        # No worker left: render the segment here
+                        local = pending[0]
+                        local.update(state=TASK_RUNNING, worker=None, frames=0,
+                                     attempts=local['attempts'] + 1)
+                    else:
+                        self._changed.wait(0.5)
+                    frames = sum(t['frames'] for t in tasks)
+                    busy = len({t['worker'] for t in tasks
+                                if t['state'] == TASK_RUNNING and t['worker']})
+                elapsed = time.monotonic() - started
+                report({
+                    'stage': 'encoding',
+                    'frame': frames,
+                    'total_frames': total,
+                    'percent': round(min(100.0, 100.0 * frames / total), 1) if total else None,
+                    'fps': round(frames / elapsed, 1) if elapsed > 0 else 0.0,
+                    'eta': round((total - frames) * elapsed / frames, 1) if frames else None,
+                    'elapsed': round(elapsed, 1),
+                    'segments': len(tasks),
+                    'workers': busy,
+                })
+                if local is not None:
+                    self._render_locally(renderer, local, control)
+            record = dict(resolution=params.get('resolution'), fps=fps, duration=duration,
+                          frames=total, patron_count=len(params.get('patrons') or ()),
+                          workers=workers,
+                          encode_seconds=round(time.monotonic() - started, 2))
+            filename = renderer.join_segments(
+                [t['result'] for t in tasks], total_frames=total,
+                audio_file=params.get('audio_file'),
+                audio_volume=params.get('audio_volume', 1.0),
+                encoder=encoder, record=record,
+                progress_callback=report, control=control)
+            if cache_key is not None:
+                try:
+                    renderer.render_cache.put(
+                        cache_key, os.path.join(renderer.output_dir, filename), meta={
+                            'filename': filename, 'resolution': params.get('resolution'),
+                            'duration': duration, 'fps': fps,
+                            'patron_count': record['patron_count'],
+                        })
+                except OSError as e:
+                    logger.warning("Could not store render in cache: %s", e)
+            return filename
+        finally:
+            with self._changed:
+                for task in tasks:
+                    self._tasks.pop(task['id'], None)
+                self._changed.notify_all()
+            scratch.cleanup()
+
+    def _render_locally(self, renderer, task, control):
+        logger.info("Rendering segment %d of render %s on the coordinator",
+                    task['index'], task['render'][:8])
+
+        def progress(info):
+            if info.get('stage') == 'encoding' and info.get('frame') is not None:
+                with self._changed:
+                    task['frames'] = info['frame']
+
+        try:
+            filename = renderer.render_video(
+                **task['params'], **task['files'], segment=tuple(task['segment']),
+                progress_callback=progress, control=control)
+        except (RenderCancelled, RenderTimeout):
+            raise
+        except Exception as e:
+            with self._changed:
+                self._failed(task, e)
+            return
+        source = os.path.join(renderer.output_dir, filename)
+        path = task['scratch'].path(task['suffix'], size=os.path.getsize(source))
+        shutil.move(source, path)
+        with self._changed:
+            task.update(state=TASK_DONE, result=path, frames=task['segment'][1])
+            self._changed.notify_all()
+
+
+class Worker:
+    """Pulls segment tasks from a coordinator and renders them."""
+
+    def __init__(self, coordinator_url, name=None, token=None, poll_interval=POLL_INTERVAL):
+        import requests
+
+        self.url = coordinator_url.rstrip('/')
+        self.name = name or f'{socket.gethostname()}-{os.getpid()}'
+        self.poll_interval = poll_interval
+        self.session = requests.Session()
+        if token:
+            self.session.headers['Authorization'] = f'Bearer {token}'
+        self.worker_id = None
+        self._lock = threading.Lock()
+        self._task = None        # (task id, RenderControl) being rendered
+        self._frames = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            if self._task is not None:
+                self._task[1].cancel()
+
+    def _register(self):
+        import requests
+
+        delay = self.poll_interval
+        while not self._stop.is_set():
+            try:
+                r = self.session.post(f'{self.url}/api/cluster/workers',
+                                      json={'name': self.name}, timeout=REQUEST_TIMEOUT)
+                r.raise_for_status()
+                self.worker_id = r.json()['worker_id']
+                logger.info("Registered with coordinator %s as %s (%s)",
+                            self.url, self.name, self.worker_id[:8])
+                return
+            except (requests.RequestException, ValueError, KeyError) as e:
+                logger.warning("Could not register with %s: %s", self.url, e)
+                self._stop.wait(delay)
+                delay = min(delay * 2, 60)
+
+    def _heartbeat_loop(self):
+        import requests
+
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            worker_id = self.worker_id
+            if worker_id is None:
+                continue
+            with self._lock:
+                task = self._task
+                frames = self._frames
+            try:
+                r = self.session.post(
+                    f'{self.url}/api/cluster/workers/{worker_id}/heartbeat',
+                    json={'task': task[0] if task else None, 'frames': frames},
+                    timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                logger.warning("Heartbeat to %s failed: %s", self.url, e)
+                continue
+            if r.status_code == 404:
+                # The coordinator dropped us (or restarted): start over
+                logger.warning("Coordinator no longer knows this worker; re-registering")
+                self.worker_id = None
+                if task:
+                    task[1].cancel()
+            elif r.ok and task and not r.json().get('continue'):
+                logger.info("Coordinator no longer needs segment %s", task[0][:8])
+                task[1].cancel()
+
+    def _progress(self, info):
+        if info.get('stage') == 'encoding' and info.get('frame') is not None:
+            with self._lock:
+                self._frames = info['frame']
+
+    def _run_task(self, renderer, task):
+        import requests
+
+        control = RenderControl()
+        with self._lock:
+            self._task = (task['id'], control)
+            self._frames = 0
+        base = f"{self.url}/api/cluster/tasks/{task['id']}"
+        logger.info("Rendering segment %s (frames %d-%d)", task['id'][:8],
+                    task['segment'][0], sum(task['segment']) - 1)
+        try:
+            with Scratch(**renderer.scratch_settings) as scratch:
+                params = dict(task['params'])
+                for name, filename in task['files'].items():
+                    path = scratch.path(os.path.splitext(filename)[1])
+                    with self.session.get(f'{base}/files/{name}', stream=True,
+                                          timeout=REQUEST_TIMEOUT) as r:
+                        r.raise_for_status()
+                        with open(path, 'wb') as f:
+                            for chunk in r.iter_content(UPLOAD_CHUNK):
+                                f.write(chunk)
+                    params[name] = path
+                filename = renderer.render_video(
+                    **params, segment=tuple(task['segment']),
+                    progress_callback=self._progress, control=control)
+            path = os.path.join(renderer.output_dir, filename)
+            try:
+                with open(path, 'rb') as f:
+                    r = self.session.put(f'{base}/result', params={'worker': self.worker_id},
+                                         data=f, timeout=None)
+                if r.status_code == 409:
+                    logger.info("Segment %s was already delivered by another worker",
+                                task['id'][:8])
+                else:
+                    r.raise_for_status()
+            finally:
+                os.unlink(path)
+        except RenderCancelled:
+            logger.info("Segment %s cancelled", task['id'][:8])
+        except Exception as e:
+            logger.error("Segment %s failed: %s", task['id'][:8], e, exc_info=True)
+            try:
+                self.session.post(f'{base}/failed', json={'worker': self.worker_id,
+                                                          'error': str(e)},
+                                  timeout=REQUEST_TIMEOUT)
+            except requests.RequestException:
+                pass
+        finally:
+            with self._lock:
+                self._task = None
+                self._frames = 0
+
+    def run(self):
+        """Register, then render segments until ``stop()`` is called."""
+        import requests
+
+        from .ffmpeg_renderer import VideoRenderer
+
+        renderer = VideoRenderer()
+        threading.Thread(target=self._heartbeat_loop, name='cluster-heartbeat',
+                         daemon=True).start()
+        while not self._stop.is_set():
+            if self.worker_id is None:
+                self._register()
+                continue
+            try:
+                r = self.session.post(
+                    f'{self.url}/api/cluster/workers/{self.worker_id}/tasks/next',
+                    timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                logger.warning("Could not reach coordinator %s: %s", self.url, e)
+                self._stop.wait(self.poll_interval)
+                continue
+            if r.status_code == 404:
+                self.worker_id = None
+            elif r.status_code == 200:
+                self._run_task(renderer, r.json())
+            else:
+                self._stop.wait(self.poll_interval)
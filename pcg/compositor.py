@@ -0,0 +1,142 @@
+"""Frame-by-frame compositing in NumPy, piped to FFmpeg as raw video.
+
+The default render path hands FFmpeg the background, the strip tiles, the
+header, logo and QR and lets a chain of ``overlay`` filters position and
+blend them for every frame.  FrameCompositor does the same work in
+Python instead: everything that never moves is flattened once into a
+background plate (solid colour, gradient or image) and a foreground plate
+(header, logo and QR with alpha), and each frame is
+
+    background plate
+    + the visible rows of the current strip tile, blended by its alpha
+    + the foreground plate, blended only where it is not transparent
+    x the fade factor
+
+written into one reused rgb24 buffer.  FFmpeg reads the frames from stdin
+(``-f rawvideo -pix_fmt rgb24 -i pipe:0``) and only converts and encodes.
+
+Blends are integer ``(src*a + dst*(255-a)) / 255`` with rounding, on
+uint16 so no step needs a float or a wider type.
+"""
+
+import numpy as np
+from PIL import Image
+
+
+def _div255(x):
+    """Round x / 255 for uint16 x <= 255*255, in place."""
+    x += 128
+    x += x >> 8
+    x >>= 8
+    return x
+
+
+def _premultiplied(rgba):
+    """Split an RGBA array into (rgb * alpha, 255 - alpha) as uint16."""
+    alpha = rgba[..., 3:4].astype(np.uint16)
+    return rgba[..., :3] * alpha, 255 - alpha
+
+
+class _Plate:
+    """Rows of an RGBA layer that are not fully transparent, ready to blend."""
+
+    def __init__(self, image):
+        rgba = np.asarray(image.convert('RGBA'))
+        alpha = rgba[..., 3]
+        self.runs = []   # (y0, y1, x0, x1, rgb or None, premultiplied, inverse alpha)
+        rows = np.flatnonzero(alpha.any(axis=1))
+        if not len(rows):
+            return
+        # Split into runs of consecutive non-transparent rows
+        breaks = np.flatnonzero(np.diff(rows) > 1)
+        for start, end in zip(np.r_[0, breaks + 1], np.r_[breaks, len(rows) - 1]):
+            y0, y1 = int(rows[start]), int(rows[end]) + 1
+            cols = np.flatnonzero(alpha[y0:y1].any(axis=0))
+            x0, x1 = int(cols[0]), int(cols[-1]) + 1
+            block = rgba[y0:y1, x0:x1]
+            if (block[..., 3] == 255).all():
+                self.runs.append((y0, y1, x0, x1, np.ascontiguousarray(block[..., :3]),
+                                  None, None))
+            else:
+                premul, inverse = _premultiplied(block)
+                self.runs.append((y0, y1, x0, x1, None, premul, inverse))
+
+    def blend_onto(self, out):
+        for y0, y1, x0, x1, rgb, premul, inverse in self.runs:
+            dst = out[y0:y1, x0:x1]
+            if rgb is not None:
+                dst[...] = rgb
+            else:
+                dst[...] = _div255(dst * inverse + premul)
+
+
+class FrameCompositor:
+    """Builds credits frames from static plates and scrolling strip tiles.
+
+    *background* is an RGB image of the frame size; *foreground* an
+    optional RGBA image of the frame size drawn over the strip.  Fades are
+    to black, like FFmpeg's ``fade`` filter.
+    """
+
+    def __init__(self, background, foreground=None, fade_in=0, fade_out=0,
+                 duration=0):
+        self._background = np.asarray(background.convert('RGB'))
+        self.height, self.width = self._background.shape[:2]
+        self._foreground = _Plate(foreground) if foreground is not None else None
+        self.fade_in = float(fade_in or 0)
+        self.fade_out = float(fade_out or 0)
+        self.duration = float(duration)
+        self._frame = np.empty_like(self._background)
+        self._tile_path = None
+        self._tile = None
+
+    def _load_tile(self, path):
+        if path != self._tile_path:
+            with Image.open(path) as im:
+                im.load()
+                if im.mode == 'RGBA':
+                    tile = _premultiplied(np.asarray(im))
+                else:
+                    tile = (np.asarray(im.convert('RGB')), None)
+            self._tile_path, self._tile = path, tile
+        return self._tile
+
+    def fade_factor(self, t):
+        """Brightness (0-1) at time *t* from the fade-in and fade-out."""
+        factor = 1.0
+        if self.fade_in > 0:
+            factor = min(factor, max(0.0, t / self.fade_in))
+        if self.fade_out > 0:
+            start = max(0.0, self.duration - self.fade_out)
+            factor = min(factor, max(0.0, 1 - (t - start) / self.fade_out))
+        return factor
+
+    def compose(self, tile_path, y, t):
+        """Return the rgb24 frame with *tile_path*'s top row at frame row *y*.
+
+        The returned array is reused by the next call.
+        """
+        out = self._frame
+        np.copyto(out, self._background)
+        first, second = self._load_tile(tile_path)
+        a, b = max(0, y), min(self.height, y + len(first))
+        if a < b:
+            rows = slice(a - y, b - y)
+            if second is None:
+                out[a:b] = first[rows]
+            else:
+                out[a:b] = _div255(out[a:b] * second[rows] + first[rows])
+        if self._foreground is not None:
+            self._foreground.blend_onto(out)
+        factor = self.fade_factor(t)
+        if factor <= 0:
+            out.fill(0)
+        elif factor < 1:
+            lut = np.round(np.arange(256) * factor).astype(np.uint8)
+            out[...] = lut[out]
+        return out
+
+    def frames(self, scroll):
+        """Yield raw frames for *scroll*, an iterable of (tile path, y, t)."""
+        for tile_path, y, t in scroll:
+            yield self.compose(tile_path, y, t).data
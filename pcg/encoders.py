@@ -0,0 +1,362 @@
+"""Named encoder profiles for the final video.
+
+Every render used to end in the same hard-coded ``-c:v libx264 -pix_fmt
+yuv420p -preset fast``, AAC at 192k and FFmpeg's default threading and
+keyframe interval.  A profile bundles those choices under a name that a
+/generate request (``"encoder": "h264-edit"``), a saved preset or the
+server default (``RENDER_ENCODER``) selects:
+
+    codec        FFmpeg video encoder (libx264, libx265, libvpx-vp9, ...)
+    container    output file extension ('mp4', 'webm' or 'mov')
+    alpha        encode a transparent overlay: only the header and the
+                 scrolling names, without the background, in a pix_fmt
+                 that keeps the alpha channel
+    preset, crf, tune
+                 speed/size trade-off and constant-quality level, in the
+                 encoder's own terms
+    gop          keyframe interval in seconds; 0 makes every frame a
+                 keyframe (all-intra), which editors scrub and cut without
+                 decoding back to the previous keyframe
+    threads      encoder threads; 0 leaves the choice to FFmpeg
+    options      any further encoder arguments
+    audio_codec, audio_bitrate
+                 (no bitrate for uncompressed PCM)
+
+The built-in profiles are tuned for speed, size or editing (``goal``);
+the editing ones with alpha drop onto a track above the footage without
+keying.
+``encoder_profiles.json`` in the data directory adds profiles or changes
+keys of built-in ones; a new entry may name another profile as ``base``
+and list only the keys that differ.  A profile whose encoder this FFmpeg build lacks is listed
+as unavailable and rejected, unless its ``fallback`` keys name an encoder
+that is present.
+
+Each finished video gets a ``<name>.json`` sidecar recording the profile,
+the FFmpeg arguments it produced, the encode time and the file size, so
+profiles can be compared on real renders.
+"""
+
+import functools
+import json
+import logging
+import os
+import subprocess
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODER = 'h264-fast'
+ENCODER_GOALS = ('balanced', 'speed', 'size', 'editing')
+VIDEO_EXTENSIONS = ('.mp4', '.webm', '.mov')
+
+# Keys every profile has; a profile only lists what differs
+PROFILE_DEFAULTS = {
+    'label': '',
+    'description': '',
+    'goal': 'balanced',
+    'codec': 'libx264',
+    'container': 'mp4',
+    'pix_fmt': 'yuv420p',
+    'alpha': False,
+    'preset': None,
+    'crf': None,
+    'tune': None,
+    'gop': None,
+    'threads': 0,
+    'options': [],
+    'audio_codec': 'aac',
+    'audio_bitrate': '192k',
+}
+
+ENCODER_PROFILES = {
+    'h264-fast': {
+        'label': 'H.264 (fast)',
+        'description': 'Quick encodes that play everywhere; the long-standing default.',
+        'preset': 'fast', 'crf': 23,
+    },
+    'h264-draft': {
+        'label': 'H.264 draft',
+        'goal': 'speed',
+        'description': 'Fastest encode for previews; larger files.',
+        'preset': 'ultrafast', 'crf': 26,
+    },
+    'h264-small': {
+        'label': 'H.264 (small)',
+        'goal': 'size',
+        'description': 'Slower encode tuned for flat text on plain backgrounds.',
+        'preset': 'slow', 'crf': 26, 'tune': 'animation',
+    },
+    'h264-edit': {
+        'label': 'H.264 all-intra',
+        'goal': 'editing',
+        'description': 'Every frame a keyframe, so editors scrub and cut instantly; large files.',
+        'preset': 'veryfast', 'crf': 18, 'tune': 'fastdecode', 'gop': 0,
+    },
+    'hevc-small': {
+        'label': 'H.265 / HEVC',
+        'goal': 'size',
+        'description': 'Roughly half the size of H.264 at similar quality; slower to encode.',
+        'codec': 'libx265', 'preset': 'medium', 'crf': 28,
+        'options': ['-tag:v', 'hvc1', '-x265-params', 'log-level=error'],
+    },
+    'vp9-web': {
+        'label': 'VP9 (WebM)',
+        'goal': 'size',
+        'description': 'Royalty-free WebM for browsers and web embeds.',
+        'codec': 'libvpx-vp9', 'container': 'webm', 'crf': 33,
+        'options': ['-b:v', '0', '-deadline', 'good', '-cpu-used', '4', '-row-mt', '1'],
+        'audio_codec': 'libopus', 'audio_bitrate': '128k',
+    },
+    'prores-alpha': {
+        'label': 'ProRes 4444 (alpha)',
+        'goal': 'editing',
+        'description': 'Transparent overlay for editors: names and header only, no background.',
+        'codec': 'prores_ks', 'container': 'mov', 'pix_fmt': 'yuva444p10le', 'alpha': True,
+        'options': ['-profile:v', '4444', '-vendor', 'apl0'],
+        'audio_codec': 'pcm_s16le', 'audio_bitrate': None,
+    },
+    'qtrle-alpha': {
+        'label': 'QuickTime Animation (alpha)',
+        'goal': 'editing',
+        'description': 'Lossless transparent overlay; smaller than ProRes for flat text.',
+        'codec': 'qtrle', 'container': 'mov', 'pix_fmt': 'argb', 'alpha': True,
+        'audio_codec': 'pcm_s16le', 'audio_bitrate': None,
+    },
+    'png-alpha': {
+        'label': 'PNG frames (alpha)',
+        'goal': 'editing',
+        'description': 'Lossless PNG image per frame with alpha, in one QuickTime file.',
+        'codec': 'png', 'container': 'mov', 'pix_fmt': 'rgba', 'alpha': True,
+        'audio_codec': 'pcm_s16le', 'audio_bitrate': None,
+    },
+    'vp9-alpha': {
+        'label': 'VP9 WebM (alpha)',
+        'goal': 'size',
+        'description': 'Small transparent WebM for browsers, OBS and web overlays.',
+        'codec': 'libvpx-vp9', 'container': 'webm', 'pix_fmt': 'yuva420p', 'alpha': True,
+        'crf': 30,
+        # libvpx keeps alpha only without alternate reference frames
+        'options': ['-b:v', '0', '-deadline', 'good', '-cpu-used', '4', '-row-mt', '1',
+                    '-auto-alt-ref', '0'],
+        'audio_codec': 'libopus', 'audio_bitrate': '128k',
+    },
+    'av1-small': {
+        'label': 'AV1',
+        'goal': 'size',
+        'description': 'Smallest files; the slowest encode.',
+        'codec': 'libsvtav1', 'preset': '8', 'crf': 35,
+        'fallback': {
+            'codec': 'libaom-av1', 'preset': None,
+            'options': ['-b:v', '0', '-cpu-used', '6', '-row-mt', '1'],
+        },
+    },
+}
+
+
+def _profiles_path():
+    from .path_utils import get_encoder_profiles_path
+    return get_encoder_profiles_path()
+
+
+def load_profiles():
+    """Built-in profiles merged with encoder_profiles.json, by name.
+
+    Each profile is complete (every PROFILE_DEFAULTS key) and carries its
+    ``name``.  The file is only re-read when its mtime changes.
+    """
+    path = _profiles_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    return {name: dict(p) for name, p in _load_profiles(path, mtime).items()}
+
+
+@functools.lru_cache(maxsize=1)
+def _load_profiles(path, mtime):
+    raw = {name: dict(p) for name, p in ENCODER_PROFILES.items()}
+    if mtime is not None:
+        try:
+            with open(path, encoding='utf-8') as f:
+                custom = json.load(f)
+            for name, p in custom.items():
+                if isinstance(p, dict):
+                    # Same-named entries change only the keys they list
+                    raw[name] = dict(raw.get(name, {}), **p)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring %s: %s", path, e)
+
+    def resolve(name, seen=()):
+        p = raw[name]
+        base = p.get('base')
+        if base and base in raw and base not in seen:
+            merged = resolve(base, seen + (name,))
+            if 'codec' in p:
+                # The base's fallback encoder is for the base's codec
+                merged.pop('fallback', None)
+        else:
+            merged = dict(PROFILE_DEFAULTS)
+        merged.update({k: v for k, v in p.items() if k != 'base'})
+        return merged
+
+    profiles = {}
+    for name in raw:
+        p = resolve(name)
+        p['name'] = name
+        p['label'] = p['label'] or name
+        profiles[name] = p
+    return profiles
+
+
+@functools.lru_cache(maxsize=4)
+def available_codecs(ffmpeg_path):
+    """Names of the video and audio encoders in this FFmpeg build."""
+    from .path_utils import _subprocess_kwargs
+    try:
+        out = subprocess.run([ffmpeg_path, '-hide_banner', '-encoders'],
+                             capture_output=True, text=True, timeout=15,
+                             **_subprocess_kwargs()).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning("Could not list FFmpeg encoders: %s", e)
+        return frozenset()
+    codecs = set()
+    for line in out.splitlines():
+        parts = line.split()
+        # " V....D libx264   libx264 H.264 ..." after the legend
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in 'VAS' \
+                and parts[1] != '=':
+            codecs.add(parts[1])
+    return frozenset(codecs)
+
+
+def _usable(profile, codecs):
+    """*profile*, with its fallback applied if needed, or None."""
+    if not codecs:
+        # Could not ask FFmpeg; let the encode itself report problems
+        return profile
+    if profile['codec'] in codecs:
+        return profile
+    fallback = profile.get('fallback')
+    if fallback and fallback.get('codec') in codecs:
+        return dict(profile, **fallback)
+    return None
+
+
+def list_profiles(ffmpeg_path):
+    """Every profile with an ``available`` flag, for the API and the UI."""
+    codecs = available_codecs(ffmpeg_path)
+    listed = []
+    for name, p in load_profiles().items():
+        usable = _usable(p, codecs)
+        shown = usable or p
+        listed.append({
+            'name': name, 'label': shown['label'], 'goal': shown['goal'],
+            'description': shown['description'], 'codec': shown['codec'],
+            'container': shown['container'], 'alpha': bool(shown['alpha']),
+            'available': usable is not None,
+        })
+    return listed
+
+
+def resolve_profile(name, ffmpeg_path):
+    """The profile called *name*, ready to encode with.
+
+    Raises ValueError for an unknown profile or one whose encoder this
+    FFmpeg build lacks.
+    """
+    profiles = load_profiles()
+    if name not in profiles:
+        raise ValueError(f'Unknown encoder profile: {name!r} '
+                         f'(one of {", ".join(profiles)})')
+    profile = _usable(profiles[name], available_codecs(ffmpeg_path))
+    if profile is None:
+        raise ValueError(f'Encoder profile {name!r} needs {profiles[name]["codec"]}, '
+                         f'which this FFmpeg build does not include')
+    return profile
+
+
+def load_default_encoder():
+    """Default encoder profile name: ``RENDER_ENCODER`` env, else the saved
+    ``encoder`` setting, else 'h264-fast'."""
+    from .path_utils import get_generate_settings_path
+    value = os.environ.get('RENDER_ENCODER', '').strip()
+    if not value:
+        try:
+            with open(get_generate_settings_path()) as f:
+                value = str(json.load(f).get('encoder') or '').strip()
+        except Exception:
+            pass
+    return value or DEFAULT_ENCODER
+
+
+def video_args(profile, fps, gop=None, threads=None):
+    """FFmpeg output arguments encoding video with *profile*.
+
+    *gop* (frames) and *threads* apply when the profile leaves them open,
+    e.g. for segment encodes that must cut at known keyframes.
+    """
+    args = ['-c:v', profile['codec'], '-pix_fmt', profile['pix_fmt']]
+    if profile['preset'] is not None:
+        args += ['-preset', str(profile['preset'])]
+    if profile['tune']:
+        args += ['-tune', profile['tune']]
+    if profile['crf'] is not None:
+        args += ['-crf', str(profile['crf'])]
+    args += ['-r', str(fps)]
+    if profile['gop'] is not None:
+        gop = max(1, round(float(profile['gop']) * fps))
+    if gop:
+        args += ['-g', str(gop)]
+    threads = profile['threads'] or threads
+    if threads:
+        args += ['-threads', str(threads)]
+    return args + [str(a) for a in profile['options']]
+
+
+def audio_args(profile):
+    args = ['-c:a', profile['audio_codec']]
+    if profile['audio_bitrate']:
+        args += ['-b:a', str(profile['audio_bitrate'])]
+    return args
+
+
+def extension(profile):
+    return '.' + profile['container']
+
+
+def sidecar_path(video_path):
+    return os.path.splitext(video_path)[0] + '.json'
+
+
+def write_sidecar(video_path, profile, args, **info):
+    """Record how *video_path* was encoded next to it."""
+    size = os.path.getsize(video_path)
+    frames = info.get('frames')
+    seconds = info.get('encode_seconds')
+    duration = info.get('duration')
+    record = {
+        'filename': os.path.basename(video_path),
+        'created': datetime.now().isoformat(),
+        'encoder': {
+            'profile': profile['name'], 'label': profile['label'],
+            'goal': profile['goal'], 'codec': profile['codec'],
+            'alpha': bool(profile['alpha']), 'args': args,
+        },
+        'size': size,
+        'bitrate_kbps': round(size * 8 / 1000 / duration, 1) if duration else None,
+        'encode_fps': round(frames / seconds, 1) if frames and seconds else None,
+    }
+    record.update(info)
+    try:
+        with open(sidecar_path(video_path), 'w', encoding='utf-8') as f:
+            json.dump(record, f, indent=2)
+    except OSError as e:
+        logger.warning("Could not write encode record for %s: %s", video_path, e)
+
+
+def read_sidecar(video_path):
+    try:
+        with open(sidecar_path(video_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -1,13 +1,39 @@
+import inspect
+import json
 import logging
+import math
+import multiprocessing
 import os
-import subprocess
-import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
 from PIL import Image, ImageDraw, ImageFont
-from fontTools.ttLib import TTFont
 
-from .path_utils import get_output_dir, get_fonts_dir, get_ffmpeg_path, check_ffmpeg as _check_ffmpeg, _subprocess_kwargs
+try:
+    import numpy as np
+except ImportError:     # optional; batch text measuring falls back to per line
+    np = None
+
+from . import encoders
+from .cache import (
+    LayerCache, LRUCache, RenderCache, Sprite, SpriteCache, link_or_copy,
+    load_cache_settings,
+)
+from .ffmpeg_runner import run_ffmpeg, run_ffmpeg_parallel
+from .font_cache import get_font_cache
+from .font_index import get_font_index
+from .glyph_atlas import GlyphAtlas
+from .scratch import Scratch, load_scratch_settings
+from .strip import PatronStrip
+from .path_utils import (
+    get_output_dir, get_fonts_dir, get_ffmpeg_path, get_cache_dir,
+    get_generate_settings_path, check_ffmpeg as _check_ffmpeg,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +41,45 @@ logger = logging.getLogger(__name__)
 LINE_SPACING_MULTIPLIER = 1.4
 HEADER_PADDING_BASE = 30
 
+# Text rasterisers: 'pillow' draws every run with ImageDraw.text;
+# 'atlas' blits cached glyph bitmaps (see glyph_atlas.py).
+TEXT_ENGINES = ('pillow', 'atlas')
+DEFAULT_TEXT_ENGINE = 'pillow'
+
+# Frame compositors: 'ffmpeg' positions and blends the layers with overlay
+# filters; 'numpy' builds every frame in Python and pipes raw video to
+# FFmpeg, which only encodes (see compositor.py).
+COMPOSITORS = ('ffmpeg', 'numpy')
+DEFAULT_COMPOSITOR = 'ffmpeg'
+
+# In-memory memo sizes (entries) for text layout
+RUN_CACHE_SIZE = 50000
+WIDTH_CACHE_SIZE = 50000
+CHAIN_CACHE_SIZE = 256
+ATLAS_CACHE_SIZE = 64
+
+# Patron strips (or tiered rosters) with at least this many names are
+# rasterised in horizontal bands on a process pool; smaller ones serially.
+PARALLEL_RASTER_MIN_NAMES = 1500
+BANDS_PER_WORKER = 2
+
+# Extra rows drawn below each video strip tile, so that FFmpeg's chroma
+# subsampling at the bottom of the frame sees the same pixels as with the
+# whole strip.
+TILE_MARGIN = 8
+
+# Segmented encoding: the timeline is split into runs of whole GOPs of this
+# many seconds, encoded by parallel FFmpeg processes and joined with the
+# concat demuxer without re-encoding.  Segments shorter than
+# SEGMENT_MIN_GOPS GOPs are not worth a process.
+SEGMENT_GOP_SECONDS = 2
+SEGMENT_MIN_GOPS = 2
+
+# render_video() arguments that do not change the video it produces, left
+# out of its render cache key
+UNCACHED_PARAMS = ('self', 'progress_callback', 'control', 'use_cache',
+                   'segments', 'outputs')
+
 # Font registry: name -> (regular_file, bold_file)
 # Noto Sans/Serif CJK support Latin + Chinese/Japanese/Korean.
 # LXGW WenKai supports Latin + Chinese/Japanese kanji.
@@ -75,6 +140,156 @@ FONT_FAMILIES = {
     'playwrite':        ('PlaywriteDEGrund-Regular.ttf',  'PlaywriteDEGrund-Regular.ttf'),
 }
 
+# System fonts tried when no bundled font is available
+SYSTEM_FALLBACK_FONTS = [
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/mnt/c/Windows/Fonts/msyh.ttc',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/mnt/c/Windows/Fonts/arial.ttf',
+]
+
+
+def indexed_font_paths():
+    """Every bundled and system font the renderer may use, for the font index."""
+    font_dir = get_fonts_dir()
+    names = sorted({f for pair in FONT_FAMILIES.values() for f in pair})
+    paths = [os.path.join(font_dir, f) for f in names] + SYSTEM_FALLBACK_FONTS
+    return [p for p in paths if os.path.exists(p)]
+
+
+def load_text_engine():
+    """Default text engine: ``RENDER_TEXT_ENGINE`` env, else the saved
+    ``textEngine`` setting, else 'pillow'."""
+    engine = os.environ.get('RENDER_TEXT_ENGINE', '').strip().lower()
+    if not engine:
+        try:
+            with open(get_generate_settings_path()) as f:
+                engine = str(json.load(f).get('textEngine') or '').lower()
+        except Exception:
+            engine = ''
+    if engine and engine not in TEXT_ENGINES:
+        logger.warning("Unknown text engine %r; using %s", engine, DEFAULT_TEXT_ENGINE)
+        engine = ''
+    return engine or DEFAULT_TEXT_ENGINE
+
+
+def load_compositor():
+    """Default compositor: ``RENDER_COMPOSITOR`` env, else the saved
+    ``compositor`` setting, else 'ffmpeg'."""
+    compositor = os.environ.get('RENDER_COMPOSITOR', '').strip().lower()
+    if not compositor:
+        try:
+            with open(get_generate_settings_path()) as f:
+                compositor = str(json.load(f).get('compositor') or '').lower()
+        except Exception:
+            compositor = ''
+    if compositor and compositor not in COMPOSITORS:
+        logger.warning("Unknown compositor %r; using %s", compositor, DEFAULT_COMPOSITOR)
+        compositor = ''
+    return compositor or DEFAULT_COMPOSITOR
+
+
+def load_raster_workers():
+    """Processes that rasterise large patron strips: ``RENDER_RASTER_WORKERS``
+    env, else the saved ``rasterWorkers`` setting, else one per CPU core.
+    1 keeps rasterisation on the rendering thread."""
+    value = os.environ.get('RENDER_RASTER_WORKERS', '').strip()
+    if not value:
+        try:
+            with open(get_generate_settings_path()) as f:
+                value = str(json.load(f).get('rasterWorkers') or '')
+        except Exception:
+            value = ''
+    try:
+        workers = int(value) if value else 0
+    except ValueError:
+        logger.warning("Ignoring invalid raster worker count %r", value)
+        workers = 0
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+_raster_pool = None
+_raster_pool_lock = threading.Lock()
+
+
+def load_segments():
+    """Parallel encode segments: ``RENDER_SEGMENTS`` env, else the saved
+    ``renderSegments`` setting, else 1 (a single FFmpeg process)."""
+    value = os.environ.get('RENDER_SEGMENTS', '').strip()
+    if not value:
+        try:
+            with open(get_generate_settings_path()) as f:
+                value = str(json.load(f).get('renderSegments') or '')
+        except Exception:
+            value = ''
+    try:
+        segments = int(value) if value else 1
+    except ValueError:
+        logger.warning("Ignoring invalid segment count %r", value)
+        segments = 1
+    return max(1, segments)
+
+
+def _get_raster_pool(workers):
+    """Process pool shared by every renderer in this process.
+
+    Workers are spawned rather than forked so they never inherit locks
+    held by the server's other threads.
+    """
+    global _raster_pool
+    with _raster_pool_lock:
+        if _raster_pool is None:
+            _raster_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _raster_pool
+
+
+def _reset_raster_pool():
+    global _raster_pool
+    with _raster_pool_lock:
+        pool, _raster_pool = _raster_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+_worker_renderer = None
+_worker_sprite_caches = {}   # db path -> SpriteCache
+
+
+def _raster_task(method, args, kwargs, engine, sprite_db):
+    """Pool entry point: call a rasterising method on this worker's renderer.
+
+    Returns (mode, size, pixel bytes) of the resulting image.
+    """
+    global _worker_renderer
+    if _worker_renderer is None:
+        _worker_renderer = VideoRenderer()
+        _worker_renderer.raster_workers = 1     # never nest pools
+    if sprite_db:
+        db_path, max_bytes = sprite_db
+        cache = _worker_sprite_caches.get(db_path)
+        if cache is None:
+            cache = _worker_sprite_caches[db_path] = SpriteCache(db_path, max_bytes)
+        kwargs = dict(kwargs, sprite_cache=cache)
+    _worker_renderer._local.text_engine = engine
+    img = getattr(_worker_renderer, method)(*args, **kwargs)
+    if isinstance(img, tuple):
+        img = img[0]
+    return img.mode, img.size, img.tobytes()
+
+
+def _dense_unique(values):
+    """np.unique(values, return_inverse=True) for small non-negative ints.
+
+    Uses a lookup table sized by the largest value instead of sorting.
+    """
+    present = np.zeros(int(values.max()) + 1, dtype=bool)
+    present[values] = True
+    uniq = np.flatnonzero(present)
+    lut = np.zeros(len(present), dtype=np.int64)
+    lut[uniq] = np.arange(len(uniq))
+    return uniq, lut[values]
+
 
 class VideoRenderer:
     # Fonts with broad Unicode coverage (Greek, Cyrillic, etc.), tried in order
@@ -84,8 +299,32 @@ class VideoRenderer:
         self.output_dir = get_output_dir()
         self._font_dir = get_fonts_dir()
         self._ffmpeg_path = get_ffmpeg_path()
-        self._cmap_cache = {}   # font_path -> set of codepoints
-        self._font_cache = {}   # (font_path, size) -> PIL ImageFont
+        cache_settings = load_cache_settings()
+        self.render_cache = None
+        self.layer_cache = None
+        self.sprite_cache = None
+        if cache_settings['enabled']:
+            self.render_cache = RenderCache(os.path.join(get_cache_dir(), 'renders'),
+                                            max_bytes=cache_settings['max_bytes'])
+            self.layer_cache = LayerCache(os.path.join(get_cache_dir(), 'layers'),
+                                          max_bytes=cache_settings['layer_max_bytes'])
+            self.sprite_cache = SpriteCache(os.path.join(get_cache_dir(), 'sprites.db'),
+                                            max_bytes=cache_settings['sprite_max_bytes'])
+        self._font_index = get_font_index()   # font_path -> codepoint coverage
+        self._fonts = get_font_cache()        # (font_path, size) -> PIL ImageFont
+        self._atlases = LRUCache(ATLAS_CACHE_SIZE)   # (font_path, size) -> GlyphAtlas
+        # Layout memos: (primary, bold) -> fallback chain,
+        # (text, primary, bold) -> runs, (text, primary, size, bold, engine) -> width
+        self._chains = LRUCache(CHAIN_CACHE_SIZE)
+        self._runs = LRUCache(RUN_CACHE_SIZE)
+        self._widths = LRUCache(WIDTH_CACHE_SIZE)
+        self.text_engine = load_text_engine()
+        self.compositor = load_compositor()
+        self.raster_workers = load_raster_workers()
+        self.scratch_settings = load_scratch_settings()
+        self.segments = load_segments()
+        self.encoder = encoders.load_default_encoder()
+        self._local = threading.local()   # per-render state (text engine)
 
     # ------------------------------------------------------------------
     # Font helpers
@@ -109,50 +348,36 @@ class VideoRenderer:
             return fallback
 
         # System fallbacks
-        for p in ['/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
-                   '/mnt/c/Windows/Fonts/msyh.ttc',
-                   '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-                   '/mnt/c/Windows/Fonts/arial.ttf']:
+        for p in SYSTEM_FALLBACK_FONTS:
             if os.path.exists(p):
                 return p
         return None
 
     def _load_font(self, font_path, size):
-        """Load a PIL ImageFont, falling back to default if path is None."""
-        key = (font_path, size)
-        if key in self._font_cache:
-            return self._font_cache[key]
-        font = None
-        if font_path:
-            try:
-                font = ImageFont.truetype(font_path, size)
-            except (IOError, OSError):
-                pass
-        if font is None:
-            font = ImageFont.load_default()
-        self._font_cache[key] = font
-        return font
+        """Load a PIL ImageFont, falling back to default if path is None.
+
+        Fonts come from the process-wide, memory-bounded FontCache.
+        """
+        return self._fonts.get(font_path, size)
 
     # ------------------------------------------------------------------
     # Font-fallback helpers
     # ------------------------------------------------------------------
 
     def _get_cmap(self, font_path):
-        """Return the set of Unicode codepoints covered by a font file."""
-        if font_path in self._cmap_cache:
-            return self._cmap_cache[font_path]
-        try:
-            tt = TTFont(font_path)
-            cmap = tt.getBestCmap() or {}
-            tt.close()
-            result = set(cmap.keys())
-        except Exception:
-            result = None  # None = assume all chars supported
-        self._cmap_cache[font_path] = result
-        return result
+        """Return the Unicode codepoints covered by a font file.
+
+        Looked up in the persistent font index; None means the font could
+        not be read, in which case all characters are assumed supported.
+        """
+        return self._font_index.coverage(font_path)
 
     def _build_fallback_chain(self, primary_path, bold):
-        """Build an ordered list of (font_path, cmap) fallbacks."""
+        """Return the ordered list of (font_path, cmap) fallbacks (memoised)."""
+        return self._chains.get((primary_path, bold),
+                                lambda: self._compute_fallback_chain(primary_path, bold))
+
+    def _compute_fallback_chain(self, primary_path, bold):
         chain = []
         seen = {primary_path}
         for fam in self._FALLBACK_FAMILIES:
@@ -166,23 +391,29 @@ class VideoRenderer:
         """Split *text* into runs of (substring, font_path).
 
         Each run uses the primary font when possible, otherwise the first
-        fallback whose cmap contains the character.
+        fallback whose cmap contains the character.  Results are memoised
+        per (text, primary font, bold).
         """
         if not text:
-            return []
+            return ()
+        return self._runs.get((text, primary_path, bold),
+                              lambda: self._split_runs(text, primary_path, bold))
+
+    def _split_runs(self, text, primary_path, bold):
         primary_cmap = self._get_cmap(primary_path)
+        if primary_cmap is None or all(ord(ch) in primary_cmap for ch in text):
+            return ((text, primary_path),)
         fallbacks = self._build_fallback_chain(primary_path, bold)
 
         runs = []
-        cur_text = ''
+        start = 0
         cur_path = None
-
-        for ch in text:
+        for i, ch in enumerate(text):
             cp = ord(ch)
             # Spaces always use whatever font is current (or primary)
             if ch in (' ', '\t'):
                 chosen = cur_path or primary_path
-            elif primary_cmap is None or cp in primary_cmap:
+            elif cp in primary_cmap:
                 chosen = primary_path
             else:
                 chosen = primary_path
@@ -191,36 +422,333 @@ class VideoRenderer:
                         chosen = fp
                         break
 
-            if chosen == cur_path:
-                cur_text += ch
-            else:
-                if cur_text:
-                    runs.append((cur_text, cur_path))
-                cur_text = ch
+            if chosen != cur_path:
+                if i > start:
+                    runs.append((text[start:i], cur_path))
+                start = i
                 cur_path = chosen
 
-        if cur_text:
-            runs.append((cur_text, cur_path))
-        return runs
+        runs.append((text[start:], cur_path))
+        return tuple(runs)
+
+    def _current_engine(self):
+        """Text engine of the render running on this thread."""
+        return getattr(self._local, 'text_engine', None) or self.text_engine
+
+    def _atlas(self, font_path, size):
+        return self._atlases.get((font_path, size),
+                                 lambda: GlyphAtlas(self._load_font(font_path, size)))
 
     def _draw_text(self, draw, x, y, text, primary_path, size, fill, bold=False):
         """Draw *text* at (x, y) with automatic font fallback."""
         runs = self._build_runs(text, primary_path, bold)
         cx = x
+        if self._current_engine() == 'atlas':
+            for run_text, font_path in runs:
+                cx += self._atlas(font_path, size).draw(draw, cx, y, run_text, fill)
+            return
         for run_text, font_path in runs:
             font = self._load_font(font_path, size)
             draw.text((cx, y), run_text, font=font, fill=fill)
             cx += font.getlength(run_text)
 
     def _measure_text(self, text, primary_path, size, bold=False):
-        """Measure the pixel width of *text* with font fallback."""
+        """Measure the pixel width of *text* with font fallback (memoised)."""
+        engine = self._current_engine()
+        return self._widths.get(
+            (text, primary_path, size, bold, engine),
+            lambda: self._compute_width(text, primary_path, size, bold, engine))
+
+    def _measure_lines(self, lines, primary_path, size, bold=False):
+        """Measure many lines at once; same widths as _measure_text per line.
+
+        Every character's font is picked with the same fallback rules as
+        _build_runs, then per-glyph advances (and pair kerning, for fonts
+        with a kern table) are looked up once per distinct codepoint or
+        pair and gathered and summed with NumPy.  Falls back to measuring
+        line by line without NumPy or when a shaping engine (raqm) lays
+        out text, since shaped widths are not a sum of glyph advances.
+        """
+        lines = list(lines)
+        layout = getattr(self._load_font(primary_path, size), 'layout_engine', None)
+        if np is None or not lines or layout != ImageFont.Layout.BASIC:
+            return [self._measure_text(t, primary_path, size, bold) for t in lines]
+
+        lengths = np.fromiter(map(len, lines), dtype=np.int64, count=len(lines))
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        cps = np.frombuffer(''.join(lines).encode('utf-32-le'), dtype=np.uint32)
+        if not len(cps):
+            return [0.0] * len(lines)
+        uniq, inv = _dense_unique(cps)
+        n_uniq = len(uniq)
+
+        # Font of each distinct codepoint: 0 = primary, i = i-th fallback,
+        # -1 = space/tab (continues the current run's font)
+        paths = [primary_path]
+        primary_cmap = self._get_cmap(primary_path)
+        choice = np.zeros(n_uniq, dtype=np.int64)
+        chain = None
+        for i, cp in enumerate(uniq.tolist()):
+            if primary_cmap is None:
+                break
+            if cp in (0x20, 0x09):
+                choice[i] = -1
+            elif cp not in primary_cmap:
+                if chain is None:
+                    chain = self._build_fallback_chain(primary_path, bold)
+                    paths += [fp for fp, _ in chain]
+                for j, (_fp, cmap) in enumerate(chain, 1):
+                    if cmap is not None and cp in cmap:
+                        choice[i] = j
+                        break
+
+        fid = choice[inv]
+        line_starts = starts[lengths > 0]
+        fid[line_starts] = np.maximum(fid[line_starts], 0)
+        filled = np.where(fid >= 0, np.arange(len(fid)), 0)
+        np.maximum.accumulate(filled, out=filled)
+        fid = fid[filled]
+
+        atlases = [self._atlas(fp, size) for fp in paths]
+        uniq_chars = [chr(cp) for cp in uniq.tolist()]
+        combos, combo_inv = _dense_unique(fid * n_uniq + inv)
+        advances = np.array([atlases[c // n_uniq].advance(uniq_chars[c % n_uniq])
+                             for c in combos.tolist()], dtype=np.float64)
+        values = advances[combo_inv]
+
+        # Pair kerning between neighbours in the same line and run
+        kerning = [(self._font_index.metrics(fp) or {}).get('kern', True) for fp in paths]
+        if any(kerning):
+            line_id = np.repeat(np.arange(len(lines)), lengths)
+            pair = ((line_id[:-1] == line_id[1:]) & (fid[:-1] == fid[1:])
+                    & np.asarray(kerning)[fid[:-1]])
+            if pair.any():
+                left = np.nonzero(pair)[0]
+                keys = (fid[left] * n_uniq + inv[left]) * n_uniq + inv[left + 1]
+                pairs, pair_inv = np.unique(keys, return_inverse=True)
+                kerns = np.array(
+                    [atlases[k // (n_uniq * n_uniq)].kern(uniq_chars[k // n_uniq % n_uniq],
+                                                          uniq_chars[k % n_uniq])
+                     for k in pairs.tolist()], dtype=np.float64)
+                values[left] += kerns[pair_inv.reshape(-1)]
+
+        totals = np.concatenate(([0.0], np.cumsum(values)))
+        return (totals[ends] - totals[starts]).tolist()
+
+    def layout_cache_stats(self):
+        """Hit/miss counters of the in-memory text layout memos."""
+        return {'fallback_chains': self._chains.stats(),
+                'runs': self._runs.stats(),
+                'widths': self._widths.stats(),
+                'atlases': self._atlases.stats(),
+                'fonts': self._fonts.stats(),
+                'font_index': self._font_index.stats()}
+
+    def clear_layout_caches(self):
+        for memo in (self._chains, self._runs, self._widths, self._atlases):
+            memo.clear()
+
+    def _compute_width(self, text, primary_path, size, bold, engine):
         runs = self._build_runs(text, primary_path, bold)
         total = 0.0
+        if engine == 'atlas':
+            for run_text, font_path in runs:
+                total += self._atlas(font_path, size).measure(run_text)
+            return total
         for run_text, font_path in runs:
             font = self._load_font(font_path, size)
             total += font.getlength(run_text)
         return total
 
+    # ------------------------------------------------------------------
+    # Sprite cache helpers
+    # ------------------------------------------------------------------
+
+    def _rasterise_sprite(self, text, font_path, size, bold, phase):
+        """Draw *text* into an 'L' mask at sub-pixel offset *phase*."""
+        width = self._measure_text(text, font_path, size, bold)
+        pad = size
+        mask = Image.new('L', (int(width) + 2 * pad + 2, 2 * size + 2 * pad), 0)
+        self._draw_text(ImageDraw.Draw(mask), pad + phase, pad, text,
+                        font_path, size, 255, bold)
+        bbox = mask.getbbox()
+        if bbox is None:
+            return Sprite(width)
+        return Sprite(width, bbox[0] - pad, bbox[1] - pad, mask.crop(bbox))
+
+    def _text_widths(self, texts, font_path, size, bold, sprite_cache=None):
+        """Return {text: advance width}, using the sprite cache when given."""
+        texts = list(dict.fromkeys(texts))
+        if sprite_cache is None:
+            return dict(zip(texts, self._measure_lines(texts, font_path, size, bold)))
+        engine = self._current_engine()
+        keys = {t: sprite_cache.key_for(t, font_path, size, bold, engine=engine)
+                for t in texts}
+        cached = sprite_cache.get_many(keys.values())
+        widths = {t: cached[key].width for t, key in keys.items() if key in cached}
+        missing = [t for t in texts if t not in widths]
+        new = {}
+        for t, w in zip(missing, self._measure_lines(missing, font_path, size, bold)):
+            widths[t] = w
+            new[keys[t]] = Sprite(w)
+        sprite_cache.put_many(new)
+        return widths
+
+    def _draw_text_ops(self, img, draw, ops, font_path, size, fill, bold,
+                       sprite_cache=None, chunk=2000):
+        """Execute drawing *ops* in order.
+
+        Ops are ``('text', text, x, y)`` or ``('line', points, colour, width)``.
+        With a sprite cache, text is pasted from cached coverage masks and
+        only never-seen (text, sub-pixel phase) pairs are rasterised; ops
+        run in chunks so only one chunk's masks are held in memory.
+        """
+        if sprite_cache is None:
+            for op in ops:
+                if op[0] == 'text':
+                    self._draw_text(draw, op[2], op[3], op[1], font_path, size, fill, bold)
+                else:
+                    draw.line(op[1], fill=op[2], width=op[3])
+            return
+
+        ink = tuple(fill) + ((255,) if img.mode == 'RGBA' else ())
+        engine = self._current_engine()
+        for start in range(0, len(ops), chunk):
+            batch = ops[start:start + chunk]
+            keys = {}
+            for op in batch:
+                if op[0] == 'text' and op[2] >= 0:
+                    phase = op[2] - int(op[2])
+                    keys[(op[1], phase)] = sprite_cache.key_for(
+                        op[1], font_path, size, bold, phase, engine)
+            sprites = sprite_cache.get_many(keys.values())
+            new = {}
+            for (text, phase), key in keys.items():
+                if key not in sprites:
+                    sprites[key] = new[key] = self._rasterise_sprite(
+                        text, font_path, size, bold, phase)
+            sprite_cache.put_many(new)
+
+            for op in batch:
+                if op[0] == 'line':
+                    draw.line(op[1], fill=op[2], width=op[3])
+                    continue
+                _, text, x, y = op
+                if x < 0:
+                    # Off-canvas start; sub-pixel phase differs, draw directly
+                    self._draw_text(draw, x, y, text, font_path, size, fill, bold)
+                    continue
+                sp = sprites[keys[(text, x - int(x))]]
+                if sp.mask is not None:
+                    img.paste(ink, (int(x) + sp.x, int(y) + sp.y), sp.mask)
+
+    # ------------------------------------------------------------------
+    # Parallel rasterisation
+    # ------------------------------------------------------------------
+
+    def _parallel_raster(self, name_count):
+        return self.raster_workers > 1 and name_count >= PARALLEL_RASTER_MIN_NAMES
+
+    def _submit_raster(self, method, *args, sprite_cache=None, **kwargs):
+        """Run a rasterising method on the pool; returns a Future."""
+        sprite_db = (sprite_cache.db_path, sprite_cache.max_bytes) if sprite_cache else None
+        return _get_raster_pool(self.raster_workers).submit(
+            _raster_task, method, args, kwargs, self._current_engine(), sprite_db)
+
+    @staticmethod
+    def _raster_result(future):
+        mode, size, data = future.result()
+        return Image.frombytes(mode, size, data)
+
+    def _rasterise_region(self, mode, width, height, background, parts,
+                          sprite_cache=None):
+        """Draw the op *parts* of a strip region (see PatronStrip.region)."""
+        img = Image.new(mode, (width, height), background)
+        for top, bottom, ops, font_path, size, fill, bold in parts:
+            if top == 0 and bottom == height:
+                target = img
+            else:
+                # Clip the block to its own rows
+                target = Image.new(mode, (width, bottom - top), background)
+            self._draw_text_ops(target, ImageDraw.Draw(target), ops, font_path,
+                                size, fill, bold, sprite_cache)
+            if target is not img:
+                img.paste(target, (0, top))
+        return img
+
+    def _region_image(self, strip, y0, y1, sprite_cache=None, future=None):
+        """Image of strip rows [y0, y1), from *future* if it was drawn on the pool."""
+        parts, images = strip.region(y0, y1)
+        if future is not None:
+            img = self._raster_result(future)
+        else:
+            img = self._rasterise_region(strip.mode, strip.width, y1 - y0,
+                                         strip.background, parts, sprite_cache)
+        for top, piece in images:
+            img.paste(piece, (0, top))
+        return img
+
+    def _strip_regions(self, strip, regions, sprite_cache=None):
+        """Yield the image of each (y0, y1) strip region, in order.
+
+        Large rosters are drawn on the raster pool, a bounded number of
+        regions ahead; if the pool fails the rest is drawn serially.
+        """
+        regions = list(regions)
+        if not self._parallel_raster(strip.names):
+            for y0, y1 in regions:
+                yield self._region_image(strip, y0, y1, sprite_cache)
+            return
+
+        ahead = self.raster_workers * BANDS_PER_WORKER
+        pending = deque()
+        serial = False
+        for i, (y0, y1) in enumerate(regions):
+            while not serial and len(pending) < ahead and i + len(pending) < len(regions):
+                ry0, ry1 = regions[i + len(pending)]
+                parts, _ = strip.region(ry0, ry1)
+                try:
+                    pending.append(self._submit_raster(
+                        '_rasterise_region', strip.mode, strip.width, ry1 - ry0,
+                        strip.background, parts, sprite_cache=sprite_cache))
+                except Exception as e:
+                    serial = self._raster_failed(e, pending)
+            future = pending.popleft() if pending else None
+            if future is not None:
+                try:
+                    yield self._region_image(strip, y0, y1, future=future)
+                    continue
+                except Exception as e:
+                    serial = self._raster_failed(e, pending)
+            yield self._region_image(strip, y0, y1, sprite_cache)
+
+    @staticmethod
+    def _raster_failed(error, pending):
+        logger.warning("Parallel rasterisation failed (%s); drawing serially", error)
+        for future in pending:
+            future.cancel()
+        pending.clear()
+        if isinstance(error, BrokenProcessPool):
+            _reset_raster_pool()
+        return True
+
+    def _rasterise_strip(self, strip, sprite_cache=None):
+        """Draw a whole PatronStrip into one image.
+
+        Large rosters are drawn as bands on the raster pool and stitched.
+        """
+        height = max(strip.height, 1)
+        if not self._parallel_raster(strip.names):
+            return self._region_image(strip, 0, height, sprite_cache)
+        n_bands = self.raster_workers * BANDS_PER_WORKER
+        edges = sorted({height * k // n_bands for k in range(n_bands)}) + [height]
+        regions = list(zip(edges, edges[1:]))
+        img = Image.new(strip.mode, (strip.width, height), strip.background)
+        for (y0, _), band in zip(regions, self._strip_regions(strip, regions, sprite_cache)):
+            img.paste(band, (0, y0))
+        return img
+
     # Keep legacy helpers for anything external that calls them
     def get_system_font(self):
         return self._resolve_font('noto_sans', bold=False)
@@ -242,8 +770,10 @@ class VideoRenderer:
     # Image rendering
     # ------------------------------------------------------------------
 
-    def _render_header_image(self, message, width, message_style, scale_factor, bg_color='#000000'):
-        """Render the header message as a PIL Image on solid background."""
+    def _render_header_image(self, message, width, message_style, scale_factor, bg_color='#000000',
+                             transparent=False):
+        """Render the header message as a PIL Image on solid background
+        (or on none, if *transparent*)."""
         font_size = int(message_style['size'] * scale_factor)
         color = self._hex_to_rgb(message_style['color'])
         bg_rgb = self._hex_to_rgb(bg_color)
@@ -262,7 +792,10 @@ class VideoRenderer:
         header_height = text_height + padding * 2
         usable_width = width - margin * 2
 
-        img = Image.new('RGB', (width, header_height), bg_rgb)
+        if transparent:
+            img = Image.new('RGBA', (width, header_height), (0, 0, 0, 0))
+        else:
+            img = Image.new('RGB', (width, header_height), bg_rgb)
         draw = ImageDraw.Draw(img)
 
         y = padding
@@ -321,9 +854,24 @@ class VideoRenderer:
     def _render_patrons_image(self, patrons, width, patron_style, scale_factor,
                               columns=4, name_align='left', truncate_length=15,
                               word_wrap=False, name_spacing=False, bg_color='#000000',
-                              transparent=False):
+                              transparent=False, sprite_cache=None):
         """Render patron names as a tall PIL Image.
 
+        See _layout_patrons for the arguments.  Large rosters are drawn in
+        bands on the raster process pool.
+        """
+        strip = self._layout_patrons(
+            patrons, width, patron_style, scale_factor, columns, name_align,
+            truncate_length, word_wrap, name_spacing, bg_color, transparent,
+            sprite_cache)
+        return self._rasterise_strip(strip, sprite_cache), max(strip.height, 1)
+
+    def _layout_patrons(self, patrons, width, patron_style, scale_factor,
+                        columns=4, name_align='left', truncate_length=15,
+                        word_wrap=False, name_spacing=False, bg_color='#000000',
+                        transparent=False, sprite_cache=None, strip=None):
+        """Lay out patron names as drawing ops; returns a PatronStrip.
+
         Args:
             columns: 1-5 columns for patron names.
             name_align: 'left', 'center', or 'right'.
@@ -332,6 +880,10 @@ class VideoRenderer:
                 is enabled.
             word_wrap: when True, long names are hyphen-wrapped instead of
                 truncated; each wrapped line is centred in its column.
+            sprite_cache: optional SpriteCache, used here to look up widths
+                of names measured before.
+            strip: PatronStrip to append to (tiered rosters); a new one is
+                created when omitted.
         """
         font_size = int(patron_style['size'] * scale_factor)
         color = self._hex_to_rgb(patron_style['color'])
@@ -357,7 +909,8 @@ class VideoRenderer:
 
         # Measure widest rendered line across all entries
         all_lines = [ln for entry in entries for ln in entry]
-        max_name_width = max((self._measure_text(ln, font_path, font_size, bold) for ln in all_lines), default=0)
+        widths = self._text_widths(all_lines, font_path, font_size, bold, sprite_cache)
+        max_name_width = max(widths.values(), default=0)
         column_width = int(max_name_width + col_padding * 2)
         area_width = column_width * num_columns
 
@@ -390,17 +943,11 @@ class VideoRenderer:
             row_heights.append(max_lines * line_height + gap)
         total_height = max(sum(row_heights), 1)
 
-        if transparent:
-            img = Image.new('RGBA', (width, total_height), (0, 0, 0, 0))
-        else:
-            bg_rgb = self._hex_to_rgb(bg_color)
-            img = Image.new('RGB', (width, total_height), bg_rgb)
-        draw = ImageDraw.Draw(img)
-
         # Separator line style (when name_spacing is on)
         line_color = tuple(c // 3 for c in color)  # dimmed version of name color
         line_thickness = max(1, int(scale_factor))
 
+        ops = []
         y_offset = 0
         for row_idx, row_entries in enumerate(entry_rows):
             row_h = row_heights[row_idx]
@@ -411,8 +958,8 @@ class VideoRenderer:
                 for col in range(len(row_entries)):
                     col_start_x = area_offset + col * column_width + col_padding
                     col_end_x = area_offset + col * column_width + column_width - col_padding
-                    draw.line([(col_start_x, sep_y), (col_end_x, sep_y)],
-                              fill=line_color, width=line_thickness)
+                    ops.append(('line', [(col_start_x, sep_y), (col_end_x, sep_y)],
+                                line_color, line_thickness))
 
             # Reserve the gap at the top; centre names in remaining space
             content_top = y_offset + (row_gap if row_idx > 0 else 0)
@@ -424,14 +971,19 @@ class VideoRenderer:
 
                 col_start_x = area_offset + col * column_width
                 for li, line_text in enumerate(entry_lines):
-                    text_w = self._measure_text(line_text, font_path, font_size, bold)
+                    text_w = widths[line_text]
                     x = col_start_x + (column_width - text_w) / 2
                     y = y_start + li * line_height
-                    self._draw_text(draw, x, y, line_text, font_path, font_size, color, bold)
+                    ops.append(('text', line_text, x, y))
 
             y_offset += row_h
 
-        return img, total_height
+        if strip is None:
+            background = (0, 0, 0, 0) if transparent else self._hex_to_rgb(bg_color)
+            strip = PatronStrip(width, 'RGBA' if transparent else 'RGB', background)
+        strip.add_ops(total_height, ops, (font_path, font_size, color, bold),
+                      names=len(entries))
+        return strip
 
     # ------------------------------------------------------------------
     # Overlay / gradient helpers
@@ -476,6 +1028,84 @@ class VideoRenderer:
                 int(a + (b - a) * r) for a, b in zip(rgb1, rgb2)))
         return base.resize((width, height), Image.NEAREST)
 
+    def _render_background_plate(self, width, height, bg_image=None, bg_gradient=None):
+        """Background image (scaled) or gradient as one RGB image of the frame size.
+
+        Returns (image, height).
+        """
+        if bg_image and os.path.isfile(bg_image):
+            with Image.open(bg_image) as im:
+                return im.convert('RGB').resize((width, height), Image.BICUBIC), height
+        return self._render_gradient_image(
+            width, height,
+            bg_gradient.get('color1', '#000000'),
+            bg_gradient.get('color2', '#333333'),
+            bg_gradient.get('direction', 'vertical')), height
+
+    def _render_foreground_plate(self, width, height, scale_factor, header_path,
+                                 logo_file=None, logo_position='top-right', logo_size=80,
+                                 qr_image=None, qr_position='bottom-right', qr_size=120):
+        """Header, logo and QR code flattened into one RGBA image of the frame size.
+
+        Logo and QR are scaled to ``<size> x even height`` (bicubic, like
+        ``scale=<size>:-2``) and placed at their named positions.  Returns
+        (image, height).
+        """
+        plate = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        with Image.open(header_path) as header:
+            plate.paste(header.convert('RGBA'), (0, 0))
+        margin = int(20 * scale_factor)
+        for path, position, size in ((logo_file, logo_position, logo_size),
+                                     (qr_image, qr_position, qr_size)):
+            if not (path and os.path.isfile(path)):
+                continue
+            scaled = int(size * scale_factor)
+            with Image.open(path) as im:
+                im = im.convert('RGBA')
+            # Even height keeping the aspect ratio, like scale=w:-2
+            scaled_h = max(2, int(round(scaled * im.height / (im.width * 2))) * 2)
+            layer = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+            layer.paste(im.resize((scaled, scaled_h), Image.BICUBIC),
+                        self._compute_overlay_position(position, scaled, scaled,
+                                                       width, height, margin))
+            plate = Image.alpha_composite(plate, layer)
+        return plate, height
+
+    @staticmethod
+    def _plate_bands(path):
+        """Split the non-transparent part of an RGBA plate into overlay bands.
+
+        Returns ``(x, y, w, h, opaque)`` rectangles with even offsets and
+        sizes (so yuv420 chroma lines up), covering every visible pixel.
+        Row pairs are grouped while they stay fully opaque over the same
+        columns (a band FFmpeg can copy) or while they are not (a band it
+        has to blend, cropped to the columns in use), so the opaque header
+        and a logo on it are one copy and only the rows of logos or QR
+        codes outside it are alpha blended.
+        """
+        with Image.open(path) as im:
+            alpha = im.convert('RGBA').getchannel('A')
+        width, height = alpha.size
+        bbox = alpha.getbbox()
+        if bbox is None:
+            return []
+        rows = []   # [y0, y1, x0, x1, opaque]
+        for y in range(bbox[1] & ~1, bbox[3], 2):
+            y1 = min(y + 2, height)
+            box = alpha.crop((0, y, width, y1)).getbbox()
+            if box is None:
+                continue
+            x0, x1 = box[0] & ~1, min(width, box[2] + (box[2] & 1))
+            opaque = alpha.crop((x0, y, x1, y1)).getextrema()[0] == 255
+            last = rows[-1] if rows else None
+            if last and last[1] == y and last[4] == opaque and (
+                    not opaque or (last[2], last[3]) == (x0, x1)):
+                last[1] = y1
+                last[2], last[3] = min(last[2], x0), max(last[3], x1)
+            else:
+                rows.append([y, y1, x0, x1, opaque])
+        return [(x0, y0, x1 - x0, y1 - y0, opaque) for y0, y1, x0, x1, opaque in rows]
+
     # ------------------------------------------------------------------
     # Tiered patron rendering
     # ------------------------------------------------------------------
@@ -484,21 +1114,34 @@ class VideoRenderer:
                                      scale_factor, columns=4, name_align='left',
                                      truncate_length=15, word_wrap=False,
                                      name_spacing=False, bg_color='#000000',
-                                     transparent=False):
+                                     transparent=False, sprite_cache=None):
         """Render patron names grouped by tier, each with its own header.
 
         tier_sections: list of dicts with keys 'tier', 'names', and optional
                        'color' (hex) for the tier header.
         Returns (PIL.Image, total_height) just like _render_patrons_image.
         """
+        strip = self._layout_tiered_patrons(
+            tier_sections, width, patron_style, scale_factor, columns, name_align,
+            truncate_length, word_wrap, name_spacing, bg_color, transparent,
+            sprite_cache)
+        return self._rasterise_strip(strip, sprite_cache), strip.height
+
+    def _layout_tiered_patrons(self, tier_sections, width, patron_style,
+                               scale_factor, columns=4, name_align='left',
+                               truncate_length=15, word_wrap=False,
+                               name_spacing=False, bg_color='#000000',
+                               transparent=False, sprite_cache=None):
+        """Lay out a tiered roster (label, then names, per tier) as a PatronStrip."""
         font_size = int(patron_style['size'] * scale_factor)
         tier_header_size = int(font_size * 1.3)
         tier_gap = int(30 * scale_factor)
         family = patron_style.get('font', 'noto_sans')
         bold_path = self._resolve_font(family, bold=True)
+        background = (0, 0, 0, 0) if transparent else self._hex_to_rgb(bg_color)
+        strip = PatronStrip(width, 'RGBA' if transparent else 'RGB', background)
 
-        # Render each tier's names block, then stack them vertically
-        blocks = []  # list of (tier_label_img, patrons_img)
+        # Stack each tier's label and names block vertically
         for section in tier_sections:
             tier_name = section.get('tier', '')
             names = section.get('names', [])
@@ -510,11 +1153,7 @@ class VideoRenderer:
 
             # Tier header label
             label_h = int(tier_header_size * LINE_SPACING_MULTIPLIER) + tier_gap
-            if transparent:
-                label_img = Image.new('RGBA', (width, label_h), (0, 0, 0, 0))
-            else:
-                label_img = Image.new('RGB', (width, label_h),
-                                      self._hex_to_rgb(bg_color))
+            label_img = Image.new(strip.mode, (width, label_h), background)
             draw = ImageDraw.Draw(label_img)
             text_w = self._measure_text(tier_name, bold_path,
                                         tier_header_size, bold=True)
@@ -522,37 +1161,17 @@ class VideoRenderer:
             y = tier_gap // 2
             self._draw_text(draw, x, y, tier_name, bold_path,
                             tier_header_size, tier_color, bold=True)
+            strip.add_image(label_img)
 
             # Names block for this tier
-            names_img, names_h = self._render_patrons_image(
-                names, width, patron_style, scale_factor,
-                columns, name_align, truncate_length,
-                word_wrap, name_spacing, bg_color, transparent)
+            self._layout_patrons(names, width, patron_style, scale_factor,
+                                 columns, name_align, truncate_length,
+                                 word_wrap, name_spacing, bg_color, transparent,
+                                 sprite_cache=sprite_cache, strip=strip)
 
-            blocks.append((label_img, label_h, names_img, names_h))
-
-        if not blocks:
-            h = max(1, int(50 * scale_factor))
-            if transparent:
-                img = Image.new('RGBA', (width, h), (0, 0, 0, 0))
-            else:
-                img = Image.new('RGB', (width, h), self._hex_to_rgb(bg_color))
-            return img, h
-
-        total_h = sum(lh + nh for _, lh, _, nh in blocks)
-        if transparent:
-            img = Image.new('RGBA', (width, total_h), (0, 0, 0, 0))
-        else:
-            img = Image.new('RGB', (width, total_h), self._hex_to_rgb(bg_color))
-
-        y_off = 0
-        for label_img, label_h, names_img, names_h in blocks:
-            img.paste(label_img, (0, y_off))
-            y_off += label_h
-            img.paste(names_img, (0, y_off))
-            y_off += names_h
-
-        return img, total_h
+        if not strip.height:
+            strip.add_space(max(1, int(50 * scale_factor)))
+        return strip
 
     # ------------------------------------------------------------------
     # Video rendering
@@ -567,7 +1186,10 @@ class VideoRenderer:
                      audio_file=None, audio_volume=1.0,
                      logo_file=None, logo_position='top-right', logo_size=80,
                      qr_image=None, qr_position='bottom-right', qr_size=120,
-                     tier_sections=None, fps=30):
+                     tier_sections=None, fps=30, progress_callback=None,
+                     control=None, use_cache=True, text_engine=None,
+                     compositor=None, segments=None, segment=None, encoder=None,
+                     outputs=None):
         """Render the credits video using Pillow + FFmpeg.
 
         New v2 parameters
@@ -585,7 +1207,81 @@ class VideoRenderer:
         qr_position        : str    – same options as logo_position
         qr_size            : int    – QR code width in px (before resolution scaling)
         tier_sections      : list   – [{tier, names, color?}, ...] for tiered rendering
+        progress_callback  : callable – called with a progress dict per stage
+                                        and per FFmpeg ``-progress`` update
+        control            : RenderControl – cancellation flag and time limits;
+                                        raises RenderCancelled / RenderTimeout
+        use_cache          : bool   – reuse an identical earlier render, or its
+                                      rasterised header/patron strips, from the
+                                      render and layer caches (and store these)
+        text_engine        : str    – 'pillow' or 'atlas' (glyph-atlas blitting);
+                                      None uses the configured default
+        compositor         : str    – 'ffmpeg' (overlay filters) or 'numpy'
+                                      (frames built in Python, piped to FFmpeg);
+                                      None uses the configured default
+        segments           : int    – encode the timeline as this many
+                                      GOP-aligned segments in parallel and
+                                      join them; None uses the configured
+                                      default, 1 a single encode
+        segment            : tuple  – (first frame, frame count): encode only
+                                      these frames, without audio, as one
+                                      part for join_segments()
+        encoder            : str    – encoder profile name (see encoders.py);
+                                      None uses the configured default
+        outputs            : list   – [{encoder}, ...] to encode in the same
+                                      pass: the frames are laid out and
+                                      composited once, then split to one
+                                      encoder per output.  Returns the list
+                                      of filenames; see render_outputs()
+                                      for several resolutions
         """
+        # Every argument that affects the pixels or audio; captured first
+        # so it holds exactly the caller's inputs.
+        cache_params = {k: v for k, v in locals().items()
+                        if k not in UNCACHED_PARAMS}
+        segments = segments or self.segments
+        text_engine = text_engine or self.text_engine
+        if text_engine not in TEXT_ENGINES:
+            raise ValueError(f'Unknown text engine: {text_engine!r}')
+        cache_params['text_engine'] = text_engine
+        compositor = compositor or self.compositor
+        if compositor not in COMPOSITORS:
+            raise ValueError(f'Unknown compositor: {compositor!r}')
+        if compositor == 'numpy' and np is None:
+            logger.warning("NumPy is not installed; compositing with FFmpeg")
+            compositor = 'ffmpeg'
+        cache_params['compositor'] = compositor
+        width, height = map(int, resolution.split('x'))
+
+        # The files this render writes: one per output, each with its own
+        # encoder profile
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        targets = []
+        for out in outputs or [{'encoder': encoder}]:
+            if out.get('resolution', resolution) != resolution:
+                raise ValueError(f"Output {out['resolution']} is not the layout "
+                                 f"resolution {resolution}")
+            profile = encoders.resolve_profile(out.get('encoder') or encoder or self.encoder,
+                                               self._ffmpeg_path)
+            # The random suffix keeps renders finishing in the same second
+            # apart; outputs of several sizes are told apart by their size
+            size = f'_{resolution}' if outputs else ''
+            filename = (f'credits_{timestamp}_{uuid.uuid4().hex[:6]}{size}'
+                        f'{encoders.extension(profile)}')
+            targets.append({
+                'profile': profile, 'filename': filename,
+                'path': os.path.join(self.output_dir, filename),
+                'cache_key': None, 'cached': False,
+            })
+        # Transparent outputs leave the background out altogether, so they
+        # cannot share frames with opaque ones
+        alpha = bool(targets[0]['profile']['alpha'])
+        if any(bool(t['profile']['alpha']) != alpha for t in targets):
+            raise ValueError('Transparent and opaque outputs cannot share a pass')
+        if alpha and compositor == 'numpy':
+            # The NumPy compositor builds opaque RGB frames
+            compositor = cache_params['compositor'] = 'ffmpeg'
+        started = time.monotonic()
         logger.info("Rendering video: %s, %d patrons, %ds, %s",
                     resolution, len(patrons), duration, resolution)
         if message_style is None:
@@ -593,209 +1289,786 @@ class VideoRenderer:
         if patron_style is None:
             patron_style = {'size': 20, 'color': '#FFD700', 'font': 'noto_sans', 'bold': False}
 
-        width, height = map(int, resolution.split('x'))
         scale_factor = height / 720
 
-        # Determine if background is non-solid (patrons need transparent bg)
-        use_custom_bg = (
+        # Determine if background is non-solid (patrons need transparent bg);
+        # a transparent render has no background at all
+        use_custom_bg = not alpha and (
             (bg_image and os.path.isfile(bg_image))
             or (bg_gradient and isinstance(bg_gradient, dict))
         )
 
-        # Render images with Pillow
-        trans = bool(use_custom_bg)
-        header_img, header_height = self._render_header_image(
-            message, width, message_style, scale_factor, bg_color)
-        if tier_sections:
-            patrons_img, patrons_height = self._render_tiered_patrons_image(
-                tier_sections, width, patron_style, scale_factor,
-                columns, name_align, truncate_length, word_wrap,
-                name_spacing, bg_color, transparent=trans)
-        else:
-            patrons_img, patrons_height = self._render_patrons_image(
-                patrons, width, patron_style, scale_factor, columns,
-                name_align, truncate_length, word_wrap, name_spacing,
-                bg_color, transparent=trans)
-
-        # Save to temp PNGs
-        temp_files = []
-        header_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-        patrons_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-        header_img.save(header_file.name)
-        patrons_img.save(patrons_file.name)
-        header_file.close()
-        patrons_file.close()
-        temp_files += [header_file.name, patrons_file.name]
-
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f'credits_{timestamp}.mp4'
-        output_path = os.path.join(self.output_dir, output_filename)
-
+        def report(info):
+            if progress_callback:
+                progress_callback(info)
+
+        def checkpoint():
+            if control is not None:
+                control.check()
+
+        record = dict(fps=fps, duration=duration,
+                      frames=int(duration * fps), patron_count=len(patrons),
+                      compositor=compositor, text_engine=text_engine)
+        if outputs:
+            record.update(outputs=len(targets))
+
+        def result():
+            filenames = [t['filename'] for t in targets]
+            return filenames if outputs is not None else filenames[0]
+
+        def write_records(**info):
+            if segment is None:
+                for t in targets:
+                    encoders.write_sidecar(
+                        t['path'], t['profile'], t.get('video_args'),
+                        resolution=resolution, cached=t['cached'],
+                        **dict(record, **({} if t['cached'] else info)))
+
+        # Each output is cached on its own, as the same video a single
+        # render with its encoder would produce
+        cache = self.render_cache if use_cache else None
+        if cache is not None:
+            for t in targets:
+                try:
+                    t['cache_key'] = self._render_key(cache_params, t['profile'])
+                    cached = cache.get(t['cache_key'])
+                    if cached:
+                        link_or_copy(cached, t['path'])
+                        t['cached'] = True
+                        logger.info("Render cache hit %s -> %s",
+                                    t['cache_key'][:12], t['filename'])
+                except OSError as e:
+                    logger.warning("Render cache lookup failed: %s", e)
+                    t['cache_key'] = None
+            if all(t['cached'] for t in targets):
+                write_records()
+                report({'stage': 'cached', 'percent': 100.0})
+                return result()
+        pending = [t for t in targets if not t['cached']]
+
+        # Every intermediate file is created through the scratch, so the
+        # finally block removes it whether the render succeeds, fails,
+        # times out or is cancelled.
+        scratch = Scratch(**self.scratch_settings)
+        finished = False
+        self._local.text_engine = text_engine
         try:
+            # Render images with Pillow (or reuse them from the layer cache)
+            checkpoint()
+            report({'stage': 'rasterising', 'percent': 0})
+            layer_cache = self.layer_cache if use_cache else None
+            sprite_cache = self.sprite_cache if use_cache else None
+            trans = bool(use_custom_bg) or alpha
+            header_inputs = dict(message=message, width=width, message_style=message_style,
+                                 scale_factor=scale_factor, bg_color=bg_color)
+            if alpha:
+                header_inputs['transparent'] = True
+            header_path, header_height = self._layer_png(
+                layer_cache, 'header', self._render_header_image, header_inputs, scratch)
+            checkpoint()
+
+            # Everything that never moves is flattened once into two
+            # plates, cached by content like the strips: the background
+            # image or gradient (a solid colour needs none), and the
+            # header, logo and QR code with alpha
+            bg_plate = None
+            if use_custom_bg:
+                if bg_image and os.path.isfile(bg_image):
+                    bg_inputs = dict(bg_image=bg_image)
+                else:
+                    bg_inputs = dict(bg_gradient=bg_gradient)
+                bg_plate, _ = self._layer_png(
+                    layer_cache, 'background', self._render_background_plate,
+                    dict(bg_inputs, width=width, height=height), scratch)
+            fg_inputs = dict(width=width, height=height, scale_factor=scale_factor,
+                             header_path=header_path)
+            if logo_file and os.path.isfile(logo_file):
+                fg_inputs.update(logo_file=logo_file, logo_position=logo_position,
+                                 logo_size=logo_size)
+            if qr_image and os.path.isfile(qr_image):
+                fg_inputs.update(qr_image=qr_image, qr_position=qr_position,
+                                 qr_size=qr_size)
+            fg_plate, _ = self._layer_png(
+                layer_cache, 'foreground', self._render_foreground_plate, fg_inputs,
+                scratch)
+            checkpoint()
+            if tier_sections:
+                strip_kind, layout, strip_inputs = 'tiered_patrons', self._layout_tiered_patrons, dict(
+                    tier_sections=tier_sections, width=width,
+                    patron_style=patron_style, scale_factor=scale_factor,
+                    columns=columns, name_align=name_align,
+                    truncate_length=truncate_length, word_wrap=word_wrap,
+                    name_spacing=name_spacing, bg_color=bg_color,
+                    transparent=trans)
+            else:
+                strip_kind, layout, strip_inputs = 'patrons', self._layout_patrons, dict(
+                    patrons=patrons, width=width, patron_style=patron_style,
+                    scale_factor=scale_factor, columns=columns,
+                    name_align=name_align, truncate_length=truncate_length,
+                    word_wrap=word_wrap, name_spacing=name_spacing,
+                    bg_color=bg_color, transparent=trans)
+            strip = layout(**strip_inputs, sprite_cache=sprite_cache)
+            patrons_height = max(strip.height, 1)
+            checkpoint()
+
             # Scroll speed (with multiplier)
             total_scroll = patrons_height + height + header_height
             effective_speed = (total_scroll / duration) * max(0.1, float(speed_multiplier))
-            patron_y_expr = f"H+{header_height}-(t*{effective_speed})"
+
+            # The strip is fed to FFmpeg as tiles 2*height rows tall,
+            # starting every `height` rows, so the visible window always
+            # lies inside one tile; only the tiles the scroll reaches are
+            # drawn.  At time t the overlay shows tile
+            # clip(floor((t*speed - base)/height)), evaluated with the same
+            # doubles here (t = n * (1/fps)) and in the overlay.
+            base = height + header_height
+            last_tile = max(0, -(-patrons_height // height) - 1)
+            tile_expr = (f"clip(floor((t*{effective_speed!r}-{base})/{height}),"
+                         f"0,{last_tile})")
+            patron_y_expr = f"H+{header_height}-(t*{effective_speed!r})+{height}*{tile_expr}"
+            schedule = self._tile_schedule(effective_speed, base, height, last_tile,
+                                           fps, int(duration * fps) + 1)
+            if segment is not None:
+                # Only the tiles shown from the segment's first frame on
+                end = segment[0] + segment[1]
+                schedule = [entry for i, entry in enumerate(schedule)
+                            if entry[1] < end and (i + 1 == len(schedule)
+                                                   or schedule[i + 1][1] > segment[0])]
+            tiles = self._strip_tiles(
+                layer_cache, strip_kind, strip_inputs, strip, [k for k, _ in schedule],
+                height, scratch, sprite_cache, checkpoint, report)
+            checkpoint()
 
             # ---- Build FFmpeg inputs ----
-            inputs = []
-            input_idx = 0
-
-            # [bg_idx] Background source
-            if bg_image and os.path.isfile(bg_image):
-                inputs += ['-loop', '1', '-t', str(duration), '-i', bg_image]
-            elif bg_gradient and isinstance(bg_gradient, dict):
-                grad_img = self._render_gradient_image(
-                    width, height,
-                    bg_gradient.get('color1', '#000000'),
-                    bg_gradient.get('color2', '#333333'),
-                    bg_gradient.get('direction', 'vertical'))
-                grad_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-                grad_img.save(grad_file.name)
-                grad_file.close()
-                temp_files.append(grad_file.name)
-                inputs += ['-loop', '1', '-t', str(duration), '-i', grad_file.name]
-            else:
-                bg_hex = bg_color.lstrip('#')
-                inputs += ['-f', 'lavfi', '-i',
-                           f'color=0x{bg_hex}:s={resolution}:d={duration}:r={fps}']
-            bg_idx = input_idx
-            input_idx += 1
-
-            # [patron_idx] Patron names
-            inputs += ['-loop', '1', '-t', str(duration), '-i', patrons_file.name]
-            patron_idx = input_idx
-            input_idx += 1
-
-            # [header_idx] Header
-            inputs += ['-loop', '1', '-t', str(duration), '-i', header_file.name]
-            header_idx = input_idx
-            input_idx += 1
-
-            # [logo_idx] Logo overlay (optional)
-            logo_idx = None
-            if logo_file and os.path.isfile(logo_file):
-                inputs += ['-loop', '1', '-t', str(duration), '-i', logo_file]
-                logo_idx = input_idx
+            frame_total = int(duration * fps)
+            fg_bands = self._plate_bands(fg_plate) if compositor == 'ffmpeg' else None
+
+            def video_graph(first=0, count=None):
+                """Return (inputs, filters, output label, raw frames) for the
+                video of frames [first, first + count), or of the whole
+                timeline when *count* is None.
+
+                A segment keeps the timeline's timestamps (frame n at
+                t = n/fps) through the graph, so the scroll, tile and fade
+                expressions are the same for every segment, and is shifted
+                to start at 0 only at the end.
+                """
+                segment = count is not None
+                if not segment:
+                    count = frame_total
+                if compositor == 'numpy':
+                    # Frames are composited in NumPy and piped in as raw
+                    # video; FFmpeg only encodes
+                    from .compositor import FrameCompositor
+                    if bg_plate:
+                        with Image.open(bg_plate) as im:
+                            background = im.convert('RGB')
+                    else:
+                        background = Image.new('RGB', (width, height), self._hex_to_rgb(bg_color))
+                    with Image.open(fg_plate) as foreground:
+                        frame_compositor = FrameCompositor(
+                            background, foreground,
+                            fade_in=fade_in, fade_out=fade_out, duration=duration)
+                    frames = frame_compositor.frames(self._scroll_frames(
+                        tiles, schedule, effective_speed, base, height, fps, count, first))
+                    inputs = ['-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', resolution,
+                              '-framerate', str(fps), '-i', 'pipe:0']
+                    return inputs, [], '0:v', frames
+
+                # The tiles this range shows, from its first frame on
+                entries = []
+                for path, (_, n) in zip(tiles, schedule):
+                    if n >= first + count:
+                        break
+                    if n <= first:
+                        entries = [(path, 0)]
+                    else:
+                        entries.append((path, n - first))
+                patrons_list = self._ffconcat(entries, fps, scratch)
+                inputs = []
+                input_idx = 0
+
+                # The plates are read as a single frame and decoded once
+                # (``-loop 1`` would make the image demuxer re-read and
+                # re-decode them for every output frame).  Overlays repeat
+                # their last frame; the background is repeated by a loop
+                # filter below.
+
+                # [bg_idx] Background source (a segment is cut to length
+                # by -frames:v)
+                if bg_plate:
+                    inputs += ['-framerate', str(fps), '-i', bg_plate]
+                elif alpha:
+                    # A transparent canvas instead of a background
+                    length = '' if segment else f':d={duration}'
+                    inputs += ['-f', 'lavfi', '-i',
+                               f'color=c=black@0:s={resolution}{length}:r={fps},format=rgba']
+                else:
+                    bg_hex = bg_color.lstrip('#')
+                    length = '' if segment else f':d={duration}'
+                    inputs += ['-f', 'lavfi', '-i',
+                               f'color=0x{bg_hex}:s={resolution}{length}:r={fps}']
+                bg_idx = input_idx
                 input_idx += 1
 
-            # [qr_idx] QR code overlay (optional)
-            qr_idx = None
-            if qr_image and os.path.isfile(qr_image):
-                inputs += ['-loop', '1', '-t', str(duration), '-i', qr_image]
-                qr_idx = input_idx
+                # [patron_idx] Patron names: one frame per strip tile
+                inputs += ['-f', 'concat', '-safe', '0', '-i', patrons_list]
+                patron_idx = input_idx
                 input_idx += 1
 
-            # [audio_idx] Background music (optional)
-            audio_idx = None
-            if audio_file and os.path.isfile(audio_file):
-                inputs += ['-i', audio_file]
-                audio_idx = input_idx
+                # [fg_idx] Header, logo and QR code
+                inputs += ['-i', fg_plate]
+                fg_idx = input_idx
                 input_idx += 1
 
-            # ---- Build filter graph ----
-            filters = []
-            step = 0
-            margin = int(20 * scale_factor)
+                # ---- Build filter graph ----
+                filters = []
+                step = 0
+
+                # Layers are converted to the YUV formats overlay blends in
+                # before they are repeated, so each conversion runs once per
+                # render (plates) or once per strip tile, never per frame.
+                # Opaque layers are yuv420p, which overlay copies without
+                # alpha blending.  A transparent render blends in RGBA
+                # throughout, so the canvas keeps its alpha channel.
+                blend = ':format=rgb' if alpha else ''
+
+                # Repeat the background plate at the output rate, so frame
+                # n of the main input is at t = n/fps (the tile schedule
+                # relies on it)
+                if bg_plate:
+                    trim = '' if segment else f',trim=duration={duration}'
+                    filters.append(
+                        f'[{bg_idx}:v]setsar=1,format=yuv420p,'
+                        f'loop=loop=-1:size=1,settb=1/{fps},setpts=N+{first}{trim}[bg]')
+                    cur = '[bg]'
+                elif segment:
+                    filters.append(f'[{bg_idx}:v]settb=1/{fps},setpts=PTS+{first}[bg]')
+                    cur = '[bg]'
+                else:
+                    cur = f'[{bg_idx}:v]'
 
-            # Scale background image to video resolution if needed
-            if use_custom_bg:
-                filters.append(
-                    f'[{bg_idx}:v]scale={width}:{height},setsar=1[bg]')
-                cur = '[bg]'
-            else:
-                cur = f'[{bg_idx}:v]'
-
-            # Patron overlay with scroll
-            filters.append(
-                f'[{patron_idx}:v]format=rgba,scale={width}:{patrons_height}[patron]')
-            filters.append(
-                f"{cur}[patron]overlay=0:'{patron_y_expr}'[v{step}]")
-            cur = f'[v{step}]'
-            step += 1
-
-            # Header overlay (solid bg acts as mask for scrolling names)
-            filters.append(f"{cur}[{header_idx}:v]overlay=0:0[v{step}]")
-            cur = f'[v{step}]'
-            step += 1
-
-            # Logo overlay
-            if logo_idx is not None:
-                scaled_logo = int(logo_size * scale_factor)
-                lx, ly = self._compute_overlay_position(
-                    logo_position, scaled_logo, scaled_logo,
-                    width, height, margin)
-                filters.append(
-                    f'[{logo_idx}:v]format=rgba,scale={scaled_logo}:-2[logo]')
+                # Patron overlay with scroll
+                if alpha:
+                    patron_format = 'rgba'
+                else:
+                    patron_format = 'yuva420p' if trans else 'yuv420p'
+                shift = f',settb=1/{fps},setpts=PTS+{first}' if segment else ''
+                filters.append(f'[{patron_idx}:v]format={patron_format}{shift}[patron]')
                 filters.append(
-                    f"{cur}[logo]overlay={lx}:{ly}[v{step}]")
+                    f"{cur}[patron]overlay=0:'{patron_y_expr}'{blend}[v{step}]")
                 cur = f'[v{step}]'
                 step += 1
+                if alpha and 0 < header_height < height:
+                    # No opaque header hides the names scrolling under it:
+                    # cut them off at its lower edge
+                    filters.append(
+                        f'{cur}crop=iw:ih-{header_height}:0:{header_height},'
+                        f'pad=iw:ih+{header_height}:0:{header_height}:color=black@0'
+                        f'[v{step}]')
+                    cur = f'[v{step}]'
+                    step += 1
+
+                # Foreground plate (the header masks the scrolling names).
+                # One full-frame alpha overlay costs more than the layers
+                # it replaces, so the plate is overlaid as bands cropped to
+                # its visible pixels: opaque ones (the header, with a logo
+                # drawn on it) are copied, only the rest is blended.
+                labels = [f'[fg{i}]' for i in range(len(fg_bands))]
+                if len(fg_bands) > 1:
+                    filters.append(f"[{fg_idx}:v]split={len(fg_bands)}{''.join(labels)}")
+                    sources = labels
+                else:
+                    sources = [f'[{fg_idx}:v]']
+                for source, label, (x, y, w, h, opaque) in zip(sources, labels, fg_bands):
+                    if alpha:
+                        band_format = 'rgba'
+                    else:
+                        band_format = 'yuv420p' if opaque else 'yuva420p'
+                    filters.append(f'{source}crop={w}:{h}:{x}:{y},format={band_format}{label}')
+                    filters.append(f"{cur}{label}overlay={x}:{y}{blend}[v{step}]")
+                    cur = f'[v{step}]'
+                    step += 1
+
+                # Fade in / out (to transparent rather than black, with alpha)
+                fade_alpha = ':alpha=1' if alpha else ''
+                fade_parts = []
+                if fade_in and float(fade_in) > 0:
+                    fade_parts.append(f'fade=t=in:st=0:d={fade_in}{fade_alpha}')
+                if fade_out and float(fade_out) > 0:
+                    fade_start = max(0, duration - float(fade_out))
+                    fade_parts.append(
+                        f'fade=t=out:st={fade_start}:d={fade_out}{fade_alpha}')
+                if segment:
+                    fade_parts.append('setpts=PTS-STARTPTS')
+                if fade_parts:
+                    filters.append(
+                        f"{cur}{','.join(fade_parts)}[v{step}]")
+                    cur = f'[v{step}]'
+                    step += 1
+                return inputs, filters, cur, None
+
+            def fan_out(filters, cur):
+                """Map labels of the video for each pending output: the
+                composited frames, split once per encoder."""
+                if len(pending) == 1:
+                    return [cur]
+                source = cur if cur.startswith('[') else f'[{cur}]'
+                labels = [f'[out{i}]' for i in range(len(pending))]
+                filters.append(f"{source}split={len(pending)}{''.join(labels)}")
+                return labels
+
+            # A single encode, or GOP-aligned segments encoded in parallel
+            # and joined without re-encoding; audio is added to the whole
+            # timeline either way.  Every output is encoded by the same
+            # FFmpeg process.
+            gop = max(1, round(fps * SEGMENT_GOP_SECONDS))
+            if segment is not None:
+                bounds = [tuple(segment)]
+            else:
+                bounds = self.plan_segments(duration, fps, segments)
+            threads = str(max(1, (os.cpu_count() or 1) // len(bounds)))
 
-            # QR code overlay
-            if qr_idx is not None:
-                scaled_qr = int(qr_size * scale_factor)
-                qx, qy = self._compute_overlay_position(
-                    qr_position, scaled_qr, scaled_qr,
-                    width, height, margin)
-                filters.append(
-                    f'[{qr_idx}:v]format=rgba,scale={scaled_qr}:-2[qr]')
-                filters.append(
-                    f"{cur}[qr]overlay={qx}:{qy}[v{step}]")
-                cur = f'[v{step}]'
-                step += 1
+            for t in pending:
+                if len(bounds) > 1 or segment is not None:
+                    t['video_args'] = encoders.video_args(t['profile'], fps, gop, threads)
+                else:
+                    t['video_args'] = encoders.video_args(t['profile'], fps)
+
+            def segment_job(first, count, paths):
+                inputs, filters, cur, frames = video_graph(first, count)
+                labels = fan_out(filters, cur)
+                cmd = [self._ffmpeg_path] + inputs
+                if filters:
+                    cmd += ['-filter_complex', ';'.join(filters)]
+                for label, t, path in zip(labels, pending, paths):
+                    cmd += ['-map', label, '-frames:v', str(count)] + t['video_args']
+                    cmd += ['-an', '-y', path]
+                return cmd, count, frames
+
+            encode_started = time.monotonic()
+            record.update(segments=len(bounds),
+                          rasterise_seconds=round(encode_started - started, 2))
+            if len(pending) > 1:
+                logger.info("Encoding %d outputs in one pass: %s", len(pending),
+                            ', '.join(t['profile']['name'] for t in pending))
+            if segment is not None:
+                cmd, count, frames = segment_job(bounds[0][0], bounds[0][1],
+                                                 [t['path'] for t in pending])
+                report({'stage': 'encoding', 'percent': 0})
+                run_ffmpeg(cmd, total_frames=count, on_progress=report,
+                           control=control, frames=frames)
+            elif len(bounds) > 1:
+                parts = [[scratch.path(encoders.extension(t['profile']),
+                                       size=width * height * count // 8)
+                          for _, count in bounds]
+                         for t in pending]
+                jobs = [segment_job(first, count, [p[i] for p in parts])
+                        for i, (first, count) in enumerate(bounds)]
+                logger.info("Encoding %d frames as %d segments", frame_total, len(jobs))
+                report({'stage': 'encoding', 'percent': 0})
+                run_ffmpeg_parallel(jobs, on_progress=report, control=control)
+                checkpoint()
+                for t, t_parts in zip(pending, parts):
+                    self._join_segments(t_parts, t['path'], t['profile'], audio_file,
+                                        audio_volume, frame_total, scratch, report, control)
+            else:
+                inputs, filters, cur, frames = video_graph()
+                labels = fan_out(filters, cur)
+                audio_inputs, audio_filters, audio_outs = self._audio_args(
+                    audio_file, audio_volume, len([a for a in inputs if a == '-i']),
+                    copies=len(pending))
+
+                # ---- Assemble command ----
+                cmd = [self._ffmpeg_path] + inputs + audio_inputs
+                if filters or audio_filters:
+                    cmd += ['-filter_complex', ';'.join(filters + audio_filters)]
+                for i, (label, t) in enumerate(zip(labels, pending)):
+                    cmd += ['-map', label]
+                    if audio_outs:
+                        cmd += ['-map', audio_outs[i]]
+                    cmd += t['video_args']
+                    if audio_outs:
+                        cmd += encoders.audio_args(t['profile'])
+                    cmd += ['-shortest', '-y', t['path']]
+
+                report({'stage': 'encoding', 'percent': 0})
+                run_ffmpeg(cmd, total_frames=frame_total, on_progress=report,
+                           control=control, frames=frames)
+
+            finished = True
+            logger.info("Video rendered successfully: %s",
+                        ', '.join(t['filename'] for t in targets))
+            write_records(encode_seconds=round(time.monotonic() - encode_started, 2),
+                          render_seconds=round(time.monotonic() - started, 2))
+            for t in pending:
+                if t['cache_key'] is None:
+                    continue
+                try:
+                    cache.put(t['cache_key'], t['path'], meta={
+                        'filename': t['filename'], 'resolution': resolution,
+                        'duration': duration, 'fps': fps,
+                        'patron_count': len(patrons),
+                    })
+                except OSError as e:
+                    logger.warning("Could not store render in cache: %s", e)
+            return result()
 
-            # Fade in / out
-            fade_parts = []
-            if fade_in and float(fade_in) > 0:
-                fade_parts.append(f'fade=t=in:st=0:d={fade_in}')
-            if fade_out and float(fade_out) > 0:
-                fade_start = max(0, duration - float(fade_out))
-                fade_parts.append(
-                    f'fade=t=out:st={fade_start}:d={fade_out}')
-            if fade_parts:
-                filters.append(
-                    f"{cur}{','.join(fade_parts)}[v{step}]")
-                cur = f'[v{step}]'
-                step += 1
+        finally:
+            self._local.text_engine = None
+            if not finished:
+                # Don't leave truncated videos in the gallery
+                for t in targets:
+                    if os.path.exists(t['path']):
+                        os.unlink(t['path'])
+            scratch.cleanup()
+
+    def render_outputs(self, outputs, progress_callback=None, **kwargs):
+        """Render the same credits to several sizes and encoders at once.
+
+        *outputs* is a list of {resolution, encoder?}; the other arguments
+        are render_video()'s (its *resolution* is ignored).  The credits are
+        laid out once per distinct resolution, and the outputs of one
+        resolution are a single pass: composited once and encoded together
+        by one FFmpeg process (see render_video(outputs=...)).  Transparent
+        outputs are a pass of their own.  Returns the filenames in the order
+        of *outputs*.
+        """
+        if not outputs:
+            raise ValueError('At least one output is required')
+        groups = {}
+        for i, out in enumerate(outputs):
+            profile = encoders.resolve_profile(
+                out.get('encoder') or kwargs.get('encoder') or self.encoder, self._ffmpeg_path)
+            groups.setdefault((out['resolution'], bool(profile['alpha'])), []).append(i)
+        kwargs.pop('resolution', None)
+        filenames = [None] * len(outputs)
+        try:
+            for n, ((resolution, _), indices) in enumerate(groups.items()):
+                group = [outputs[i] for i in indices]
+
+                def report(info, n=n):
+                    # Overall progress across the passes
+                    if progress_callback:
+                        info = dict(info, output_pass=n + 1, output_passes=len(groups))
+                        if info.get('percent') is not None:
+                            info['percent'] = round((n + info['percent'] / 100)
+                                                    * 100 / len(groups), 1)
+                        progress_callback(info)
+
+                names = self.render_video(resolution=resolution, outputs=group,
+                                          progress_callback=report, **kwargs)
+                for i, name in zip(indices, names):
+                    filenames[i] = name
+        except BaseException:
+            # All outputs or none
+            for name in filenames:
+                if name is not None:
+                    path = os.path.join(self.output_dir, name)
+                    for leftover in (path, encoders.sidecar_path(path)):
+                        if os.path.exists(leftover):
+                            os.unlink(leftover)
+            raise
+        return filenames
 
-            # Audio volume filter
-            audio_out = None
-            if audio_idx is not None:
-                vol = max(0.0, min(2.0, float(audio_volume)))
-                if vol != 1.0:
-                    filters.append(
-                        f'[{audio_idx}:a]volume={vol}[aout]')
-                    audio_out = '[aout]'
-                else:
-                    audio_out = f'{audio_idx}:a'
+    @staticmethod
+    def _audio_args(audio_file, audio_volume, input_idx, copies=1):
+        """Return (inputs, filters, map labels) adding background music as
+        input *input_idx* to *copies* outputs, or empty lists without it."""
+        if not (audio_file and os.path.isfile(audio_file)):
+            return [], [], []
+        vol = max(0.0, min(2.0, float(audio_volume)))
+        if vol == 1.0:
+            # An input stream can be mapped to any number of outputs
+            return ['-i', audio_file], [], [f'{input_idx}:a'] * copies
+        if copies == 1:
+            return ['-i', audio_file], [f'[{input_idx}:a]volume={vol}[aout]'], ['[aout]']
+        labels = [f'[aout{i}]' for i in range(copies)]
+        return (['-i', audio_file],
+                [f"[{input_idx}:a]volume={vol},asplit={copies}{''.join(labels)}"], labels)
+
+    def _join_segments(self, parts, output_path, profile, audio_file, audio_volume,
+                       total_frames, scratch, report, control):
+        """Concatenate segment videos into *output_path* without re-encoding
+        them, adding the background music over the whole timeline."""
+        inputs = ['-f', 'concat', '-safe', '0', '-i', self._concat_list(parts, scratch)]
+        audio_inputs, audio_filters, audio_outs = self._audio_args(audio_file, audio_volume, 1)
+        cmd = [self._ffmpeg_path] + inputs + audio_inputs
+        if audio_filters:
+            cmd += ['-filter_complex', ';'.join(audio_filters)]
+        cmd += ['-map', '0:v']
+        if audio_outs:
+            cmd += ['-map', audio_outs[0]] + encoders.audio_args(profile)
+        cmd += ['-c:v', 'copy', '-shortest', '-y', output_path]
+        report({'stage': 'joining', 'percent': 0})
+        run_ffmpeg(cmd, total_frames=total_frames,
+                   on_progress=lambda info: report(dict(info, stage='joining')),
+                   control=control)
+
+    def join_segments(self, parts, total_frames=None, audio_file=None, audio_volume=1.0,
+                      encoder=None, record=None, progress_callback=None, control=None):
+        """Join videos rendered with ``render_video(segment=...)``, in order,
+        into a new video in the output folder; returns its filename.
+
+        Audio is added here, once for the whole timeline.  *encoder* must
+        name the profile the parts were encoded with; *record* adds fields
+        (resolution, timings, ...) to the video's encode record.
+        """
+        profile = encoders.resolve_profile(encoder or self.encoder, self._ffmpeg_path)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output_filename = (f'credits_{timestamp}_{uuid.uuid4().hex[:6]}'
+                           f'{encoders.extension(profile)}')
+        output_path = os.path.join(self.output_dir, output_filename)
+        finished = False
+        try:
+            with Scratch(**self.scratch_settings) as scratch:
+                self._join_segments(parts, output_path, profile, audio_file, audio_volume,
+                                    total_frames, scratch, progress_callback or (lambda info: None),
+                                    control)
+            finished = True
+            encoders.write_sidecar(output_path, profile, None, segments=len(parts),
+                                   **(record or {}))
+            return output_filename
+        finally:
+            if not finished and os.path.exists(output_path):
+                os.unlink(output_path)
 
-            filter_str = ';'.join(filters)
+    def _render_key(self, cache_params, profile):
+        # The resolved settings, so editing a custom profile misses the cache
+        return self.render_cache.key_for(dict(cache_params, encoder={
+            k: v for k, v in profile.items()
+            if k not in ('label', 'description', 'goal')}))
 
-            # ---- Assemble command ----
-            cmd = [self._ffmpeg_path] + inputs
-            cmd += ['-filter_complex', filter_str]
-            cmd += ['-map', cur]
-            if audio_out:
-                cmd += ['-map', audio_out]
-            cmd += ['-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-preset', 'fast', '-r', str(fps)]
-            if audio_out:
-                cmd += ['-c:a', 'aac', '-b:a', '192k']
-            cmd += ['-shortest', '-y', output_path]
+    def render_cache_key(self, params):
+        """Render cache key of ``render_video(**params)``, or None when the
+        render cache is off or *params* opt out of it.
 
-            result = subprocess.run(cmd, capture_output=True, text=True, **_subprocess_kwargs())
+        For callers that produce the same video another way, such as the
+        cluster coordinator joining segments from worker nodes.
+        """
+        if self.render_cache is None or not params.get('use_cache', True):
+            return None
+        bound = inspect.signature(self.render_video).bind(**params)
+        bound.apply_defaults()
+        cache_params = {k: v for k, v in bound.arguments.items()
+                        if k not in UNCACHED_PARAMS}
+        profile = encoders.resolve_profile(cache_params['encoder'] or self.encoder,
+                                           self._ffmpeg_path)
+        # Resolved as render_video() does
+        cache_params['text_engine'] = cache_params['text_engine'] or self.text_engine
+        compositor = cache_params['compositor'] or self.compositor
+        if compositor == 'numpy' and (np is None or profile['alpha']):
+            compositor = 'ffmpeg'
+        cache_params['compositor'] = compositor
+        return self._render_key(cache_params, profile)
+
+    def cached_render(self, params):
+        """Copy of ``render_video(**params)`` from the render cache, as a new
+        video in the output folder.
+
+        Returns (key, filename): filename is None on a miss, and key is
+        None when the result should not be stored either.
+        """
+        try:
+            key = self.render_cache_key(params)
+            cached = key and self.render_cache.get(key)
+            if not cached:
+                return key, None
+            profile = encoders.resolve_profile(params.get('encoder') or self.encoder,
+                                               self._ffmpeg_path)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            filename = (f'credits_{timestamp}_{uuid.uuid4().hex[:6]}'
+                        f'{encoders.extension(profile)}')
+            path = os.path.join(self.output_dir, filename)
+            link_or_copy(cached, path)
+        except OSError as e:
+            logger.warning("Render cache lookup failed: %s", e)
+            return None, None
+        logger.info("Render cache hit %s -> %s", key[:12], filename)
+        duration = params.get('duration', 15)
+        fps = params.get('fps', 30)
+        encoders.write_sidecar(path, profile, None, cached=True,
+                               resolution=params.get('resolution', '1280x720'),
+                               fps=fps, duration=duration, frames=int(duration * fps),
+                               patron_count=len(params.get('patrons') or ()))
+        return key, filename
 
-            if result.returncode != 0:
-                logger.error("FFmpeg failed: %s", result.stderr[:500])
-                raise Exception(f"FFmpeg error: {result.stderr}")
+    @staticmethod
+    def plan_segments(duration, fps, segments):
+        """[(first frame, frame count)] of the GOP-aligned segments a render
+        of *duration* seconds is split into for *segments* encoders."""
+        gop = max(1, round(fps * SEGMENT_GOP_SECONDS))
+        return VideoRenderer._segment_bounds(int(duration * fps), segments, gop)
+
+    def _layer_png(self, cache, kind, render, inputs, scratch, extra=None):
+        """Return (png_path, height) for a rasterised layer.
+
+        *render* is called with the *inputs* kwargs (plus *extra*, which
+        does not affect the pixels and is left out of the key) and returns
+        ``(image, height)``.  With a LayerCache the PNG is looked up by the
+        hash of *kind* and *inputs* first, and stored after rendering.  New
+        PNGs are written to *scratch*, and cache hits linked into it.
+        """
+        key = None
+        if cache is not None:
+            key = cache.key_for(kind, dict(inputs, text_engine=self._current_engine()))
+        if key is not None:
+            cached = cache.get(key)
+            if cached:
+                try:
+                    path = scratch.link(cached)
+                    with Image.open(path) as im:
+                        logger.debug("Layer cache hit: %s %s", kind, key[:12])
+                        return path, im.height
+                except OSError:
+                    # Evicted meanwhile, or unreadable
+                    cache.remove(key)
+
+        img, height = render(**inputs, **(extra or {}))
+        path = scratch.save_png(img)
+        if key is not None:
+            try:
+                cache.put(key, path, meta={'kind': kind, 'height': height,
+                                               'width': img.width})
+            except OSError as e:
+                logger.warning("Could not store %s layer in cache: %s", kind, e)
+        return path, height
 
-            logger.info("Video rendered successfully: %s", output_filename)
-            return output_filename
+    @staticmethod
+    def _tile_schedule(speed, base, tile_step, last_tile, fps, frames):
+        """Return [(tile index, first frame)] for each tile the scroll shows.
 
-        finally:
-            for f in temp_files:
-                if os.path.exists(f):
-                    os.unlink(f)
+        Uses exactly the arithmetic of the overlay's tile expression, with
+        t computed as FFmpeg does for frame n of a 1/fps time base.
+        """
+        frame_time = 1 / fps
+        schedule = []
+        for n in range(frames):
+            t = n * frame_time
+            k = min(max(math.floor((t * speed - base) / tile_step), 0), last_tile)
+            if not schedule or schedule[-1][0] != k:
+                schedule.append((k, n))
+        return schedule
+
+    @staticmethod
+    def _scroll_frames(tiles, schedule, speed, base, tile_step, fps, frames, first=0):
+        """Yield (tile path, tile y, t) for *frames* frames from frame *first*.
+
+        y is the overlay filter's ``H+header_height-(t*speed)+height*k``
+        with tile k = ``schedule`` entry, truncated and rounded down to an
+        even row as FFmpeg's overlay does on a yuv420 frame.
+        """
+        frame_time = 1 / fps
+        j = 0
+        for n in range(first, first + frames):
+            while j + 1 < len(schedule) and schedule[j + 1][1] <= n:
+                j += 1
+            t = n * frame_time
+            yield tiles[j], int(base - t * speed + tile_step * schedule[j][0]) & ~1, t
+
+    def _strip_tiles(self, cache, kind, inputs, strip, indices, tile_step,
+                     scratch, sprite_cache=None, checkpoint=None, report=None):
+        """Write strip tiles (rows k*step to (k+2)*step + TILE_MARGIN) as PNGs.
+
+        Returns their paths in *indices* order.  With a LayerCache each
+        tile is looked up and stored under its own key, so a cached roster
+        skips rasterising; hits are linked into *scratch*.  Consecutive
+        tiles overlap by *tile_step* rows, so the strip is drawn once in
+        *tile_step*-high bands and each tile is assembled from three of
+        them; at most three bands and one tile are held in memory (plus
+        bands in flight on the raster pool).
+        """
+        tile_height = 2 * tile_step + TILE_MARGIN
+        paths = {}
+        keys = {}
+        if cache is not None:
+            engine = self._current_engine()
+            for k in indices:
+                keys[k] = cache.key_for(kind, dict(inputs, text_engine=engine,
+                                                   tile=[k * tile_step, tile_height]))
+                cached = cache.get(keys[k])
+                if cached:
+                    try:
+                        paths[k] = scratch.link(cached)
+                    except OSError:
+                        # Evicted since the lookup: draw it again
+                        pass
+        missing = sorted(k for k in set(indices) if k not in paths)
+        full = {j for k in missing for j in (k, k + 1)}
+        margin = {k + 2 for k in missing} - full
+        band_ids = sorted(full | margin)
+        regions = [(j * tile_step, j * tile_step + (TILE_MARGIN if j in margin else tile_step))
+                   for j in band_ids]
+        bands_iter = zip(band_ids, self._strip_regions(strip, regions, sprite_cache))
+        bands = {}
+        for i, k in enumerate(missing):
+            while k + 2 not in bands:
+                j, band = next(bands_iter)
+                bands[j] = band
+            tile = Image.new(strip.mode, (strip.width, tile_height))
+            tile.paste(bands[k], (0, 0))
+            tile.paste(bands[k + 1], (0, tile_step))
+            tile.paste(bands[k + 2].crop((0, 0, strip.width, TILE_MARGIN)), (0, 2 * tile_step))
+            for j in [j for j in bands if j <= k]:
+                del bands[j]
+            paths[k] = scratch.save_png(tile)
+            del tile
+            if k in keys:
+                try:
+                    cache.put(keys[k], paths[k], meta={'kind': kind, 'tile': k,
+                                                       'height': tile_height})
+                except OSError as e:
+                    logger.warning("Could not store %s tile in cache: %s", kind, e)
+            if report:
+                report({'stage': 'rasterising',
+                        'percent': round(100.0 * (i + 1) / len(missing), 1)})
+            if checkpoint:
+                checkpoint()
+        return [paths[k] for k in indices]
+
+    @staticmethod
+    def _segment_bounds(frames, segments, gop):
+        """Split *frames* into up to *segments* [(first, count)] runs of
+        whole GOPs (the last run takes the remainder)."""
+        gops = -(-frames // gop)
+        segments = max(1, min(segments, gops // SEGMENT_MIN_GOPS))
+        per_segment = -(-gops // segments)
+        bounds = []
+        for first in range(0, frames, per_segment * gop):
+            bounds.append((first, min(per_segment * gop, frames - first)))
+        return bounds
+
+    @staticmethod
+    def _concat_list(paths, scratch):
+        """Write a concat demuxer list joining the videos at *paths*."""
+        text = 'ffconcat version 1.0\n' + ''.join(
+            "file '%s'\n" % path.replace("'", "'\\''") for path in paths)
+        path = scratch.path('.ffconcat', size=len(text.encode('utf-8')))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    @staticmethod
+    def _ffconcat(entries, fps, scratch):
+        """Write an ffconcat list showing each (png, first frame) until the next.
+
+        Files are read at *fps*, so each image's timestamp is exactly its
+        first frame number.
+        """
+        entries = list(entries)
+        lines = ['ffconcat version 1.0']
+        for i, (path, frame) in enumerate(entries):
+            lines.append("file '%s'" % path.replace("'", "'\\''"))
+            lines.append(f'option framerate {fps}')
+            if i + 1 < len(entries):
+                start = round(frame * 1000000 / fps)
+                end = round(entries[i + 1][1] * 1000000 / fps)
+                lines.append(f'duration {end - start}us')
+        text = '\n'.join(lines) + '\n'
+        path = scratch.path('.ffconcat', size=len(text.encode('utf-8')))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
 
     # ------------------------------------------------------------------
     # Utilities
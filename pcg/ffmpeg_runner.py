@@ -0,0 +1,329 @@
+"""Run FFmpeg while following its machine-readable progress output.
+
+FFmpeg is started with ``-progress pipe:1 -nostats`` so it writes blocks of
+``key=value`` lines (frame, fps, out_time_us, speed, progress) to stdout
+while it encodes.  Each completed block is turned into a progress dict
+with percent complete and an ETA and handed to a callback.
+
+A watchdog thread kills FFmpeg when its RenderControl is cancelled, when
+the job's wall-clock deadline passes, or when the progress output stops
+advancing for ``stall_timeout`` seconds.  Stderr is logged line by line
+and only the last ``STDERR_TAIL_LINES`` lines are kept for error messages.
+
+When the video is composited in Python, the raw frames are written to
+FFmpeg's stdin from a feeder thread while progress is read as usual.
+
+``run_ffmpeg_parallel`` runs the encodes of a segmented render side by
+side, reports their combined progress and stops the others as soon as one
+fails.
+"""
+
+import logging
+import subprocess
+import threading
+import time
+from collections import deque
+
+from .path_utils import _subprocess_kwargs
+
+logger = logging.getLogger(__name__)
+
+STDERR_TAIL_LINES = 100     # stderr lines kept for error reports
+DEFAULT_STALL_TIMEOUT = 120  # seconds without encode progress before killing FFmpeg
+WATCHDOG_INTERVAL = 0.5
+KILL_GRACE = 5               # seconds between terminate() and kill()
+
+
+class RenderCancelled(Exception):
+    """The render was cancelled by the user."""
+
+
+class RenderTimeout(Exception):
+    """The render exceeded its wall-clock limit or FFmpeg stopped making progress."""
+
+
+class RenderControl:
+    """Cancellation flag and time limits shared by one render.
+
+    *timeout* is the wall-clock budget in seconds for the whole render
+    (None or 0 = unlimited), counted from construction.  *stall_timeout*
+    is how long FFmpeg may go without advancing before the watchdog
+    kills it.  ``cancel()`` may be called from any thread.
+    """
+
+    def __init__(self, timeout=None, stall_timeout=DEFAULT_STALL_TIMEOUT):
+        self.timeout = timeout or None
+        self.stall_timeout = stall_timeout or None
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def check(self):
+        """Raise RenderCancelled / RenderTimeout if the render must stop."""
+        if self.cancelled:
+            raise RenderCancelled('Render cancelled')
+        if self.expired():
+            raise RenderTimeout(f'Render exceeded its {self.timeout:g}s time limit')
+
+
+def _to_float(value):
+    try:
+        return float(str(value).rstrip('x'))
+    except (TypeError, ValueError):
+        return None
+
+
+def progress_info(block, total_frames, started):
+    """Build a progress dict from one ``-progress`` block.
+
+    *block* is the dict of raw key/values FFmpeg reported, *total_frames*
+    the expected output frame count (or None) and *started* the
+    ``time.monotonic()`` at which the encode began.
+    """
+    frame = int(_to_float(block.get('frame')) or 0)
+    fps = _to_float(block.get('fps')) or 0.0
+    speed = _to_float(block.get('speed'))
+    out_time_us = _to_float(block.get('out_time_us')) or _to_float(block.get('out_time_ms'))
+    elapsed = time.monotonic() - started
+
+    percent = None
+    eta = None
+    if total_frames:
+        percent = min(100.0, 100.0 * frame / total_frames)
+        remaining = max(0, total_frames - frame)
+        if fps > 0:
+            eta = remaining / fps
+        elif frame > 0:
+            eta = remaining * elapsed / frame
+    if block.get('progress') == 'end':
+        percent = 100.0
+        eta = 0.0
+
+    return {
+        'stage': 'encoding',
+        'frame': frame,
+        'total_frames': total_frames,
+        'percent': round(percent, 1) if percent is not None else None,
+        'fps': fps,
+        'speed': speed,
+        'out_time': round(out_time_us / 1e6, 3) if out_time_us is not None else None,
+        'elapsed': round(elapsed, 1),
+        'eta': round(eta, 1) if eta is not None else None,
+    }
+
+
+def _stop(proc):
+    """Terminate FFmpeg, escalating to kill() if it ignores the request."""
+    if proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=KILL_GRACE)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def run_ffmpeg(cmd, total_frames=None, on_progress=None, control=None,
+               frames=None):
+    """Run an FFmpeg command list, reporting progress as it encodes.
+
+    ``-progress pipe:1 -nostats`` is inserted after the executable.
+    *frames*, if given, is an iterable of bytes-like raw frames written to
+    FFmpeg's stdin (for a ``-i pipe:0`` input); an exception raised while
+    producing them stops FFmpeg and is re-raised.
+    Returns the tail of FFmpeg's stderr; raises on a non-zero exit code,
+    and RenderCancelled / RenderTimeout when *control* stops the encode.
+    """
+    if control is not None:
+        control.check()
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats'] + list(cmd[1:])
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL if frames is None else subprocess.PIPE,
+        text=True, encoding='utf-8', errors='replace',
+        **_subprocess_kwargs())
+
+    # Drain stderr on a thread so a chatty FFmpeg can't fill the pipe
+    # and stall while we're blocked reading progress from stdout.
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+
+    def drain_stderr():
+        for line in proc.stderr:
+            line = line.rstrip()
+            if line:
+                logger.debug("ffmpeg: %s", line)
+                stderr_tail.append(line)
+
+    stderr_thread = threading.Thread(target=drain_stderr, daemon=True)
+    stderr_thread.start()
+
+    feed_errors = []
+    feeder = None
+
+    def feed():
+        try:
+            for frame in frames:
+                try:
+                    proc.stdin.buffer.write(frame)
+                except (OSError, ValueError):
+                    return      # FFmpeg exited early; its exit status says why
+        except Exception as e:
+            feed_errors.append(e)
+            _stop(proc)
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    if frames is not None:
+        feeder = threading.Thread(target=feed, name='ffmpeg-feeder', daemon=True)
+        feeder.start()
+
+    started = time.monotonic()
+    last_advance = [started, None]   # time of last change, last (frame, out_time)
+    stopped = []                     # exception the watchdog stopped FFmpeg with
+    done = threading.Event()
+
+    def watchdog():
+        while not done.wait(WATCHDOG_INTERVAL):
+            try:
+                control.check()
+                if (control.stall_timeout
+                        and time.monotonic() - last_advance[0] > control.stall_timeout):
+                    raise RenderTimeout(
+                        f'FFmpeg made no progress for {control.stall_timeout:g}s')
+            except (RenderCancelled, RenderTimeout) as e:
+                logger.warning("Stopping FFmpeg (pid %d): %s", proc.pid, e)
+                stopped.append(e)
+                _stop(proc)
+                return
+
+    if control is not None:
+        threading.Thread(target=watchdog, name='ffmpeg-watchdog', daemon=True).start()
+
+    block = {}
+    try:
+        for line in proc.stdout:
+            key, sep, value = line.strip().partition('=')
+            if not sep:
+                continue
+            block[key] = value
+            if key == 'progress':
+                position = (block.get('frame'), block.get('out_time_us'))
+                if position != last_advance[1]:
+                    last_advance[:] = [time.monotonic(), position]
+                if on_progress:
+                    try:
+                        on_progress(progress_info(block, total_frames, started))
+                    except Exception:
+                        logger.debug("Progress callback failed", exc_info=True)
+                block = {}
+        proc.wait()
+    finally:
+        done.set()
+        _stop(proc)
+        stderr_thread.join()
+        if feeder is not None:
+            feeder.join()
+
+    stderr = '\n'.join(stderr_tail)
+    if stopped:
+        raise stopped[0]
+    if feed_errors:
+        raise feed_errors[0]
+    if proc.returncode != 0:
+        logger.error("FFmpeg failed: %s", stderr[-500:])
+        raise Exception(f"FFmpeg error: {stderr}")
+    return stderr
+
+
+class _SegmentControl:
+    """A render's RenderControl plus an abort flag shared by parallel encodes."""
+
+    def __init__(self, control, abort):
+        self.control = control
+        self.abort = abort
+        self.stall_timeout = control.stall_timeout if control is not None else None
+
+    def check(self):
+        if self.control is not None:
+            self.control.check()
+        if self.abort.is_set():
+            raise RenderCancelled('Another segment failed')
+
+
+def run_ffmpeg_parallel(jobs, on_progress=None, control=None):
+    """Run several FFmpeg encodes at once, as run_ffmpeg does one.
+
+    *jobs* are ``(cmd, total_frames, frames)`` tuples.  Progress dicts
+    report the frames of all jobs together (with ``segments``, the job
+    count).  When a job fails the others are stopped and the first error
+    is raised.
+    """
+    jobs = list(jobs)
+    total = sum(count for _, count, _ in jobs)
+    done_frames = [0] * len(jobs)
+    rates = [0.0] * len(jobs)
+    lock = threading.Lock()
+    abort = threading.Event()
+    errors = []
+    started = time.monotonic()
+
+    def report(i, info):
+        with lock:
+            done_frames[i] = info.get('frame') or 0
+            rates[i] = info.get('fps') or 0.0
+            frame, fps = sum(done_frames), sum(rates)
+        if on_progress is None:
+            return
+        elapsed = time.monotonic() - started
+        eta = None
+        if fps > 0:
+            eta = max(0, total - frame) / fps
+        elif frame > 0:
+            eta = max(0, total - frame) * elapsed / frame
+        on_progress({
+            'stage': 'encoding',
+            'frame': frame,
+            'total_frames': total,
+            'percent': round(min(100.0, 100.0 * frame / total), 1) if total else None,
+            'fps': fps,
+            'speed': None,
+            'out_time': None,
+            'elapsed': round(elapsed, 1),
+            'eta': round(eta, 1) if eta is not None else None,
+            'segments': len(jobs),
+        })
+
+    def run(i, cmd, count, frames):
+        try:
+            run_ffmpeg(cmd, total_frames=count, frames=frames,
+                       on_progress=lambda info: report(i, info),
+                       control=_SegmentControl(control, abort))
+        except Exception as e:
+            with lock:
+                first = not abort.is_set()
+                abort.set()
+            # Segments stopped because of this failure raise RenderCancelled
+            if first:
+                errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,) + tuple(job),
+                                name=f'ffmpeg-segment-{i}', daemon=True)
+               for i, job in enumerate(jobs)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
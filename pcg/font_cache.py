@@ -0,0 +1,138 @@
+"""Process-wide, memory-bounded cache of sized fonts.
+
+Every distinct (font file, size) needs its own FreeType face.  The renderer
+used to keep one per size forever in each VideoRenderer, so multi-resolution
+and tiered renders (tier headers are drawn at 1.3x) grew resident memory
+with every combination ever rendered, and a renderer rebuilt after
+``/install-ffmpeg`` started again from scratch.
+
+FontCache is shared by all renderers and render workers in the process and
+keeps sized fonts in LRU order under a byte budget.  Fonts are opened by
+path, so FreeType memory-maps the file: the file's pages live once in the
+OS page cache however many sizes (or worker processes) use it, and are
+charged to the budget once per file.  Each face is charged a fixed heap
+overhead on top.  Where Pillow has to read the file into memory instead
+(non-ASCII paths on Windows) the face is charged the full file size.
+"""
+
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from PIL import ImageFont
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FONT_MAX_MB = 128
+
+# Approximate FreeType heap per sized face (face/size records, charmaps,
+# CFF indexes); measured at roughly 80-200 KB for the bundled fonts.
+FACE_OVERHEAD = 256 * 1024
+
+
+def _mapped(path):
+    """True if Pillow lets FreeType map *path* rather than reading it."""
+    if sys.platform != 'win32':
+        return True
+    try:
+        path.encode('ascii')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+class FontCache:
+    """LRU of PIL fonts keyed on (path, size), bounded by estimated bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_FONT_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._fonts = OrderedDict()   # (path, size) -> (font, cost)
+        self._files = {}              # mapped path -> [file size, faces]
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, size):
+        """Return the font at *path* in *size*, or Pillow's default font."""
+        key = (path, size)
+        with self._lock:
+            entry = self._fonts.get(key)
+            if entry is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        font, cost, file_size = self._open(path, size)
+        with self._lock:
+            entry = self._fonts.get(key)
+            if entry is not None:       # loaded concurrently
+                return entry[0]
+            self._fonts[key] = (font, cost)
+            self._bytes += cost
+            if file_size:
+                mapped = self._files.setdefault(path, [file_size, 0])
+                if mapped[1] == 0:
+                    self._bytes += file_size
+                mapped[1] += 1
+            self._evict()
+        return font
+
+    def _open(self, path, size):
+        if path:
+            try:
+                font = ImageFont.truetype(path, size)
+            except (IOError, OSError):
+                pass
+            else:
+                try:
+                    file_size = os.path.getsize(path)
+                except OSError:
+                    file_size = 0
+                if _mapped(path):
+                    return font, FACE_OVERHEAD, file_size
+                return font, FACE_OVERHEAD + file_size, 0
+        return ImageFont.load_default(), FACE_OVERHEAD, 0
+
+    def _evict(self):
+        # Always keep the most recent font, even if it alone is over budget
+        while self._bytes > self.max_bytes and len(self._fonts) > 1:
+            (path, _size), (_font, cost) = self._fonts.popitem(last=False)
+            self._bytes -= cost
+            mapped = self._files.get(path)
+            if mapped is not None:
+                mapped[1] -= 1
+                if mapped[1] == 0:
+                    self._bytes -= mapped[0]
+                    del self._files[path]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._fonts.clear()
+            self._files.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._fonts), 'files': len(self._files),
+                    'bytes': self._bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
+
+
+_font_cache = None
+_font_cache_lock = threading.Lock()
+
+
+def get_font_cache():
+    """The process-wide FontCache, sized from ``load_cache_settings()``."""
+    global _font_cache
+    with _font_cache_lock:
+        if _font_cache is None:
+            from .cache import load_cache_settings
+            _font_cache = FontCache(load_cache_settings()['font_max_bytes'])
+        return _font_cache
@@ -0,0 +1,229 @@
+"""Persistent font coverage index.
+
+Font fallback needs to know which codepoints each font covers.  Reading that
+from the font's cmap with fontTools means parsing multi-megabyte CJK OTF
+files, which used to happen in every new process on its first render.  The
+index stores, per font file, the covered codepoints as sorted inclusive
+ranges plus a few basic metrics, keyed by absolute path and validated
+against the file's size and mtime.  It lives in ``cache/font_index.json``,
+loads in a few milliseconds and is shared by every VideoRenderer in the
+process.
+
+Fonts missing from the index (or changed on disk) are parsed on first use
+and the index is rewritten, so it never has to be built up front.  The
+Docker image prebuilds it with::
+
+    python -m pcg.font_index
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from bisect import bisect_right
+
+from .path_utils import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+INDEX_FILENAME = 'font_index.json'
+
+
+class Coverage:
+    """Set-like view over sorted, inclusive codepoint ranges."""
+
+    __slots__ = ('ranges', '_starts', '_ends', '_count')
+
+    def __init__(self, ranges):
+        self.ranges = ranges
+        self._starts = [r[0] for r in ranges]
+        self._ends = [r[1] for r in ranges]
+        self._count = sum(e - s + 1 for s, e in ranges)
+
+    def __contains__(self, cp):
+        i = bisect_right(self._starts, cp) - 1
+        return i >= 0 and cp <= self._ends[i]
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return '<Coverage %d codepoints in %d ranges>' % (self._count, len(self.ranges))
+
+
+def codepoint_ranges(codepoints):
+    """Collapse an iterable of codepoints into sorted [start, end] pairs."""
+    ranges = []
+    for cp in sorted(codepoints):
+        if ranges and cp == ranges[-1][1] + 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    return ranges
+
+
+def scan_font(path):
+    """Parse *path* and return (ranges, metrics); ranges is None if unreadable."""
+    from fontTools.ttLib import TTFont
+
+    try:
+        tt = TTFont(path, lazy=True, fontNumber=0)
+    except Exception as e:
+        logger.warning("Could not read font %s: %s", path, e)
+        return None, None
+    try:
+        cmap = tt.getBestCmap() or {}
+        ranges = codepoint_ranges(cmap.keys())
+        # 'kern': legacy kern table, the only pair kerning FreeType applies
+        # without a shaping engine
+        metrics = {'glyphs': len(tt.getGlyphOrder()), 'kern': 'kern' in tt}
+        if 'head' in tt:
+            metrics['units_per_em'] = tt['head'].unitsPerEm
+        if 'hhea' in tt:
+            hhea = tt['hhea']
+            metrics.update(ascender=hhea.ascent, descender=hhea.descent,
+                           line_gap=hhea.lineGap)
+        if 'name' in tt:
+            family = tt['name'].getDebugName(1)
+            if family:
+                metrics['family'] = family
+        return ranges, metrics
+    except Exception as e:
+        logger.warning("Could not read cmap of %s: %s", path, e)
+        return None, None
+    finally:
+        tt.close()
+
+
+class FontIndex:
+    """Codepoint coverage and metrics for font files, persisted as JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}     # abs path -> {'size', 'mtime', 'ranges', 'metrics'}
+        self._coverage = {}    # abs path -> Coverage or None
+        self._metrics = {}     # abs path -> metrics dict or None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable font index %s: %s", self.path, e)
+            return
+        if data.get('version') == INDEX_VERSION:
+            self._entries = data.get('fonts', {})
+
+    def _save(self):
+        d = os.path.dirname(self.path)
+        try:
+            fd, tmp = tempfile.mkstemp(dir=d, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'version': INDEX_VERSION, 'fonts': self._entries},
+                          f, separators=(',', ':'))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Could not write font index %s: %s", self.path, e)
+
+    def _entry(self, path):
+        """Return the up-to-date entry for *path*, scanning it if needed.
+
+        Returns (entry, changed); entry is None if the file does not exist.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None, False
+        entry = self._entries.get(path)
+        if entry and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime_ns:
+            return entry, False
+        ranges, metrics = scan_font(path)
+        entry = {'size': st.st_size, 'mtime': st.st_mtime_ns,
+                 'ranges': ranges, 'metrics': metrics}
+        self._entries[path] = entry
+        self._coverage.pop(path, None)
+        self._metrics.pop(path, None)
+        return entry, True
+
+    def coverage(self, path):
+        """Coverage of the font at *path*, or None if unknown (assume all)."""
+        if not path:
+            return None
+        path = os.path.abspath(path)
+        if path in self._coverage:
+            return self._coverage[path]
+        with self._lock:
+            entry, changed = self._entry(path)
+            cov = None
+            if entry and entry['ranges'] is not None:
+                cov = Coverage(entry['ranges'])
+            self._coverage[path] = cov
+            if changed:
+                self._save()
+        return cov
+
+    def metrics(self, path):
+        """Basic metrics (units_per_em, ascender, ...) of the font at *path*."""
+        if not path:
+            return None
+        path = os.path.abspath(path)
+        if path in self._metrics:
+            return self._metrics[path]
+        with self._lock:
+            entry, changed = self._entry(path)
+            metrics = entry['metrics'] if entry else None
+            self._metrics[path] = metrics
+            if changed:
+                self._save()
+        return metrics
+
+    def build(self, paths):
+        """Index every existing font in *paths*; returns how many were (re)scanned."""
+        scanned = 0
+        with self._lock:
+            for p in paths:
+                entry, changed = self._entry(os.path.abspath(p))
+                scanned += changed
+            if scanned:
+                self._save()
+        return scanned
+
+    def stats(self):
+        return {'fonts': len(self._entries), 'loaded': len(self._coverage)}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_font_index():
+    """Process-wide FontIndex stored in the cache directory."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FontIndex(os.path.join(get_cache_dir(), INDEX_FILENAME))
+        return _index
+
+
+def main():
+    import time
+
+    from .ffmpeg_renderer import indexed_font_paths
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    start = time.time()
+    index = get_font_index()
+    paths = indexed_font_paths()
+    scanned = index.build(paths)
+    logger.info("Font index %s: %d fonts, %d scanned in %.1fs",
+                index.path, len(paths), scanned, time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
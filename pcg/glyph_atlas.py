@@ -0,0 +1,101 @@
+"""Glyph-atlas text rasteriser.
+
+Pillow's ``ImageDraw.text`` asks FreeType to rasterise every glyph of every
+string it draws.  Patron names share a small alphabet, so the atlas engine
+rasterises each glyph once per (font, size, sub-pixel phase) and then
+composites text by blitting those cached bitmaps at their advances.
+
+Horizontal positions are quantised to ``SUBPIXEL_STEPS`` phases per pixel.
+Pair kerning from the font's ``kern`` table is honoured (derived from
+``getlength`` of the pair), but there is no complex shaping: scripts that
+need ligatures or reordering (Arabic, Indic) should use the Pillow engine.
+"""
+
+import math
+import threading
+
+from PIL import Image, ImageDraw
+
+SUBPIXEL_STEPS = 4
+
+
+class GlyphAtlas:
+    """Cached glyph bitmaps, advances and kerning for one sized font."""
+
+    def __init__(self, font, subpixel_steps=SUBPIXEL_STEPS):
+        self.font = font
+        self.steps = max(1, int(subpixel_steps))
+        self._glyphs = {}     # (char, phase_idx) -> (mask or None, dx, dy)
+        self._advances = {}   # char -> advance width
+        self._kerning = {}    # (left, right) -> adjustment
+        self._lock = threading.Lock()
+        size = getattr(font, 'size', 16)
+        self._pad = int(size) + 2
+
+    def advance(self, ch):
+        adv = self._advances.get(ch)
+        if adv is None:
+            adv = self._advances[ch] = self.font.getlength(ch)
+        return adv
+
+    def kern(self, left, right):
+        pair = (left, right)
+        k = self._kerning.get(pair)
+        if k is None:
+            k = self.font.getlength(left + right) - self.advance(left) - self.advance(right)
+            self._kerning[pair] = k
+        return k
+
+    def measure(self, text):
+        """Advance width of *text*, matching the positions draw() uses."""
+        total = 0.0
+        prev = None
+        for ch in text:
+            if prev is not None:
+                total += self.kern(prev, ch)
+            total += self.advance(ch)
+            prev = ch
+        return total
+
+    def glyph(self, ch, phase_idx):
+        """Return (mask, dx, dy) for *ch* drawn at sub-pixel step *phase_idx*."""
+        key = (ch, phase_idx)
+        g = self._glyphs.get(key)
+        if g is None:
+            pad = self._pad
+            w = int(math.ceil(self.advance(ch))) + 2 * pad + 2
+            mask = Image.new('L', (w, 3 * pad), 0)
+            ImageDraw.Draw(mask).text((pad + phase_idx / self.steps, pad), ch,
+                                      font=self.font, fill=255)
+            bbox = mask.getbbox()
+            if bbox is None:
+                g = (None, 0, 0)
+            else:
+                g = (mask.crop(bbox), bbox[0] - pad, bbox[1] - pad)
+            with self._lock:
+                self._glyphs[key] = g
+        return g
+
+    def draw(self, draw, x, y, text, fill):
+        """Blit *text* with its origin at (x, y); returns the advance width."""
+        cx = float(x)
+        prev = None
+        iy = int(y)
+        for ch in text:
+            if prev is not None:
+                cx += self.kern(prev, ch)
+            ix = math.floor(cx)
+            phase_idx = int(round((cx - ix) * self.steps))
+            if phase_idx == self.steps:
+                ix += 1
+                phase_idx = 0
+            mask, dx, dy = self.glyph(ch, phase_idx)
+            if mask is not None:
+                draw.bitmap((ix + dx, iy + dy), mask, fill=fill)
+            cx += self.advance(ch)
+            prev = ch
+        return cx - x
+
+    def stats(self):
+        return {'glyphs': len(self._glyphs), 'advances': len(self._advances),
+                'kerning_pairs': len(self._kerning)}
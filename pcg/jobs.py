@@ -0,0 +1,604 @@
+"""Background render jobs.
+
+``/generate`` no longer renders inline: it hands the render parameters to a
+JobManager, which runs them on a bounded pool of worker threads.  Clients
+poll ``/api/jobs/<id>`` for status and the finished video.
+
+Jobs live in a small SQLite database in the app data directory (see
+``get_jobs_db_path()``), so the queue survives restarts: anything that was
+running when the process died is put back in the queue on startup.
+
+Identical requests are coalesced: a job is returned instead of created when
+the client repeats an ``Idempotency-Key`` it already used, or when a job
+with the same payload hash is still queued or running, so retries attach
+to the render already in progress.
+
+Each running job gets a RenderControl carrying its wall-clock timeout and
+the FFmpeg stall timeout; ``JobManager.cancel()`` trips it to stop a render
+mid-flight, or simply marks a still-queued job cancelled.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from .ffmpeg_runner import (
+    DEFAULT_STALL_TIMEOUT, RenderCancelled, RenderControl, RenderTimeout,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 1
+MAX_WORKERS = 16
+DEFAULT_HISTORY = 1000  # finished jobs kept in the database
+MAX_ATTEMPTS = 3        # give up on jobs that keep dying mid-render
+PROGRESS_HISTORY = 256  # finished jobs whose final progress event is kept
+DEFAULT_TIMEOUT = 3600  # seconds a single render may run (0 = unlimited)
+ERROR_BACKOFF = 5       # seconds a worker waits after a job-store error
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# Named priorities; higher runs first.  Interactive UI renders jump ahead
+# of scheduled/batch renders queued through the API.
+PRIORITIES = {
+    'batch': 0,
+    'normal': 50,
+    'interactive': 100,
+}
+DEFAULT_PRIORITY = 'interactive'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id        TEXT PRIMARY KEY,
+    status    TEXT NOT NULL,
+    priority  INTEGER NOT NULL DEFAULT 0,
+    params    TEXT NOT NULL,
+    result    TEXT,
+    error     TEXT,
+    attempts  INTEGER NOT NULL DEFAULT 0,
+    created   TEXT NOT NULL,
+    started   TEXT,
+    finished  TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created);
+"""
+
+# Columns added after the first release: (name, SQL type).  Missing ones
+# are added to existing databases with ALTER TABLE on startup.
+_COLUMNS = [
+    ('timeout', 'REAL'),
+    ('idempotency_key', 'TEXT'),
+    ('payload_hash', 'TEXT'),
+]
+_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS jobs_idempotency ON jobs (idempotency_key)',
+    'CREATE INDEX IF NOT EXISTS jobs_payload ON jobs (payload_hash, status)',
+]
+
+MAX_IDEMPOTENCY_KEY = 255
+
+
+class IdempotencyConflict(ValueError):
+    """An Idempotency-Key was reused with a different request payload."""
+
+
+def payload_hash(params):
+    """Stable hash of a render payload, used to spot duplicate requests.
+
+    Top-level string values naming an existing file also contribute the
+    file's size and mtime, so re-uploading a different logo or track under
+    the same name is not mistaken for a duplicate.
+    """
+    h = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode())
+    for key in sorted(params):
+        value = params[key]
+        if isinstance(value, str) and value and os.path.isfile(value):
+            st = os.stat(value)
+            h.update(f'\0{key}\0{st.st_size}\0{st.st_mtime_ns}'.encode())
+    return h.hexdigest()
+
+
+def resolve_priority(value):
+    """Map a priority name or number to its integer value."""
+    if value is None or value == '':
+        return PRIORITIES[DEFAULT_PRIORITY]
+    if isinstance(value, str) and value in PRIORITIES:
+        return PRIORITIES[value]
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid priority: {value!r}')
+
+
+class RenderJob:
+    """A single queued render request and its outcome."""
+
+    def __init__(self, id, status, priority, params, result=None, error=None,
+                 attempts=0, created=None, started=None, finished=None,
+                 timeout=None, idempotency_key=None, payload_hash=None):
+        self.id = id
+        self.status = status
+        self.priority = priority
+        self.params = params
+        self.result = result
+        self.error = error
+        self.attempts = attempts
+        self.created = created
+        self.started = started
+        self.finished = finished
+        self.timeout = timeout  # per-job wall-clock limit; None = manager default
+        self.idempotency_key = idempotency_key
+        self.payload_hash = payload_hash
+        self.deduplicated = False  # True when returned for a repeated request
+        self.progress = None   # live progress dict while running (not stored)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            id=row['id'],
+            status=row['status'],
+            priority=row['priority'],
+            params=json.loads(row['params']),
+            result=json.loads(row['result']) if row['result'] else None,
+            error=row['error'],
+            attempts=row['attempts'],
+            created=row['created'],
+            started=row['started'],
+            finished=row['finished'],
+            timeout=row['timeout'],
+            idempotency_key=row['idempotency_key'],
+            payload_hash=row['payload_hash'],
+        )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'priority': self.priority,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'timeout': self.timeout,
+            'idempotency_key': self.idempotency_key,
+            'result': self.result,
+            'error': self.error,
+            'progress': self.progress,
+            'status_url': f'/api/jobs/{self.id}',
+            'events_url': f'/api/jobs/{self.id}/events',
+        }
+
+
+class _Connection:
+    """Context manager that closes (not just commits) a sqlite3 connection."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self._conn
+
+    def __exit__(self, *exc):
+        self._conn.close()
+
+
+class JobStore:
+    """Durable job queue backed by SQLite.
+
+    Each call opens its own short-lived connection, so the store can be
+    shared freely between the Flask request threads and render workers.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            existing = {r['name'] for r in conn.execute('PRAGMA table_info(jobs)')}
+            for name, sql_type in _COLUMNS:
+                if name not in existing:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {name} {sql_type}')
+            for sql in _INDEXES:
+                conn.execute(sql)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return _Connection(conn)
+
+    def add(self, params, priority, timeout=None, idempotency_key=None):
+        """Insert a queued job, or return the existing one it duplicates.
+
+        Returns ``(job, created)``.  A job is reused when *idempotency_key*
+        matches a job that has not failed or been cancelled (raising
+        IdempotencyConflict if its payload differs), or when no key is
+        given and a job with the same payload hash is queued or running.
+        The lookup and insert share one transaction, so concurrent
+        duplicates - even from other processes - coalesce onto one job.
+        """
+        digest = payload_hash(params)
+        job = RenderJob(id=uuid.uuid4().hex, status=JOB_QUEUED,
+                        priority=priority, params=params,
+                        created=datetime.now().isoformat(), timeout=timeout,
+                        idempotency_key=idempotency_key, payload_hash=digest)
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if idempotency_key:
+                    row = conn.execute(
+                        'SELECT * FROM jobs WHERE idempotency_key = ? '
+                        'AND status IN (?, ?, ?) ORDER BY created DESC LIMIT 1',
+                        (idempotency_key, JOB_QUEUED, JOB_RUNNING, JOB_DONE)).fetchone()
+                    if row is not None and row['payload_hash'] != digest:
+                        raise IdempotencyConflict(
+                            'Idempotency-Key was already used with a different request')
+                else:
+                    row = conn.execute(
+                        'SELECT * FROM jobs WHERE payload_hash = ? AND status IN (?, ?) '
+                        'ORDER BY created LIMIT 1',
+                        (digest, JOB_QUEUED, JOB_RUNNING)).fetchone()
+                if row is None:
+                    conn.execute(
+                        'INSERT INTO jobs (id, status, priority, params, created, timeout,'
+                        ' idempotency_key, payload_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (job.id, job.status, job.priority, json.dumps(params),
+                         job.created, timeout, idempotency_key, digest))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        if row is not None:
+            return RenderJob.from_row(row), False
+        return job, True
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?',
+                               (job_id,)).fetchone()
+        return RenderJob.from_row(row) if row else None
+
+    def list(self, status=None, limit=200):
+        """Return jobs newest first, optionally filtered by status."""
+        sql = 'SELECT * FROM jobs'
+        args = []
+        if status:
+            sql += ' WHERE status = ?'
+            args.append(status)
+        sql += ' ORDER BY created DESC, rowid DESC LIMIT ?'
+        args.append(int(limit))
+        with self._connect() as conn:
+            rows = conn.execute(sql, args).fetchall()
+        return [RenderJob.from_row(r) for r in rows]
+
+    def counts(self):
+        """Return {status: count} for all jobs in the store."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT status, COUNT(*) AS n FROM jobs GROUP BY status').fetchall()
+        return {r['status']: r['n'] for r in rows}
+
+    def claim_next(self):
+        """Atomically move the best queued job to running and return it."""
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT id FROM jobs WHERE status = ? '
+                    'ORDER BY priority DESC, created, rowid LIMIT 1',
+                    (JOB_QUEUED,)).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                conn.execute(
+                    'UPDATE jobs SET status = ?, started = ?, attempts = attempts + 1 '
+                    'WHERE id = ?',
+                    (JOB_RUNNING, datetime.now().isoformat(), row['id']))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return self.get(row['id'])
+
+    def finish(self, job_id, result=None, error=None, status=None):
+        if status is None:
+            status = JOB_FAILED if error is not None else JOB_DONE
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? '
+                'WHERE id = ?',
+                (status, json.dumps(result) if result is not None else None,
+                 error, datetime.now().isoformat(), job_id))
+
+    def cancel_queued(self, job_id):
+        """Cancel *job_id* if it has not started yet; True on success."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished = ? '
+                'WHERE id = ? AND status = ?',
+                (JOB_CANCELLED, 'Cancelled', datetime.now().isoformat(),
+                 job_id, JOB_QUEUED))
+            return cur.rowcount > 0
+
+    def requeue_interrupted(self, max_attempts=MAX_ATTEMPTS):
+        """Re-queue jobs left running by a crash; fail ones that keep dying.
+
+        Returns the number of jobs put back in the queue.
+        """
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished = ? '
+                'WHERE status = ? AND attempts >= ?',
+                (JOB_FAILED, 'Render interrupted too many times', now,
+                 JOB_RUNNING, max_attempts))
+            cur = conn.execute(
+                'UPDATE jobs SET status = ?, started = NULL WHERE status = ?',
+                (JOB_QUEUED, JOB_RUNNING))
+            return cur.rowcount
+
+    def prune(self, keep=DEFAULT_HISTORY):
+        """Delete the oldest finished jobs beyond *keep*."""
+        marks = ', '.join('?' * len(FINISHED_STATUSES))
+        with self._connect() as conn:
+            conn.execute(
+                f'DELETE FROM jobs WHERE status IN ({marks}) AND id NOT IN ('
+                f' SELECT id FROM jobs WHERE status IN ({marks})'
+                ' ORDER BY finished DESC LIMIT ?)',
+                FINISHED_STATUSES + FINISHED_STATUSES + (int(keep),))
+
+
+class JobManager:
+    """Run render jobs from a JobStore on a fixed number of worker threads.
+
+    *runner* is called as ``runner(params, progress, control)`` on a worker
+    thread and must return a JSON-serialisable result dict; any exception
+    marks the job failed, RenderCancelled marks it cancelled.  ``progress``
+    is a callable taking a progress dict, which is kept in memory and pushed
+    to ``wait_progress()`` listeners.  ``control`` is the job's
+    RenderControl, which the runner passes down to the renderer.
+    Jobs beyond the pool size wait in the store, highest priority first.
+    """
+
+    def __init__(self, runner, store, workers=DEFAULT_WORKERS, history=DEFAULT_HISTORY,
+                 timeout=DEFAULT_TIMEOUT, stall_timeout=DEFAULT_STALL_TIMEOUT):
+        self._runner = runner
+        self.store = store
+        self.workers = max(1, min(MAX_WORKERS, int(workers)))
+        self._history = history
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self._controls = {}          # job_id -> RenderControl of running jobs
+        self._cancel_requested = set()
+        self._wakeup = threading.Condition()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._progress = OrderedDict()   # job_id -> latest progress dict
+        self._progress_seq = 0
+        self._progress_changed = threading.Condition()
+
+    def start(self):
+        """Re-queue interrupted jobs and spawn the worker threads (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return
+            requeued = self.store.requeue_interrupted()
+            if requeued:
+                logger.info("Re-queued %d render job(s) interrupted by a restart", requeued)
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f'render-worker-{i}',
+                                     daemon=True)
+                t.start()
+                self._threads.append(t)
+        logger.info("Render queue started with %d worker(s)", self.workers)
+
+    def submit(self, params, priority=None, timeout=None, idempotency_key=None):
+        """Queue a render and return its RenderJob immediately.
+
+        *timeout* overrides the manager's default wall-clock limit (seconds,
+        0 = unlimited) for this job only.  Repeated requests (same
+        *idempotency_key*, or an identical payload still in flight) return
+        the existing job with ``deduplicated`` set instead of queueing a
+        second render.
+        """
+        self.start()
+        if timeout is not None:
+            try:
+                timeout = float(timeout)
+            except (TypeError, ValueError):
+                raise ValueError(f'Invalid timeout: {timeout!r}')
+            if timeout < 0:
+                raise ValueError(f'Invalid timeout: {timeout!r}')
+        if idempotency_key is not None:
+            idempotency_key = str(idempotency_key).strip()
+            if len(idempotency_key) > MAX_IDEMPOTENCY_KEY:
+                raise ValueError('Idempotency key is too long')
+        job, created = self.store.add(params, resolve_priority(priority),
+                                      timeout=timeout,
+                                      idempotency_key=idempotency_key or None)
+        if not created:
+            job.deduplicated = True
+            job.progress = self._live_progress(job.id)
+            logger.info("Request matched render job %s (%s); not queueing a duplicate",
+                        job.id, job.status)
+            return job
+        self.store.prune(self._history)
+        with self._wakeup:
+            self._wakeup.notify()
+        logger.info("Queued render job %s (priority %d)", job.id, job.priority)
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job.
+
+        Queued jobs are marked cancelled straight away; a running job's
+        RenderControl is tripped and its worker stops FFmpeg and marks it
+        cancelled shortly after.  Returns the job, or None if unknown.
+        """
+        with self._lock:
+            if self.store.cancel_queued(job_id):
+                logger.info("Cancelled queued render job %s", job_id)
+                self._report(job_id, {'stage': 'finished'})
+                return self.get(job_id)
+            job = self.store.get(job_id)
+            if job is None or job.status != JOB_RUNNING:
+                return job
+            control = self._controls.get(job_id)
+            if control is not None:
+                control.cancel()
+            else:
+                # Claimed but not started yet; _work picks this up
+                self._cancel_requested.add(job_id)
+        logger.info("Cancelling running render job %s", job_id)
+        return self.get(job_id)
+
+    def get(self, job_id):
+        job = self.store.get(job_id)
+        if job is not None:
+            job.progress = self._live_progress(job_id)
+        return job
+
+    def list(self, status=None, limit=200):
+        """Return tracked jobs, newest first."""
+        jobs = self.store.list(status=status, limit=limit)
+        for job in jobs:
+            job.progress = self._live_progress(job.id)
+        return jobs
+
+    def _live_progress(self, job_id):
+        info = self._progress.get(job_id)
+        if info is None or info['stage'] == 'finished':
+            return None
+        return info
+
+    def _report(self, job_id, info):
+        with self._progress_changed:
+            self._progress_seq += 1
+            self._progress[job_id] = dict(info, seq=self._progress_seq,
+                                          updated=time.time())
+            self._progress.move_to_end(job_id)
+            finished = [k for k, v in self._progress.items()
+                        if v['stage'] == 'finished']
+            for k in finished[:max(0, len(finished) - PROGRESS_HISTORY)]:
+                del self._progress[k]
+            self._progress_changed.notify_all()
+
+    def wait_progress(self, job_id, after_seq=0, timeout=15):
+        """Block until *job_id* reports progress newer than *after_seq*.
+
+        Returns the latest progress dict, whose ``stage`` is ``'finished'``
+        once the job is done or failed.  Returns the current value (possibly
+        None, e.g. while still queued) if *timeout* seconds pass first.
+        """
+        deadline = time.monotonic() + timeout
+        with self._progress_changed:
+            while True:
+                info = self._progress.get(job_id)
+                if info is not None and info['seq'] > after_seq:
+                    return info
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return info
+                self._progress_changed.wait(remaining)
+
+    def _work(self):
+        while True:
+            try:
+                self._work_one()
+            except Exception:
+                # e.g. 'database is locked' or a full disk: keep the worker
+                logger.error("Render worker error; retrying in %ds",
+                             ERROR_BACKOFF, exc_info=True)
+                time.sleep(ERROR_BACKOFF)
+
+    def _finish(self, job_id, **kwargs):
+        """Record a failed or cancelled job, logging if the store fails too."""
+        try:
+            self.store.finish(job_id, **kwargs)
+        except Exception:
+            logger.error("Could not record the end of render job %s", job_id,
+                         exc_info=True)
+
+    def _work_one(self):
+        """Claim and run the next queued job, or wait for one."""
+        job = self.store.claim_next()
+        if job is None:
+            with self._wakeup:
+                self._wakeup.wait(timeout=5)
+            return
+        timeout = job.timeout if job.timeout is not None else self.timeout
+        control = RenderControl(timeout=timeout, stall_timeout=self.stall_timeout)
+        with self._lock:
+            self._controls[job.id] = control
+            if job.id in self._cancel_requested:
+                self._cancel_requested.discard(job.id)
+                control.cancel()
+        self._report(job.id, {'stage': 'starting', 'percent': 0})
+        try:
+            result = self._runner(
+                job.params, lambda info, _id=job.id: self._report(_id, info),
+                control)
+            self.store.finish(job.id, result=result)
+            logger.info("Render job %s finished", job.id)
+        except RenderCancelled:
+            self._finish(job.id, error='Cancelled', status=JOB_CANCELLED)
+            logger.info("Render job %s cancelled", job.id)
+        except RenderTimeout as e:
+            self._finish(job.id, error=str(e))
+            logger.error("Render job %s timed out: %s", job.id, e)
+        except Exception as e:
+            self._finish(job.id, error=str(e))
+            logger.error("Render job %s failed: %s", job.id, e, exc_info=True)
+        finally:
+            with self._lock:
+                self._controls.pop(job.id, None)
+            # Wakes SSE listeners so they read the final job state
+            self._report(job.id, {'stage': 'finished'})
+
+
+def load_job_settings():
+    """Return JobManager kwargs from generate_settings.json / environment.
+
+    Environment variables win over the saved settings so Docker
+    deployments can size the pool and limits:
+
+    ``RENDER_WORKERS`` / ``renderWorkers``             – worker threads
+    ``RENDER_TIMEOUT`` / ``renderTimeout``             – seconds per render
+    ``RENDER_STALL_TIMEOUT`` / ``renderStallTimeout``  – seconds without
+                                                          FFmpeg progress
+    """
+    from .path_utils import get_generate_settings_path
+    options = [
+        # (kwarg, settings key, env var, type)
+        ('workers', 'renderWorkers', 'RENDER_WORKERS', int),
+        ('timeout', 'renderTimeout', 'RENDER_TIMEOUT', float),
+        ('stall_timeout', 'renderStallTimeout', 'RENDER_STALL_TIMEOUT', float),
+    ]
+    result = {}
+    try:
+        with open(get_generate_settings_path()) as f:
+            settings = json.load(f)
+    except Exception:
+        settings = {}
+    for kwarg, key, env_name, cast in options:
+        try:
+            if settings.get(key) not in (None, ''):
+                result[kwarg] = cast(settings[key])
+        except (TypeError, ValueError):
+            pass
+        env = os.environ.get(env_name)
+        if env:
+            try:
+                result[kwarg] = cast(env)
+            except ValueError:
+                logger.warning("Ignoring invalid %s=%r", env_name, env)
+    return result
@@ -4,6 +4,8 @@ Usage:
     PatreonCredits                  # Normal desktop mode (native window)
     PatreonCredits --headless       # API/server-only mode (no window)
     PatreonCredits --headless -p 8080  # Server on a custom port
+    PatreonCredits --worker --coordinator http://host:8787
+                                    # Render node for a coordinator server
 """
 
 import argparse
@@ -34,13 +36,41 @@ def wait_for_server(port, timeout=15):
     return False
 
 
+def attach_console(title):
+    """Give a console-less Windows build a console window titled *title*.
+
+    GUI apps (console=False) on Windows have no console attached, and
+    cmd.exe won't wait for them.  Allocate a dedicated console window so
+    the output is visible and the window stays open.
+    """
+    if sys.platform != 'win32':
+        return
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        kernel32.AllocConsole()
+        sys.stdout = open('CONOUT$', 'w')
+        sys.stderr = open('CONOUT$', 'w')
+        kernel32.SetConsoleTitleW(title)
+    except Exception:
+        pass
+
+
 def main():
     parser = argparse.ArgumentParser(description='Patreon Credits Generator')
     parser.add_argument('--headless', action='store_true',
                         help='Run as API server only (no GUI window)')
     parser.add_argument('-p', '--port', type=int, default=8787,
                         help='Port to listen on (default: 8787)')
+    parser.add_argument('--worker', action='store_true',
+                        help='Run as a render node for the server given by --coordinator')
+    parser.add_argument('--coordinator', metavar='URL',
+                        help='Coordinator server URL for --worker')
+    parser.add_argument('--name',
+                        help='Worker name shown by the coordinator (default: host-pid)')
     args = parser.parse_args()
+    if args.worker and not args.coordinator:
+        parser.error('--worker requires --coordinator URL')
 
     # Initialize logging (console + rotating file)
     from .logging_config import setup_logging, load_log_settings
@@ -60,25 +90,32 @@ def main():
         except Exception:
             pass
 
-    if args.headless:
-        # GUI apps (console=False) on Windows have no console attached, and
-        # cmd.exe won't wait for them.  Allocate a dedicated console window
-        # so the server output is visible and the window stays open.
-        if sys.platform == 'win32':
-            try:
-                import ctypes
-                kernel32 = ctypes.windll.kernel32
-                kernel32.AllocConsole()
-                sys.stdout = open('CONOUT$', 'w')
-                sys.stderr = open('CONOUT$', 'w')
-                # Set the console window title
-                kernel32.SetConsoleTitleW('Patreon Credits Generator — Server')
-            except Exception:
-                pass
-
+    if args.worker:
+        attach_console('Patreon Credits Generator — Worker')
+        from dotenv import load_dotenv
+        from .path_utils import get_env_path
+        load_dotenv(get_env_path())
+        token = os.environ.get('CLUSTER_TOKEN')
+        if not token:
+            parser.error('--worker requires CLUSTER_TOKEN, set to the coordinator\'s token')
+        from .cluster import Worker
+        worker = Worker(args.coordinator, name=args.name, token=token)
+        print('')
+        print('  Patreon Credits Generator — render worker')
+        print('  =========================================')
+        print(f'  Coordinator: {args.coordinator}')
+        print('  Press Ctrl+C to stop.')
+        print('')
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            worker.stop()
+    elif args.headless:
+        attach_console('Patreon Credits Generator — Server')
         port = args.port
         host = os.environ.get('FLASK_HOST', '127.0.0.1')
-        from .app import app
+        from .app import app, start_job_workers
+        start_job_workers()
         print('')
         print('  Patreon Credits Generator — headless mode')
         print('  ==========================================')
@@ -91,7 +128,8 @@ def main():
         port = args.port
 
         def run_flask():
-            from pcg.app import app
+            from pcg.app import app, start_job_workers
+            start_job_workers()
             app.run(host='127.0.0.1', port=port, debug=False, use_reloader=False)
 
         server_thread = threading.Thread(target=run_flask, daemon=True)
@@ -180,6 +180,21 @@ def get_youtube_token_path():
     return os.path.join(get_app_dir(), 'youtube_tokens.json')
 
 
+def get_jobs_db_path():
+    return os.path.join(get_app_dir(), 'jobs.db')
+
+
+def get_encoder_profiles_path():
+    return os.path.join(get_app_dir(), 'encoder_profiles.json')
+
+
+def get_cache_dir():
+    """Root for render caches (each cache uses its own subdirectory)."""
+    d = os.path.join(get_app_dir(), 'cache')
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
 # ---- FFmpeg resolution ----
 
 def get_ffmpeg_dir():
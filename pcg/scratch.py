@@ -0,0 +1,158 @@
+"""Scratch files for the intermediate images of a render.
+
+A render hands FFmpeg its header, plates, strip tiles and concat list as
+files.  They used to be ``tempfile.NamedTemporaryFile`` PNGs in the system
+temp directory, written with default zlib compression, and each caller
+kept its own list of paths to delete.  On small container disks and
+network mounts that write-then-read-back I/O is a visible share of a
+render.
+
+A Scratch collects every intermediate file of one render.  In 'memory'
+mode (the default) files go to RAM-backed storage (``/dev/shm``) while
+they fit in a byte budget, and to the disk temp directory after that, so
+a very long strip never fills the tmpfs; 'disk' mode always uses the temp
+directory.  PNGs are written with fast compression either way.  ``cleanup()``
+(or leaving the ``with`` block) removes everything the render created,
+whether it finished, failed or was cancelled.
+
+FFmpeg reads the tiles through the concat demuxer, which opens each file
+by name, so the layers stay files rather than pipes; the NumPy compositor
+already streams finished frames through FFmpeg's stdin.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from .cache import link_or_copy
+
+logger = logging.getLogger(__name__)
+
+SCRATCH_MODES = ('memory', 'disk')
+DEFAULT_SCRATCH_MODE = 'memory'
+DEFAULT_SCRATCH_MEMORY_MB = 512
+MEMORY_DIRS = ('/dev/shm',)
+# Free RAM-backed space left for everything else on the machine
+MEMORY_HEADROOM = 64 * 1024 * 1024
+# zlib level for intermediate PNGs: most of the size win of the default
+# level 6 at a fraction of its time
+PNG_COMPRESS_LEVEL = 1
+
+
+def memory_dir():
+    """A writable RAM-backed directory, or None on systems without one."""
+    for d in MEMORY_DIRS:
+        if os.path.isdir(d) and os.access(d, os.W_OK | os.X_OK):
+            return d
+    return None
+
+
+def _free_bytes(path):
+    try:
+        st = os.statvfs(path)
+    except (AttributeError, OSError):
+        return 0
+    return st.f_bavail * st.f_frsize
+
+
+def load_scratch_settings():
+    """Return {'mode', 'memory_bytes'}.
+
+    ``RENDER_SCRATCH`` ('memory' or 'disk') and ``RENDER_SCRATCH_MEMORY_MB``
+    in the environment win over ``scratch`` / ``scratchMemoryMb`` in
+    generate_settings.json.
+    """
+    from .path_utils import get_generate_settings_path
+    mode, memory_mb = '', ''
+    try:
+        with open(get_generate_settings_path()) as f:
+            settings = json.load(f)
+        mode = str(settings.get('scratch') or '').lower()
+        memory_mb = str(settings.get('scratchMemoryMb') or '')
+    except Exception:
+        pass
+    mode = os.environ.get('RENDER_SCRATCH', '').strip().lower() or mode
+    memory_mb = os.environ.get('RENDER_SCRATCH_MEMORY_MB', '').strip() or memory_mb
+    if mode and mode not in SCRATCH_MODES:
+        logger.warning("Unknown scratch mode %r; using %s", mode, DEFAULT_SCRATCH_MODE)
+        mode = ''
+    try:
+        memory = float(memory_mb) if memory_mb else DEFAULT_SCRATCH_MEMORY_MB
+    except ValueError:
+        logger.warning("Ignoring invalid scratch memory limit %r", memory_mb)
+        memory = DEFAULT_SCRATCH_MEMORY_MB
+    return {'mode': mode or DEFAULT_SCRATCH_MODE,
+            'memory_bytes': int(max(0.0, memory) * 1024 * 1024)}
+
+
+class Scratch:
+    """The intermediate files of one render, removed together."""
+
+    def __init__(self, mode=DEFAULT_SCRATCH_MODE,
+                 memory_bytes=DEFAULT_SCRATCH_MEMORY_MB * 1024 * 1024):
+        self.memory_dir = memory_dir() if mode == 'memory' else None
+        self.memory_bytes = memory_bytes
+        self.paths = []
+        self._in_memory = 0
+        self._lock = threading.Lock()
+
+    def _directory(self, size):
+        if self.memory_dir is None or self._in_memory + size > self.memory_bytes:
+            return None
+        if _free_bytes(self.memory_dir) < size + MEMORY_HEADROOM:
+            return None
+        self._in_memory += size
+        return self.memory_dir
+
+    def path(self, suffix='', size=0):
+        """Create an empty scratch file and return its path.
+
+        *size* is an upper bound on the bytes that will be written; the
+        file goes to RAM-backed storage only if that still fits.
+        """
+        with self._lock:
+            directory = self._directory(size)
+            fd, path = tempfile.mkstemp(suffix=suffix, prefix='pcg-', dir=directory)
+            self.paths.append(path)
+        os.close(fd)
+        return path
+
+    def save_png(self, img):
+        """Write *img* to a new scratch PNG and return its path."""
+        bands = len(img.getbands())
+        path = self.path('.png', size=img.width * img.height * bands)
+        img.save(path, compress_level=PNG_COMPRESS_LEVEL)
+        return path
+
+    def link(self, src):
+        """Hard-link (or copy) file *src* into the scratch; returns the new path.
+
+        Cached layers are handed to FFmpeg through such a link, so a cache
+        eviction or purge by another render cannot delete a file this
+        render still reads.
+        """
+        path = self.path(os.path.splitext(src)[1], size=os.path.getsize(src))
+        os.unlink(path)
+        link_or_copy(src, path)
+        return path
+
+    def cleanup(self):
+        """Delete every file created so far."""
+        with self._lock:
+            paths, self.paths = self.paths, []
+            self._in_memory = 0
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Could not remove scratch file %s: %s", path, e)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
@@ -0,0 +1,87 @@
+"""Patron strips as layout, rasterised one region at a time.
+
+A roster used to be drawn into a single ``width x total_height`` image.  At
+4K with word wrap and tens of thousands of names that is gigabytes of RGBA
+and trips Pillow's image size limits.  A PatronStrip instead records what
+to draw: segments of drawing ops (one per names block) and small
+pre-rendered images (tier labels) stacked vertically.  ``region(y0, y1)``
+describes just the rows in that range, so the renderer can produce the
+strip as fixed-height tiles (or parallel bands) and peak memory depends on
+the tile size, not the roster size.
+
+Every segment is clipped to its own rows, as when each block was rendered
+into its own image and pasted, and each region replays, in order, every op
+whose glyphs can reach into it, so any split produces the same pixels as
+drawing the whole strip at once.
+"""
+
+from bisect import bisect_left, bisect_right
+
+
+def _op_y(op):
+    return op[3] if op[0] == 'text' else op[1][0][1]
+
+
+def _shift_op(op, dy):
+    if op[0] == 'text':
+        return ('text', op[1], op[2], op[3] + dy)
+    return ('line', [(x, y + dy) for x, y in op[1]], op[2], op[3])
+
+
+class PatronStrip:
+    """Vertical stack of op segments and image segments."""
+
+    def __init__(self, width, mode, background):
+        self.width = width
+        self.mode = mode
+        self.background = background
+        self.height = 0
+        self.names = 0          # patron count, for choosing serial vs parallel
+        self._segments = []     # (top, bottom, image or None, op data or None)
+
+    def add_image(self, img):
+        """Append a pre-rendered image (e.g. a tier label)."""
+        self._segments.append((self.height, self.height + img.height, img, None))
+        self.height += img.height
+
+    def add_ops(self, height, ops, style, names=0):
+        """Append a block *height* rows tall drawn by *ops*.
+
+        Ops are ``('text', text, x, y)`` or ``('line', points, colour,
+        width)`` in block coordinates; *style* is the (font_path, size,
+        fill, bold) the text is drawn with.
+        """
+        ys = [_op_y(op) for op in ops]
+        order = sorted(range(len(ops)), key=ys.__getitem__)
+        # Glyphs may reach this far above/below their origin (accents, descenders)
+        reach = 3 * style[1] + max((op[3] for op in ops if op[0] == 'line'), default=0)
+        data = (ops, style, order, [ys[i] for i in order], reach)
+        self._segments.append((self.height, self.height + height, None, data))
+        self.height += height
+        self.names += names
+
+    def add_space(self, height):
+        """Append *height* rows of plain background."""
+        self.height += height
+
+    def region(self, y0, y1):
+        """Describe strip rows [y0, y1).
+
+        Returns ``(parts, images)``: *parts* are ``(top, bottom, ops,
+        font_path, size, fill, bold)`` with ops shifted so that row 0 is
+        region row *top*; *images* are ``(top, image)`` crops to paste.
+        """
+        parts = []
+        images = []
+        for top, bottom, img, data in self._segments:
+            a, b = max(top, y0), min(bottom, y1)
+            if a >= b:
+                continue
+            if img is not None:
+                images.append((a - y0, img.crop((0, a - top, img.width, b - top))))
+                continue
+            ops, style, order, ys, reach = data
+            lo, hi = a - top, b - top
+            picked = sorted(order[bisect_left(ys, lo - reach):bisect_right(ys, hi + reach)])
+            parts.append((a - y0, b - y0, [_shift_op(ops[i], -lo) for i in picked]) + style)
+        return parts, images
@@ -15,6 +15,7 @@
 
     var lastVideoFilename = null;
     var lastVideoUrl = null;
+    var lastVideoAlpha = false;
     var videoListEl = document.getElementById("videoList");
     var videoListEmpty = document.getElementById("videoListEmpty");
     var videoCountEl = document.getElementById("videoCount");
@@ -57,7 +58,7 @@
 
     // ---- Collect form values ----
     function getFormData() {
-        return {
+        var data = {
             message: document.getElementById("message").value.trim(),
             custom_names: (document.getElementById("customNames") || {}).value || "",
             duration: parseInt(document.getElementById("duration").value, 10),
@@ -83,9 +84,89 @@
                 bold: document.getElementById("patronBold").checked
             }
         };
+        // Transparent overlay profiles skip the background entirely
+        var outputMode = document.getElementById("outputMode").value;
+        if (outputMode) data.encoder = outputMode;
+        return data;
     }
 
     // ---- Generate video ----
+    // Status line for a render progress event.
+    function describeProgress(p) {
+        if (!p || p.stage === "queued") return "Waiting for a render slot...";
+        if (p.stage === "encoding" && p.percent != null) {
+            var text = "Encoding... " + Math.round(p.percent) + "%";
+            if (p.fps) text += " (" + Math.round(p.fps) + " fps";
+            if (p.fps && p.eta != null) text += ", " + Math.ceil(p.eta) + "s left";
+            if (p.fps) text += ")";
+            return text;
+        }
+        if (p.stage === "rasterising") return "Drawing names...";
+        return "Generating credits video...";
+    }
+
+    // Follow a queued render job via its SSE stream (polling as fallback);
+    // resolves with its result or {error}.
+    function waitForJob(statusUrl) {
+        return new Promise(function (resolve, reject) {
+            function settle(state) {
+                if (state.status === "done") resolve(state.result);
+                else if (state.status === "cancelled") resolve({ error: "Render cancelled" });
+                else resolve({ error: state.error || "Render failed" });
+            }
+
+            function poll() {
+                fetch(statusUrl)
+                    .then(function (r) { return r.json(); })
+                    .then(function (job) {
+                        if (["done", "failed", "cancelled"].indexOf(job.status) !== -1) return settle(job);
+                        if (job.error) return resolve({ error: job.error });
+                        showStatus(describeProgress(job.progress || { stage: job.status }), "info");
+                        setTimeout(poll, 1000);
+                    })
+                    .catch(reject);
+            }
+
+            if (!window.EventSource) return poll();
+            var source = new EventSource(statusUrl + "/events");
+            var finished = false;
+            source.addEventListener("progress", function (e) {
+                showStatus(describeProgress(JSON.parse(e.data)), "info");
+            });
+            ["done", "failed", "cancelled"].forEach(function (name) {
+                source.addEventListener(name, function (e) {
+                    finished = true;
+                    source.close();
+                    settle(JSON.parse(e.data));
+                });
+            });
+            source.onerror = function () {
+                if (finished) return;
+                source.close();
+                poll();
+            };
+        });
+    }
+
+    function newIdempotencyKey() {
+        if (window.crypto && window.crypto.randomUUID) return window.crypto.randomUUID();
+        return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2);
+    }
+
+    // POST /generate, retrying network failures with the same idempotency
+    // key so a retry attaches to the job the first attempt may have queued.
+    function postGenerate(data, key, attempts) {
+        return fetch(API_BASE + "/generate", {
+            method: "POST",
+            headers: { "Content-Type": "application/json", "Idempotency-Key": key },
+            body: JSON.stringify(data)
+        }).catch(function (err) {
+            if (attempts <= 1) throw err;
+            return new Promise(function (r) { setTimeout(r, 1000); })
+                .then(function () { return postGenerate(data, key, attempts - 1); });
+        });
+    }
+
     generateBtn.addEventListener("click", function () {
         var data = getFormData();
         if (!data.message) {
@@ -97,12 +178,12 @@
         addTimelineBtn.style.display = "none";
         showStatus("Generating credits video...", "info");
 
-        fetch(API_BASE + "/generate", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify(data)
-        })
+        postGenerate(data, newIdempotencyKey(), 3)
         .then(function (r) { return r.json(); })
+        .then(function (queued) {
+            if (queued.error) return queued;
+            return waitForJob(API_BASE + queued.status_url);
+        })
         .then(function (result) {
             if (result.error) {
                 showStatus("Error: " + result.error, "error");
@@ -111,6 +192,7 @@
             }
             lastVideoFilename = result.filename;
             lastVideoUrl = API_BASE + result.video_url;
+            lastVideoAlpha = !!(result.encode && result.encode.encoder && result.encode.encoder.alpha);
             showStatus("Video generated! " + result.patron_count + " patrons.", "success");
             addTimelineBtn.style.display = "block";
             generateBtn.disabled = false;
@@ -173,7 +255,7 @@
 
             // Now tell Premiere to import and add to timeline
             var escaped = destPath.replace(/\\/g, "\\\\");
-            csInterface.evalScript('importAndAddToTimeline("' + escaped + '")', function (result) {
+            csInterface.evalScript('importAndAddToTimeline("' + escaped + '", ' + lastVideoAlpha + ')', function (result) {
                 if (result.indexOf("ERROR:") === 0) {
                     showStatus(result, "error");
                 } else {
@@ -275,10 +357,10 @@
                     row.innerHTML =
                         '<div class="video-item-info">' +
                             '<span class="video-item-name" title="' + v.filename + '">' + v.filename + '</span>' +
-                            '<span class="video-item-meta">' + formatDate(v.created) + ' · ' + formatBytes(v.size) + '</span>' +
+                            '<span class="video-item-meta">' + formatDate(v.created) + ' · ' + formatBytes(v.size) + (v.alpha ? ' · overlay' : '') + '</span>' +
                         '</div>' +
                         '<div class="video-item-actions">' +
-                            '<button class="btn-icon btn-import" title="Import to timeline" data-filename="' + v.filename + '">&#9654;</button>' +
+                            '<button class="btn-icon btn-import" title="Import to timeline" data-filename="' + v.filename + '" data-alpha="' + (v.alpha ? 1 : 0) + '">&#9654;</button>' +
                             '<button class="btn-icon btn-delete" title="Delete" data-filename="' + v.filename + '">&#10005;</button>' +
                         '</div>';
                     videoListEl.appendChild(row);
@@ -299,6 +381,7 @@
                 // Import this video to timeline
                 lastVideoFilename = filename;
                 lastVideoUrl = API_BASE + "/output/" + filename;
+                lastVideoAlpha = btn.dataset.alpha === "1";
                 addTimelineBtn.style.display = "block";
                 showStatus("Selected: " + filename + " — click Import & Add to Timeline.", "info");
             } else if (btn.classList.contains("btn-delete")) {
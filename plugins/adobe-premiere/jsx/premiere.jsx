@@ -22,12 +22,44 @@ function importVideo(filePath) {
     }
 }
 
+/**
+ * True when no clip on *track* overlaps [start, end) seconds.
+ */
+function trackIsFree(track, start, end) {
+    for (var i = 0; i < track.clips.numItems; i++) {
+        var clip = track.clips[i];
+        if (clip.start.seconds < end && clip.end.seconds > start) return false;
+    }
+    return true;
+}
+
+/**
+ * The lowest video track above the first that is empty from *start* for
+ * *duration* seconds, adding a track when every one is in use.
+ * Returns null if no track could be found or added.
+ */
+function findOverlayTrack(seq, start, duration) {
+    for (var t = 1; t < seq.videoTracks.numTracks; t++) {
+        if (trackIsFree(seq.videoTracks[t], start, start + duration)) return seq.videoTracks[t];
+    }
+    try {
+        // Adding tracks is only exposed through the QE DOM
+        app.enableQE();
+        qe.project.getActiveSequence().addTracks(1, seq.videoTracks.numTracks, 0);
+        return seq.videoTracks[seq.videoTracks.numTracks - 1];
+    } catch (e) {
+        return null;
+    }
+}
+
 /**
  * Import a video file and insert it at the end of the active sequence.
  * Creates a new sequence if none exists.
+ * A transparent *overlay* goes on a free track above the footage at the
+ * playhead instead, so it plays over the picture without keying.
  * Returns a status message.
  */
-function importAndAddToTimeline(filePath) {
+function importAndAddToTimeline(filePath, overlay) {
     try {
         var proj = app.project;
         if (!proj) return "ERROR: No project open.";
@@ -64,6 +96,19 @@ function importAndAddToTimeline(filePath) {
             return "OK: Created new sequence with credits video.";
         }
 
+        if (overlay) {
+            var start = seq.getPlayerPosition();
+            // Credits are at most a minute long
+            var duration = 60;
+            try {
+                duration = importedItem.getOutPoint().seconds - importedItem.getInPoint().seconds;
+            } catch (e) {}
+            var overlayTrack = findOverlayTrack(seq, start.seconds, duration);
+            if (!overlayTrack) return "ERROR: No free video track above the footage; add one and try again.";
+            overlayTrack.overwriteClip(importedItem, start.seconds);
+            return "OK: Added credits overlay at the playhead.";
+        }
+
         // Insert at the end of video track 0
         var videoTrack = seq.videoTracks[0];
         if (!videoTrack) return "ERROR: No video tracks in sequence.";
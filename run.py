@@ -1,4 +1,9 @@
 """Entry point — delegates to pcg.launcher.main()."""
+import multiprocessing
+
 from pcg.launcher import main
 
-main()
+if __name__ == '__main__':
+    # Frozen builds re-enter here in raster pool workers
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,171 @@
+"""Benchmark render paths on synthetic rosters.
+
+Renders the same credits with each compositor ('ffmpeg' overlay filter
+graph, 'numpy' frames piped to FFmpeg) and reports how long rasterising
+and encoding took and the encode frame rate, so the faster one can be
+picked for a given roster size and resolution::
+
+    python scripts/benchmark_render.py --names 500 5000 --resolution 1920x1080
+
+Background images, gradients, logos and QR codes are still layers that
+FFmpeg has to decode and composite too; add them with --bg-image,
+--gradient, --logo and --qr to measure their share of the encode.
+--segments compares single and segmented parallel encodes, --encoder
+encoder profiles (speed against file size).  --outputs renders every
+--resolution and --encoder combination once one by one and once as a
+single multi-output render, and compares their wall and CPU time.  Run
+the script on two checkouts to compare encode fps before and after a
+change.
+
+Caches are bypassed and the rendered videos are deleted unless --keep is
+given.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pcg.encoders import DEFAULT_ENCODER, sidecar_path  # noqa: E402
+from pcg.ffmpeg_renderer import COMPOSITORS, VideoRenderer  # noqa: E402
+
+
+def render_once(renderer, names, resolution, args, **options):
+    """Render once; returns (rasterise seconds, encode seconds, frames, bytes)."""
+    marks = {}
+
+    def progress(info):
+        if info.get('stage') in ('encoding', 'joining') and 'encoding' not in marks:
+            marks['encoding'] = time.monotonic()
+
+    patrons = [f'Patron {i:05d} {args.suffix}'.strip() for i in range(names)]
+    started = time.monotonic()
+    output = renderer.render_video(
+        'Thank you to our patrons', patrons, duration=args.duration,
+        resolution=resolution, fps=args.fps, use_cache=False,
+        fade_in=1, fade_out=1, progress_callback=progress, **options)
+    finished = time.monotonic()
+    path = os.path.join(renderer.output_dir, output)
+    size = os.path.getsize(path)
+    if not args.keep:
+        os.unlink(path)
+        if os.path.exists(sidecar_path(path)):
+            os.unlink(sidecar_path(path))
+    encoding = marks.get('encoding', started)
+    return encoding - started, finished - encoding, int(args.duration * args.fps), size
+
+
+def _cpu_seconds():
+    """CPU time of this process and its finished FFmpeg children (the
+    children are not counted on Windows)."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def compare_outputs(renderer, names, args, **options):
+    """Render every resolution/encoder pair one by one, then as one
+    multi-output render; returns {mode: (wall seconds, CPU seconds)}."""
+    outputs = [{'resolution': r, 'encoder': e}
+               for r in args.resolution for e in args.encoder]
+    patrons = [f'Patron {i:05d} {args.suffix}'.strip() for i in range(names)]
+    common = dict(duration=args.duration, fps=args.fps, use_cache=False,
+                  fade_in=1, fade_out=1, **options)
+    timings, produced = {}, []
+    for mode in ('sequential', 'multi'):
+        started, cpu = time.monotonic(), _cpu_seconds()
+        if mode == 'sequential':
+            produced += [renderer.render_video('Thank you to our patrons', patrons,
+                                               resolution=o['resolution'],
+                                               encoder=o['encoder'], **common)
+                         for o in outputs]
+        else:
+            produced += renderer.render_outputs(
+                outputs, message='Thank you to our patrons', patrons=patrons, **common)
+        timings[mode] = (time.monotonic() - started, _cpu_seconds() - cpu)
+    if not args.keep:
+        for name in produced:
+            path = os.path.join(renderer.output_dir, name)
+            for leftover in (path, sidecar_path(path)):
+                if os.path.exists(leftover):
+                    os.unlink(leftover)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--names', type=int, nargs='+', default=[500, 5000],
+                        help='roster sizes to render (default: 500 5000)')
+    parser.add_argument('--resolution', nargs='+', default=['1920x1080'],
+                        help='resolutions to render (default: 1920x1080)')
+    parser.add_argument('--compositor', nargs='+', default=list(COMPOSITORS),
+                        choices=COMPOSITORS, help='compositors to compare')
+    parser.add_argument('--segments', type=int, nargs='+', default=[1],
+                        help='parallel encode segment counts to compare (default: 1)')
+    parser.add_argument('--encoder', nargs='+', default=[DEFAULT_ENCODER],
+                        help=f'encoder profiles to compare (default: {DEFAULT_ENCODER})')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--bg-image', help='background image (default: solid colour)')
+    parser.add_argument('--gradient', action='store_true',
+                        help='use a gradient background instead of a solid colour')
+    parser.add_argument('--logo', help='logo image to overlay')
+    parser.add_argument('--qr', help='QR code image to overlay')
+    parser.add_argument('--suffix', default='',
+                        help='text appended to every synthetic name')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='renders per combination; the fastest is reported')
+    parser.add_argument('--outputs', action='store_true',
+                        help='compare sequential renders of every resolution/encoder '
+                             'pair with one multi-output render')
+    parser.add_argument('--keep', action='store_true', help='keep the rendered videos')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    renderer = VideoRenderer()
+    options = {}
+    if args.bg_image:
+        options['bg_image'] = args.bg_image
+    elif args.gradient:
+        options['bg_gradient'] = {'color1': '#10243a', 'color2': '#3a1024'}
+    if args.logo:
+        options['logo_file'] = args.logo
+    if args.qr:
+        options['qr_image'] = args.qr
+
+    if args.outputs:
+        header = f"{'names':>8}{'outputs':>9}{'mode':>12}{'wall s':>9}{'cpu s':>9}"
+        print(header)
+        print('-' * len(header))
+        count = len(args.resolution) * len(args.encoder)
+        for names in args.names:
+            timings = compare_outputs(renderer, names, args, **options)
+            for mode, (wall, cpu) in timings.items():
+                print(f'{names:>8}{count:>9}{mode:>12}{wall:>9.2f}{cpu:>9.2f}', flush=True)
+        return
+
+    header = f"{'compositor':<11}{'encoder':<12}{'names':>8}{'resolution':>12}" \
+             f"{'segments':>10}{'raster s':>10}{'encode s':>10}{'enc fps':>9}" \
+             f"{'total s':>9}{'size MB':>9}"
+    print(header)
+    print('-' * len(header))
+    for resolution in args.resolution:
+        for names in args.names:
+            for compositor in args.compositor:
+                for encoder in args.encoder:
+                    for segments in args.segments:
+                        runs = [render_once(renderer, names, resolution, args,
+                                            compositor=compositor, segments=segments,
+                                            encoder=encoder, **options)
+                                for _ in range(max(1, args.repeat))]
+                        raster, encode, frames, size = min(runs, key=lambda r: r[0] + r[1])
+                        print(f'{compositor:<11}{encoder:<12}{names:>8}{resolution:>12}'
+                              f'{segments:>10}{raster:>10.2f}{encode:>10.2f}'
+                              f'{frames / encode:>9.1f}{raster + encode:>9.2f}'
+                              f'{size / 1e6:>9.2f}', flush=True)
+
+
+if __name__ == '__main__':
+    main()
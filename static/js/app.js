@@ -76,6 +76,11 @@
     { id: 'duration', type: 'value' },
     { id: 'resolution', type: 'value' },
     { id: 'fps', type: 'value' },
+    { id: 'encoder', type: 'value' },
+    { id: 'extraOutput720', type: 'checked' },
+    { id: 'extraOutput1080', type: 'checked' },
+    { id: 'extraOutput2160', type: 'checked' },
+    { id: 'extraOutputVertical', type: 'checked' },
     { id: 'columns', type: 'value' },
     { id: 'nameAlign', type: 'value' },
     { id: 'truncateLength', type: 'value' },
@@ -117,6 +122,18 @@
     { id: 'logLevel', type: 'value' },
     { id: 'logMaxSize', type: 'value' },
     { id: 'logBackupCount', type: 'value' },
+    // Rendering settings
+    { id: 'renderWorkers', type: 'value' },
+    { id: 'renderTimeout', type: 'value' },
+    { id: 'renderStallTimeout', type: 'value' },
+    { id: 'textEngine', type: 'value' },
+    { id: 'compositor', type: 'value' },
+    { id: 'rasterWorkers', type: 'value' },
+    { id: 'renderSegments', type: 'value' },
+    { id: 'scratch', type: 'value' },
+    { id: 'scratchMemoryMb', type: 'value' },
+    { id: 'renderCache', type: 'checked' },
+    { id: 'renderCacheMaxMb', type: 'value' },
   ];
 
   function _collectSettings() {
@@ -197,6 +214,39 @@
   }
 
   // ---- FFmpeg helpers ----
+  // Replace the built-in encoder list with the server's profiles (custom
+  // ones included, ones this FFmpeg lacks disabled) and describe the choice.
+  function loadEncoderProfiles() {
+    var select = document.getElementById('encoder');
+    var help = document.getElementById('encoderHelp');
+    if (!select) return;
+    var profiles = {};
+    function describe() {
+      var p = profiles[select.value];
+      if (help && p) help.textContent = p.description || '';
+    }
+    select.addEventListener('change', describe);
+    fetch('/api/encoders')
+      .then(function (r) { return r.json(); })
+      .then(function (data) {
+        var saved = {};
+        try { saved = JSON.parse(localStorage.getItem(STORAGE_KEY)) || {}; } catch (_) {}
+        var current = saved.encoder || select.value;
+        select.innerHTML = '';
+        data.profiles.forEach(function (p) {
+          profiles[p.name] = p;
+          var opt = document.createElement('option');
+          opt.value = p.name;
+          opt.textContent = p.available ? p.label : p.label + ' (not in this FFmpeg)';
+          opt.disabled = !p.available;
+          select.appendChild(opt);
+        });
+        select.value = profiles[current] && profiles[current].available ? current : data.default;
+        describe();
+      })
+      .catch(function () { /* keep the built-in list */ });
+  }
+
   function checkFFmpeg() {
     var ffmpegStatus = document.getElementById('ffmpegStatus');
     var installBtn = document.getElementById('installFfmpegBtn');
@@ -281,6 +331,82 @@
     if (sec) sec.classList.add('d-none');
   }
 
+  // Human-readable status line for a render progress event.
+  function describeProgress(p) {
+    if (!p || p.stage === 'queued') return 'Waiting for a render slot...';
+    if (p.stage === 'encoding' && p.percent != null) {
+      var text = 'Encoding video... ' + Math.round(p.percent) + '%';
+      if (p.fps) text += ' \u00b7 ' + Math.round(p.fps) + ' fps';
+      if (p.eta != null) text += ' \u00b7 ' + Math.ceil(p.eta) + 's left';
+      return text;
+    }
+    if (p.stage === 'rasterising') return 'Drawing names...';
+    if (p.stage === 'joining') return 'Joining segments...';
+    return 'Generating credits video...';
+  }
+
+  // Follow a queued render job until it finishes; resolves with its result.
+  // Uses the job's Server-Sent Events stream, falling back to polling.
+  function waitForJob(job) {
+    return new Promise(function (resolve, reject) {
+      function settle(state) {
+        if (state.status === 'done') resolve(state.result);
+        else if (state.status === 'cancelled') reject(new Error('Render cancelled'));
+        else reject(new Error(state.error || 'Failed to generate video'));
+      }
+
+      function poll() {
+        fetch(job.status_url)
+          .then(function (r) { return r.json(); })
+          .then(function (state) {
+            if (['done', 'failed', 'cancelled'].indexOf(state.status) !== -1) return settle(state);
+            if (state.error) return reject(new Error(state.error));
+            showStatus(describeProgress(state.progress || { stage: state.status }));
+            setTimeout(poll, 1000);
+          })
+          .catch(reject);
+      }
+
+      if (!window.EventSource || !job.events_url) return poll();
+      var source = new EventSource(job.events_url);
+      var finished = false;
+      source.addEventListener('progress', function (e) {
+        showStatus(describeProgress(JSON.parse(e.data)));
+      });
+      ['done', 'failed', 'cancelled'].forEach(function (name) {
+        source.addEventListener(name, function (e) {
+          finished = true;
+          source.close();
+          settle(JSON.parse(e.data));
+        });
+      });
+      source.onerror = function () {
+        if (finished) return;
+        source.close();
+        poll();
+      };
+    });
+  }
+
+  function newIdempotencyKey() {
+    if (window.crypto && window.crypto.randomUUID) return window.crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+  }
+
+  // POST /generate, retrying network failures with the same idempotency
+  // key so a retry attaches to the job the first attempt may have queued.
+  function postGenerate(payload, key, attempts) {
+    return fetch('/generate', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Idempotency-Key': key },
+      body: JSON.stringify(payload),
+    }).catch(function (err) {
+      if (attempts <= 1) throw err;
+      return new Promise(function (r) { setTimeout(r, 1000); })
+        .then(function () { return postGenerate(payload, key, attempts - 1); });
+    });
+  }
+
   // ---- Init on DOMContentLoaded ----
   document.addEventListener('DOMContentLoaded', function () {
     var form = document.getElementById('creditsForm');
@@ -288,6 +414,18 @@
     var refreshBtn = document.getElementById('refreshBtn');
     var videoPlayer = document.getElementById('videoPlayer');
     var downloadBtn = document.getElementById('downloadBtn');
+    var cancelRenderBtn = document.getElementById('cancelRenderBtn');
+    var currentJob = null;
+
+    if (cancelRenderBtn) {
+      cancelRenderBtn.addEventListener('click', function () {
+        if (!currentJob) return;
+        cancelRenderBtn.disabled = true;
+        showStatus('Cancelling render...');
+        fetch('/api/jobs/' + currentJob.job_id + '/cancel', { method: 'POST' })
+          .catch(function () { cancelRenderBtn.disabled = false; });
+      });
+    }
     var openFolderBtn = document.getElementById('openFolderBtn');
     var previewModalEl = document.getElementById('videoPreviewModal');
     var previewModal = previewModalEl ? bootstrap.Modal.getOrCreateInstance(previewModalEl) : null;
@@ -297,6 +435,7 @@
 
     // Restore settings
     loadSettings();
+    loadEncoderProfiles();
 
     // Bind persistence listeners
     persistFields.forEach(function (f) {
@@ -388,21 +527,36 @@
         bg_color: bgColor,
         message_style: messageStyle,
         patron_style: patronStyle,
+        encoder: document.getElementById('encoder').value,
       };
       // Merge effects into payload
       for (var k in effects) { payload[k] = effects[k]; }
 
-      fetch('/generate', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(payload),
-      })
+      // Extra sizes: one job renders every output
+      var extras = Array.prototype.slice.call(document.querySelectorAll('.extra-output:checked'))
+        .map(function (el) { return el.value; })
+        .filter(function (res) { return res !== resolution; });
+      if (extras.length) {
+        payload.outputs = [resolution].concat(extras).map(function (res) {
+          return { resolution: res, encoder: payload.encoder };
+        });
+      }
+
+      postGenerate(payload, newIdempotencyKey(), 3)
         .then(function (resp) {
           return resp.json().then(function (data) {
             if (!resp.ok) throw new Error(data.error || 'Failed to generate video');
             return data;
           });
         })
+        .then(function (data) {
+          currentJob = data;
+          if (cancelRenderBtn) {
+            cancelRenderBtn.disabled = false;
+            cancelRenderBtn.classList.remove('d-none');
+          }
+          return waitForJob(data);
+        })
         .then(function (data) {
           hideStatus();
           videoPlayer.src = data.video_url;
@@ -418,6 +572,8 @@
           hideStatus();
         })
         .finally(function () {
+          currentJob = null;
+          if (cancelRenderBtn) cancelRenderBtn.classList.add('d-none');
           generateBtn.disabled = false;
         });
     });
@@ -32,6 +32,7 @@
           '<p class="card-text small mb-1 text-truncate" title="' + video.filename + '">' + video.filename + '</p>' +
           '<p class="card-text text-body-secondary" style="font-size:.75rem">' +
             formatDate(video.created) + ' &middot; ' + formatBytes(video.size) +
+            (video.encoder ? ' &middot; ' + video.encoder : '') +
           '</p>' +
         '</div>' +
         '<div class="card-footer bg-transparent border-0 p-2 pt-0">' +
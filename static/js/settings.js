@@ -692,6 +692,27 @@
     setTimeout(function () { el.className = 'alert d-none mt-2 mb-0 py-1 px-2 small'; }, 4000);
   }
 
+  // ---- Render cache ----
+  function loadCacheStats() {
+    var el = document.getElementById('settingsCacheStats');
+    if (!el) return;
+    fetch('/api/cache?limit=0')
+      .then(function (r) { return r.json(); })
+      .then(function (data) {
+        if (!data.enabled) { el.textContent = 'Cache disabled'; return; }
+        el.textContent = data.count + ' video(s), ' +
+          (data.bytes / 1048576).toFixed(1) + ' MB';
+      })
+      .catch(function () {});
+  }
+
+  function purgeCache() {
+    fetch('/api/cache', { method: 'DELETE' })
+      .then(function (r) { return r.json(); })
+      .then(loadCacheStats)
+      .catch(function () {});
+  }
+
   // ---- Load existing values ----
   function loadExisting() {
     fetch('/settings', { headers: { Accept: 'application/json' } })
@@ -726,6 +747,7 @@
       settingsTab.addEventListener('shown.bs.tab', function () {
         checkFfmpeg();
         loadExisting();
+        loadCacheStats();
       });
     }
 
@@ -754,6 +776,9 @@
     var installBtn = document.getElementById('settingsInstallFfmpegBtn');
     if (installBtn) installBtn.addEventListener('click', installFfmpeg);
 
+    var purgeCacheBtn = document.getElementById('settingsPurgeCacheBtn');
+    if (purgeCacheBtn) purgeCacheBtn.addEventListener('click', purgeCache);
+
     var detectBtn = document.getElementById('settingsDetectBtn');
     if (detectBtn) detectBtn.addEventListener('click', detectCampaign);
 